@@ -244,12 +244,7 @@ class IsFireableGenerator(core.SuccTGenerator):
 
         self.gen_enumerators()
 
-        guard = info.ExpressionInfo(trans.trans.guard._str)
-        try:
-            if eval(guard.raw) != True:
-                builder.begin_GuardCheck(condition = core.netir.PyExpr(guard))
-        except:
-            builder.begin_GuardCheck(condition = core.netir.PyExpr(guard))
+        self.gen_guard_checks()
 
         # guard valid
         success = info.ExpressionInfo("True")
@@ -58,6 +58,7 @@ def compile_IR(env, config, compiler_):
     module_pyx_file.declarations.append("# cython: boundscheck=False\n")
     module_pyx_file.declarations.append("# cython: cdivision=True\n")
     module_pyx_file.declarations.append("from cython.operator cimport dereference as deref\n")
+    module_pyx_file.declarations.append("cimport cython")
     module_pyx_file.declarations.append("import neco.ctypes")
     module_pyx_file.declarations.append("cimport neco.ctypes.ctypes_ext as ctypes_ext")
     module_pyx_file.declarations.append("from snakes.nets import dot")
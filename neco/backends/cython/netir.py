@@ -1,6 +1,6 @@
 """ Cython ast compiler. """
 
-from neco.core.info import TypeInfo, ExpressionInfo
+from neco.core.info import TypeInfo, ExpressionInfo, VariableInfo
 from priv.common import CVarSet, from_neco_lib
 from priv.mrkpidfunctions import GENERATOR_PLACE
 import StringIO
@@ -441,10 +441,96 @@ class CompilerVisitor(coreir.CompilerVisitor):
                                          returns = cyast.E("void"),
                                          decl = decl)
 
+    def incremental_succs_body(self, node):
+        """ Successor computation only checking candidate transitions.
+
+        Transitions enabled in a marking are the ones that produced
+        successors among its candidates. Each successor gets as candidates
+        the transitions enabled in its parent and the transitions dependent
+        on the fired transition (see C{TransitionInfo.dependent_transitions}).
+
+        @return: body and declarations of C{neco_succs_into}.
+        """
+        marking_type = self.env.marking_type
+        transitions = self.env.net_info.transitions
+        index = dict( (trans.name, i) for i, trans in enumerate(transitions) )
+        words = marking_type.candidate_words(self.env)
+        attr = marking_type.candidates_attribute
+        m = node.arg_marking_var.name
+        acc = node.arg_marking_acc_var.name
+        ctx = node.arg_ctx_var.name
+        uint = self.env.type2str(TypeInfo.get('UnsignedInt'))
+
+        def new_successors(first, body):
+            return cyast.For(target = cyast.E('i'),
+                             iter = cyast.E('range({}, {}.count)'.format(first, acc)),
+                             body = [ cyast.Assign(targets = [cyast.Name('s')],
+                                                   value = cyast.Cast(target = 'Marking',
+                                                                      value = cyast.E('{}.items[i]'.format(acc)))) ] + body,
+                             orelse = [])
+
+        body = [ cyast.E('first = {}.count'.format(acc)) ]
+        body.extend( cyast.E('enabled[{!s}] = 0'.format(word)) for word in range(words) )
+
+        for i, trans in enumerate(transitions):
+            masks = [ 0 ] * words
+            for dependent in trans.dependent_transitions():
+                word, bit = marking_type.candidate_bit(index[dependent.name])
+                masks[word] |= bit
+            init = []
+            if words > 1 and not all(masks):
+                init.append(cyast.For(target = cyast.E('j'),
+                                      iter = cyast.E('range({!s})'.format(words)),
+                                      body = [ cyast.E('s.{}[j] = 0'.format(attr)) ],
+                                      orelse = []))
+            init.extend( cyast.E('s.{}[{!s}] = {!s}'.format(attr, word, mask))
+                         for word, mask in enumerate(masks) if mask or words == 1 )
+
+            word, bit = marking_type.candidate_bit(i)
+            call = '{}({}, {}, {})'.format(self.env.get_succ_function_name(trans), m, acc, ctx)
+            body.append(cyast.NComment(trans.name))
+            body.append(cyast.If(test = cyast.E('{}.{}[{!s}] & {!s}'.format(m, attr, word, bit)),
+                                 body = [ cyast.E('start = {}.count'.format(acc)),
+                                          cyast.stmt(cyast.E(call)),
+                                          cyast.If(test = cyast.E('{}.count > start'.format(acc)),
+                                                   body = [ cyast.E('enabled[{0!s}] = enabled[{0!s}] | {1!s}'.format(word, bit)),
+                                                            new_successors('start', init) ],
+                                                   orelse = []) ],
+                                 orelse = []))
+
+        body.append(new_successors('first', [ cyast.E('s.{0}[{1!s}] = s.{0}[{1!s}] | enabled[{1!s}]'.format(attr, word))
+                                              for word in range(words) ]))
+
+        decl = [ cyast.CVar(name = 'first', type = 'Py_ssize_t'),
+                 cyast.CVar(name = 'start', type = 'Py_ssize_t'),
+                 cyast.CVar(name = 'i', type = 'Py_ssize_t'),
+                 cyast.CVar(name = 'j', type = 'Py_ssize_t'),
+                 cyast.CVar(name = 's', type = self.env.type2str(marking_type.type)),
+                 cyast.CVar(name = 'enabled[{!s}]'.format(words), type = uint) ]
+        return body, decl
+
     def compile_Succs(self, node):
-        body = []
-        body.extend(self.compile(node.body))
-        body.append(cyast.E("return " + node.arg_marking_acc_var.name))
+        # successors are accumulated in a vector that exploration loops
+        # reuse, duplicates are only removed by the visited table
+        if self.env.marking_type.incremental_enabling:
+            body, decl = self.incremental_succs_body(node)
+        else:
+            body, decl = self.compile(node.body), []
+        if not body:
+            # no transition is compiled in, e.g., without process places
+            # when the flow is optimized
+            body = [ cyast.Pass() ]
+        f0 = cyast.Builder.FunctionCDef(name = "neco_succs_into",
+                                        args = self.succ_function_args(node),
+                                        body = body,
+                                        lang = cyast.CDef(public = False),
+                                        returns = cyast.E("void"),
+                                        decl = decl)
+
+        body = [ cyast.stmt(cyast.E("neco_succs_into({}, {}, {})".format(node.arg_marking_var.name,
+                                                                          node.arg_marking_acc_var.name,
+                                                                          node.arg_ctx_var.name))),
+                 cyast.E("return {}.as_set()".format(node.arg_marking_acc_var.name)) ]
         f1 = cyast.Builder.FunctionCpDef(name = node.function_name,
                                          args = self.main_succ_function_args(node),
                                          body = body,
@@ -476,7 +562,59 @@ class CompilerVisitor(coreir.CompilerVisitor):
                                                 cyast.CVar(name = "e", type = "Marking")]
                                         )
 
-        return [f1]
+        if self.env.config.normalize_pids:
+            # normalized successors may differ in any place
+            return [f0, f1]
+        return [f0, f1, self.delta_succs_function(node)]
+
+    def delta_succs_function(self, node):
+        """ Successors paired with the fields that may differ from the
+        argument marking, used by delta exploration (see L{neco.delta}).
+
+        Fields come from the places modified by the transitions of each
+        successor function, successor functions are called without the
+        candidate transitions of incremental enabling.
+        """
+        env = self.env
+        marking_type = env.marking_type
+        m = node.arg_marking_var.name
+        acc = node.arg_marking_acc_var.name
+        ctx = node.arg_ctx_var.name
+        succ_var = VariableInfo('s', variable_type = marking_type.type)
+
+        if env.config.optimize_flow:
+            function_names = env.process_succ_functions
+        else:
+            function_names = env.succ_functions
+
+        body = [ cyast.E('l = []'),
+                 cyast.E('start = 0') ]
+        for function_name in sorted(function_names):
+            record = marking_type.delta_record_expr(env, succ_var, env.modified_places(function_name))
+            body.append(cyast.stmt(cyast.E('{}({}, {}, {})'.format(function_name, m, acc, ctx))))
+            body.append(cyast.For(target = cyast.E('i'),
+                                  iter = cyast.E('range(start, {}.count)'.format(acc)),
+                                  body = [ cyast.Assign(targets = [cyast.Name('s')],
+                                                        value = cyast.Cast(target = 'Marking',
+                                                                           value = cyast.E('{}.items[i]'.format(acc)))),
+                                           cyast.stmt(cyast.Call(func = cyast.E('l.append'),
+                                                                 args = [ cyast.Tuple([ cyast.Name('s'), record ]) ])) ],
+                                  orelse = []))
+            body.append(cyast.E('start = {}.count'.format(acc)))
+        body.append(cyast.E('return l'))
+
+        return cyast.Builder.FunctionCpDef(name = 'delta_succs',
+                                           args = self.main_succ_function_args(node),
+                                           body = body,
+                                           lang = cyast.CpDef(public = False),
+                                           returns = cyast.Name('list'),
+                                           decl = [ cyast.CVar(name = acc,
+                                                               type = env.type2str(node.arg_marking_acc_var.type),
+                                                               init = env.marking_set_type.new_marking_set_expr(env)),
+                                                    cyast.CVar(name = 'l', type = 'list'),
+                                                    cyast.CVar(name = 'start', type = 'Py_ssize_t'),
+                                                    cyast.CVar(name = 'i', type = 'Py_ssize_t'),
+                                                    cyast.CVar(name = 's', type = env.type2str(marking_type.type)) ])
 
     def compile_Init(self, node):
         env = self.env
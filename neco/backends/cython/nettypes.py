@@ -2,7 +2,7 @@
 
 from neco.core.info import TypeInfo, PlaceInfo
 from priv import cyast, placetypes
-from priv.common import IsCythonPyxFile, IsCythonPxdFile
+from priv.common import IsCythonPyxFile, IsCythonPxdFile, from_neco_lib
 from priv.lowlevel import ChunkManager
 import neco.core.nettypes as coretypes
 import neco.utils as utils
@@ -25,17 +25,34 @@ class StaticMarkingType(coretypes.MarkingType):
         # id provider for class attributes
         self.id_provider = utils.NameProvider() # used to produce attribute names
         self._process_place_types = {}
+        # places omitted from markings, see placetypes.ImpliedBTPlaceType
+        self.implied_place_types = {}
 
         #self.packing_enabled = config.bit_packing
         self.config = config
         self.chunk_manager = ChunkManager(self.id_provider.new(base="_packed"))
 
+        # cached hash, terms and dirty units, see hash_units
+        self.hash_attribute = self.id_provider.new(base="_hash")
+        self.hash_terms_attribute = self.id_provider.new(base="_hash_terms")
+        self.hash_dirty_attribute = self.id_provider.new(base="_hash_dirty")
+        # transitions to check in successors, see incremental_enabling
+        self.candidates_attribute = self.id_provider.new(base="_candidates")
+
         self.add_method_generator(priv.mrkmethods.InitGenerator())
         self.add_method_generator(priv.mrkmethods.DeallocGenerator())
         self.add_method_generator(priv.mrkmethods.CopyGenerator())
         self.add_method_generator(priv.mrkmethods.DumpExprGenerator())
         self.add_method_generator(priv.mrkmethods.RichcmpGenerator())
         self.add_method_generator(priv.mrkmethods.HashGenerator())
+        self.add_method_generator(priv.mrkmethods.FingerprintGenerator())
+        self.add_method_generator(priv.mrkmethods.CollapseGenerator())
+        if not config.normalize_pids:
+            # pickling support, needed to send markings between processes,
+            # pid and generator places cannot be pickled (check_picklable
+            # rejects their markings before exploring)
+            self.add_method_generator(priv.mrkmethods.ReduceGenerator())
+            self.add_method_generator(priv.mrkmethods.SetStateGenerator())
 
         self._C_function_generators = []
 
@@ -44,6 +61,7 @@ class StaticMarkingType(coretypes.MarkingType):
         
         self.add_C_function_generator(priv.mrkfunctions.CompareGenerator())
         self.add_C_function_generator(priv.mrkfunctions.HashGenerator())
+        self.add_C_function_generator(priv.mrkfunctions.FingerprintBitsGenerator())
 
         if config.normalize_pids:
             self.add_C_function_generator(priv.mrkpidfunctions.UpdatePidsGenerator())
@@ -62,9 +80,197 @@ class StaticMarkingType(coretypes.MarkingType):
             functions.append(generator.generate(env))
         return functions
 
+    def hash_units(self):
+        """ Units of the incremental marking hash.
+
+        The hash of a marking is the sum of one term per unit, the packed
+        attribute and each other place attribute. Markings cache their
+        hash and the term of each unit, with a dirty bit per unit whose
+        term is not in the cached sum. Successors subtract the cached
+        terms of modified places and only recompute these terms.
+
+        @return: list of C{(attribute name, place type)} pairs, the place
+                 type is C{None} for the packed attribute.
+        """
+        units = []
+        names = set()
+        if self.chunk_manager.packed_bits() > 0:
+            attr_name, _, _ = self.chunk_manager.packed_attribute()
+            units.append((attr_name, None))
+            names.add(attr_name)
+        for place_type in self.place_types.itervalues():
+            attr_name = place_type.get_attribute_name()
+            if attr_name not in names:
+                units.append((attr_name, place_type))
+                names.add(attr_name)
+        return units
+
+    def fingerprint_places(self):
+        """ Place types folded into marking fingerprints, after the packed
+        bytes, one per attribute.
+        """
+        places = []
+        names = set()
+        if self.chunk_manager.packed_bits() > 0:
+            attr_name, _, _ = self.chunk_manager.packed_attribute()
+            names.add(attr_name)
+        for place_type in self.place_types.itervalues():
+            attr_name = place_type.get_attribute_name()
+            if attr_name not in names:
+                places.append(place_type)
+                names.add(attr_name)
+        return places
+
+    def fingerprint_bits(self):
+        """ Number of bits of marking fingerprints.
+
+        Fingerprints have 64 bits, but markings differing by a single
+        place folded through its 32 bits hash collide as soon as their
+        place hashes do, the omission probability of hash compaction is
+        computed with the smallest number of bits of a place. Whatever
+        the width, distinct markings may share a fingerprint and hash
+        compaction may miss states.
+        """
+        return min([ 64 ] + [ place_type.fingerprint_bits for place_type in self.fingerprint_places() ])
+
+    def delta_record_expr(self, env, marking_var, modified_places):
+        """ Fields of a successor that may differ from its parent.
+
+        Fields are the entries of the state tuple built by C{__reduce__},
+        the record flattens pairs of field indices and values (see
+        L{neco.delta}). Places not modified are shared with the parent,
+        packed bytes are always part of a non empty record as a copy does.
+
+        @param modified_places: places modified by the fired transitions.
+        @type modified_places: C{set}
+        @rtype: C{cyast.Tuple}
+        """
+        attr_name, count, place_types = priv.mrkmethods.pickled_fields(self)
+        modified = set( self.place_types[place_info.name].get_attribute_name()
+                        for place_info in modified_places
+                        if place_info.name in self.place_types )
+
+        items = []
+        if modified:
+            for index in range(count):
+                items.append(cyast.Num(index))
+                items.append(cyast.E('{}.{}[{!s}]'.format(marking_var.name, attr_name, index)))
+        for index, place_type in enumerate(place_types, count):
+            if place_type.get_attribute_name() in modified:
+                items.append(cyast.Num(index))
+                items.append(place_type.getstate_expr(env, marking_var = marking_var))
+        return cyast.Tuple(items)
+
+    # dirty bits per word, masks must fit in a C int for cython to keep
+    # them native
+    hash_dirty_bits = 31
+
+    def hash_dirty_words(self):
+        """ Number of words of dirty bits. """
+        return max(1, (len(self.hash_units()) + self.hash_dirty_bits - 1) // self.hash_dirty_bits)
+
+    def hash_dirty_bit(self, unit):
+        """ Word index and mask of the dirty bit of a unit. """
+        return unit // self.hash_dirty_bits, 1 << (unit % self.hash_dirty_bits)
+
+    @property
+    def incremental_enabling(self):
+        """ C{True} if markings record the transitions that may be enabled
+        in them, only these transitions are checked when computing their
+        successors. Pid normalization and flow control optimizations
+        modify places that fired transitions do not modify, they disable
+        incremental enabling.
+        """
+        return (self.config.incremental_enabling
+                and not self.config.optimize_flow
+                and not self.config.normalize_pids)
+
+    # candidate transitions per word, see hash_dirty_bits
+    candidate_bits = 31
+
+    def candidate_words(self, env):
+        """ Number of words of candidate transitions. """
+        return max(1, (len(env.net_info.transitions) + self.candidate_bits - 1) // self.candidate_bits)
+
+    def candidate_bit(self, index):
+        """ Word index and mask of the candidate bit of a transition. """
+        return index // self.candidate_bits, 1 << (index % self.candidate_bits)
+
+    def gen_candidates_reset(self, env, marking_var):
+        """ Mark every transition as candidate, used when the parent of a marking is unknown. """
+        nodes = []
+        count = len(env.net_info.transitions)
+        for word in range(self.candidate_words(env)):
+            bits = min(self.candidate_bits, max(0, count - self.candidate_bits * word))
+            nodes.append(cyast.E('{}.{}[{!s}] = {!s}'.format(marking_var.name, self.candidates_attribute,
+                                                             word, (1 << bits) - 1)))
+        return nodes
+
+    def hash_term_expr(self, env, unit, marking_var):
+        """ Term of a unit in the hash of a marking. """
+        attr_name, place_type = self.hash_units()[unit]
+        if place_type is None:
+            _, _, count = self.chunk_manager.packed_attribute()
+            value = cyast.E('{}({}.{}, {!s})'.format(from_neco_lib('neco_hash_bytes'), marking_var.name, attr_name, count))
+        else:
+            value = place_type.hash_expr(env, marking_var = marking_var)
+        return cyast.Call(func = cyast.E(from_neco_lib('neco_hash_term')),
+                          args = [ value, cyast.Num(unit) ])
+
+    def gen_hash_reset(self, env, marking_var):
+        """ Mark every unit of a marking as dirty, used when all places may change. """
+        nodes = [ cyast.E('{}.{} = 0'.format(marking_var.name, self.hash_attribute)) ]
+        count = len(self.hash_units())
+        for word in range(self.hash_dirty_words()):
+            bits = min(self.hash_dirty_bits, max(0, count - self.hash_dirty_bits * word))
+            nodes.append(cyast.E('{}.{}[{!s}] = {!s}'.format(marking_var.name, self.hash_dirty_attribute,
+                                                             word, (1 << bits) - 1)))
+        return nodes
+
+    def gen_hash_copy(self, env, src_marking, dst_marking, units):
+        """ Copy the cached terms of C{units} from a marking to another. """
+        return [ cyast.E('{0}.{2}[{3!s}] = {1}.{2}[{3!s}]'.format(dst_marking.name, src_marking.name,
+                                                                 self.hash_terms_attribute, unit))
+                 for unit in units ]
+
+    def gen_hash_update(self, env, src_marking, dst_marking, units):
+        """ Derive the cached hash of a copy from its source.
+
+        Cached terms of C{units} are removed from the cached hash of the
+        copy and these units are marked dirty, they are added back once
+        the copy is modified and hashed. Terms of other units are copied.
+        """
+        nodes = [ cyast.E('{}.{} = {}.{}'.format(dst_marking.name, self.hash_attribute,
+                                                 src_marking.name, self.hash_attribute)) ]
+        nodes.extend(self.gen_hash_copy(env, src_marking, dst_marking,
+                                        [ unit for unit in range(len(self.hash_units())) if unit not in units ]))
+        masks = [ 0 ] * self.hash_dirty_words()
+        for unit in units:
+            word, bit = self.hash_dirty_bit(unit)
+            masks[word] |= bit
+            clean = cyast.E('not ({}.{}[{!s}] & {!s})'.format(src_marking.name, self.hash_dirty_attribute, word, bit))
+            term = cyast.E('{}.{}[{!s}]'.format(src_marking.name, self.hash_terms_attribute, unit))
+            nodes.append(cyast.If(test = clean,
+                                  body = [ cyast.Assign(targets = [cyast.E('{}.{}'.format(dst_marking.name, self.hash_attribute))],
+                                                        value = cyast.BinOp(left = cyast.E('{}.{}'.format(dst_marking.name, self.hash_attribute)),
+                                                                            op = cyast.Sub(),
+                                                                            right = term)) ]))
+        for word, mask in enumerate(masks):
+            dirty = '{}.{}[{!s}]'.format(src_marking.name, self.hash_dirty_attribute, word)
+            if mask:
+                dirty = '{} | {!s}'.format(dirty, mask)
+            nodes.append(cyast.E('{}.{}[{!s}] = {}'.format(dst_marking.name, self.hash_dirty_attribute, word, dirty)))
+        return nodes
+
     def get_process_place_type(self, process_name):
         return self._process_place_types[process_name]
 
+    def get_place_type_by_name(self, name):
+        try:
+            return self.place_types[name]
+        except KeyError:
+            return self.implied_place_types[name]
+
     def place_type_from_info(self, place_info):
         """ Returns a PlaceType object based on PlaceInfo type information. """
     
@@ -72,10 +278,21 @@ class StaticMarkingType(coretypes.MarkingType):
             return placetypes.GeneratorPlaceType(place_info, self)
     
         pi_type = place_info.type
-        if   pi_type.is_Int:        return placetypes.IntPlaceType(place_info, marking_type=self)
+        if   pi_type.is_Int:
+            domain = place_info.domain
+            if (domain and placetypes.DensePlaceType.fits(place_info) and
+                (place_info.domain_annotated or self.config.optimize)):
+                return placetypes.DensePlaceType(place_info, marking_type=self)
+            if place_info.counted or (self.config.optimize and place_info.duplicated):
+                return placetypes.CountedIntPlaceType(place_info, marking_type=self)
+            return placetypes.IntPlaceType(place_info, marking_type=self)
         elif pi_type.is_Bool:       return placetypes.ObjectPlaceType(place_info, marking_type=self)
         elif pi_type.is_String:     return placetypes.ObjectPlaceType(place_info, marking_type=self)
-        elif pi_type.is_BlackToken: return placetypes.BTPlaceType(place_info, marking_type=self, packed=False)
+        elif pi_type.is_BlackToken:
+            # pack k-bounded places when their count fits in a packed field
+            packed = (self.config.bit_packing and place_info.bound is not None and
+                      placetypes.BTPlaceType.needed_bits(place_info.bound) <= self.chunk_manager.packed_field_size)
+            return placetypes.BTPlaceType(place_info, marking_type=self, packed=packed)
         elif pi_type.is_Pid:
             if self.config.normalize_pids:  return placetypes.PidPlaceType(place_info, marking_type=self)
             else:                           return placetypes.ObjectPlaceType(place_info, marking_type=self)
@@ -124,9 +341,15 @@ class StaticMarkingType(coretypes.MarkingType):
         for place_info in self.flow_control_places:
             self.__gen_flow_control_place_type(place_info)
         for place_info in self.one_safe_places:
-            self.__gen_one_safe_place_type(place_info)
+            if place_info.invariant is not None:
+                self.implied_place_types[place_info.name] = placetypes.ImpliedBTPlaceType(place_info, self)
+            else:
+                self.__gen_one_safe_place_type(place_info)
         for place_info in self.places:
-            self.place_types[place_info.name] = self.place_type_from_info(place_info)
+            if place_info.invariant is not None:
+                self.implied_place_types[place_info.name] = placetypes.ImpliedBTPlaceType(place_info, self)
+            else:
+                self.place_types[place_info.name] = self.place_type_from_info(place_info)
         
         self.chunk_manager.order_chunks()
 
@@ -139,6 +362,8 @@ class StaticMarkingType(coretypes.MarkingType):
             l.append(str(place_type.info.type))
             l.append(" \tonesafe") if place_type.info.one_safe else l.append("")
             l.append("\n")
+        for place_name, place_type in self.implied_place_types.items():
+            l.append("{} \t{!s} \timplied\n".format(place_name, place_type.info.type))
         l.append("MARKING DUMP END\n")
         return "".join(l)
 
@@ -172,21 +397,46 @@ class StaticMarkingType(coretypes.MarkingType):
         for chunk in self.chunk_manager.normal_chunks:
             attr_name = chunk.get_attribute_name()
             attr_type = chunk.get_cython_type()
-            
+            if chunk.count:
+                attr_name = '{}[{!s}]'.format(attr_name, chunk.count)
+
             cls.add_decl(cyast.CVar(name=attr_name, type=env.type2str(attr_type)))
             #   place = chunk_place_map[attr_name]
             cls.add_decl(cyast.Comment("{}".format(chunk.hint)))
 
+        cls.add_decl(cyast.CVar(name=self.hash_attribute, type=from_neco_lib('fingerprint_t')))
+        cls.add_decl(cyast.CVar(self.hash_terms_attribute + '[' + str(len(self.hash_units())) + ']',
+                                type=from_neco_lib('fingerprint_t')))
+        cls.add_decl(cyast.CVar(self.hash_dirty_attribute + '[' + str(self.hash_dirty_words()) + ']',
+                                type=env.type2str(TypeInfo.get('UnsignedInt'))))
+        if self.incremental_enabling:
+            cls.add_decl(cyast.CVar(self.candidates_attribute + '[' + str(self.candidate_words(env)) + ']',
+                                    type=env.type2str(TypeInfo.get('UnsignedInt'))))
+
         cls.add_method(cyast.FunctionDecl(name='copy',
                                           args=cyast.to_ast(cyast.A("self", cyast.Name(env.type2str(self.type)))),
                                           returns=cyast.Name(env.type2str(self.type)),
                                           lang=cyast.CDef()))
 
+        cls.add_method(cyast.FunctionDecl(name='fingerprint',
+                                          args=cyast.to_ast(cyast.A("self", cyast.Name(env.type2str(self.type)))),
+                                          returns=cyast.Name(from_neco_lib('fingerprint_t')),
+                                          lang=cyast.CDef()))
+
+        cls.add_method(cyast.FunctionDecl(name='collapse',
+                                          args=cyast.to_ast(cyast.A("self", cyast.Name(env.type2str(self.type)))
+                                                            .param("table", type=from_neco_lib('CollapseTable'))),
+                                          returns=cyast.Name('void'),
+                                          lang=cyast.CDef()))
+
         return cyast.to_ast(cls)
 
     def generate_api(self, env):
         cls = cyast.Builder.ClassCDef(name="Marking",
                                       bases=[])
+        # released markings are kept for reuse by the next allocations
+        if self.config.marking_freelist > 0:
+            cls.add_decorator(cyast.E("cython.freelist({!s})".format(self.config.marking_freelist)))
 
         ################################################################################
         # methods
@@ -297,6 +547,11 @@ class StaticMarkingType(coretypes.MarkingType):
                 nodes.append(cyast.Comment('assign: {} {!s}'.format(place_type.info.name, place_type.info.type)))
             copied.add(attr_name)
 
+        # the packed attribute also holds flow places, it is always rehashed
+        units = [ unit for unit, (attr_name, place_type) in enumerate(self.hash_units())
+                  if place_type is None or attr_name in copy_attributes ]
+        nodes.extend(self.gen_hash_update(env, src_marking, dst_marking, units))
+
         return cyast.to_ast(nodes)
 
     def copy_marking_expr(self, env, marking_var):
@@ -358,17 +613,21 @@ class StaticMarkingType(coretypes.MarkingType):
 ################################################################################
 
 class MarkingSetType(coretypes.MarkingSetType):
-    """ Python implementation of the marking set type. """
+    """ Cython implementation of the marking set type.
+
+    Successors are accumulated in a C{MarkingVector}, duplicates are
+    removed by the table of visited markings.
+    """
 
     def __init__(self, markingtype):
         coretypes.MarkingSetType.__init__(self, markingtype)
-        self.add_attribute_name = "add"
+        self.add_attribute_name = "append"
 
     def gen_api(self, env):
         pass
 
     def new_marking_set_expr(self, env):
-        return cyast.Call(func=cyast.Name("set"))
+        return cyast.Call(func=cyast.Name(from_neco_lib("MarkingVector")))
 
     def add_marking_stmt(self, env, markingset_var, marking_var):
         return cyast.Call(func=cyast.Attribute(value=cyast.Name(markingset_var.name),
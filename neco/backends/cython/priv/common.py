@@ -34,13 +34,16 @@ def from_neco_lib(f):
 
 TypeInfo.register_type("MultiSet")
 TypeInfo.register_type("IntPlace")
+TypeInfo.register_type("CountedIntPlace")
 TypeInfo.register_type("Char")
 TypeInfo.register_type("Short")
 TypeInfo.register_type("UnsignedInt")
 TypeInfo.register_type("UnsignedChar")
+TypeInfo.register_type("UnsignedShort")
 
 TypeInfo.register_type("PidPlace")
 TypeInfo.register_type("GeneratorPlace")
+TypeInfo.register_type("CollapseTable")
 
 ################################################################################
 
@@ -107,10 +110,14 @@ class CompilingEnvironment(core.CompilingEnvironment):
         self.register_cython_type(TypeInfo.get('Int'), 'int')
         self.register_cython_type(TypeInfo.get('Short'), 'short')
         self.register_cython_type(TypeInfo.get('IntPlace'), from_neco_lib('TGenericPlaceType[int]*'))
+        self.register_cython_type(TypeInfo.get('CountedIntPlace'), from_neco_lib('TCountedPlaceType[int]*'))
         self.register_cython_type(TypeInfo.get('MultiSet'), 'ctypes_ext.MultiSet')
+        self.register_cython_type(TypeInfo.get('CollapseTable'), from_neco_lib('CollapseTable'))
         self.register_cython_type(TypeInfo.get('UnsignedChar'), 'unsigned char')
+        self.register_cython_type(TypeInfo.get('UnsignedShort'), 'unsigned short')
         self.register_cython_type(TypeInfo.get('UnsignedInt'), 'unsigned int')
         self.register_cython_type(TypeInfo.get('set'), 'set')
+        self.register_cython_type(marking_type.container_type, from_neco_lib('MarkingVector'))
         self.register_cython_type(TypeInfo.get('dict'), 'dict')
         self.register_cython_type(TypeInfo.get('NecoCtx'), 'NecoCtx')
 
@@ -378,6 +378,9 @@ class Builder(coreir.BuilderBase):
         def add_decl(self, decl):
             self.node.decl.append(to_ast(decl))
 
+        def add_decorator(self, decorator):
+            self.node.decorator_list.append(to_ast(decorator))
+
         def __ast__(self):
             return self.node
 
@@ -497,6 +500,9 @@ class Unparser(_Unparser) :
         self.write(tree.arg)
     def _ClassDef (self, tree):
         self.write("\n")
+        for decorator in tree.decorator_list :
+            self.fill("@")
+            self.dispatch(decorator)
         if isinstance(tree.lang, cyast_gen.Def) :
             self.fill("class ")
             tree.decl = []
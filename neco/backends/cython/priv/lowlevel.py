@@ -19,6 +19,8 @@ def bits_sizeof(cython_type):
         return struct.Struct('c').size * bits_per_byte
     elif cython_type.is_UnsignedChar:
         return struct.Struct('B').size * bits_per_byte
+    elif cython_type.is_UnsignedShort:
+        return struct.Struct('H').size * bits_per_byte
     elif cython_type.is_Bool:
         return 1
     raise RuntimeError
@@ -396,14 +398,18 @@ class Mask(object):
 class MemoryChunk(object):
     '''
     '''
-    def __init__(self, mgr, name, cython_type, packed = False):
+    def __init__(self, mgr, name, cython_type, packed = False, count = None, bits = None):
         ''' 
         '''
         self.name = name
         self.chunk_manager = mgr
         self.cython_type = cython_type
         self.packed = packed
-        self.bits = bits_sizeof(cython_type) if packed else 0
+        self.count = count    # number of elements of array chunks
+        if packed:
+            self.bits = bits if bits else bits_sizeof(cython_type)
+        else:
+            self.bits = 0
         # self.bytes = bytes_sizeof(cython_type)
         self.hint = "no hint"
 
@@ -473,10 +479,18 @@ class ChunkManager(object):
         # print " >>>>>>>>>> ", len(fields), fields
         self.packed_field_count = len(fields)
 
-    def new_chunk(self, name, cython_type, packed = False):
-        '''
+    def new_chunk(self, name, cython_type, packed = False, count = None, bits = None):
+        ''' Reserve a chunk, packed chunks use C{bits} bits if given.
+
+        >>> chunk_manager = ChunkManager('reserved_name')
+        >>> _ = chunk_manager.new_chunk('p1', TypeInfo.Bool, True)
+        >>> _ = chunk_manager.new_chunk('p2', TypeInfo.Bool, True, bits = 3)
+        >>> chunk_manager.get_chunk('p2').offset(), chunk_manager.packed_bits()
+        ((0, 0), 4)
         '''
-        chunk = MemoryChunk(self, name, cython_type, packed)
+        assert(not (packed and count))
+        assert(not bits or bits <= self.packed_field_size)
+        chunk = MemoryChunk(self, name, cython_type, packed, count, bits)
         if name in self.named_chunks:
             raise RuntimeError
 
@@ -1,5 +1,6 @@
 from neco.core.info import VariableProvider, TypeInfo
 from neco.core.nettypes import MarkingTypeMethodGenerator
+from common import from_neco_lib
 import cyast
 
 def _gen_C_compare_aux(builder, tests):
@@ -38,7 +39,20 @@ class CompareGenerator(MarkingTypeMethodGenerator):
                                             .param(right_marking_var.name, type = env.type2str(marking_type.type))),
                                     returns = cyast.E("int"),
                                     public = True, api = True,
-                                    decl = [ cyast.Builder.CVar(name = 'tmp', type = env.type2str(TypeInfo.get('Int'))) ])
+                                    decl = [ cyast.Builder.CVar(name = 'tmp', type = env.type2str(TypeInfo.get('Int'))),
+                                             cyast.Builder.CVar(name = 'left_hash', type = from_neco_lib('fingerprint_t')),
+                                             cyast.Builder.CVar(name = 'right_hash', type = from_neco_lib('fingerprint_t')) ])
+
+        # markings are ordered by hash first, places are only compared
+        # when cached hashes are equal
+        builder.emit(cyast.E('left_hash = neco_marking_hash_value({})'.format(left_marking_var.name)))
+        builder.emit(cyast.E('right_hash = neco_marking_hash_value({})'.format(right_marking_var.name)))
+        builder.begin_If(cyast.E('left_hash < right_hash'))
+        builder.emit_Return(cyast.Num(-1))
+        builder.begin_Elif(cyast.E('left_hash > right_hash'))
+        builder.emit_Return(cyast.Num(1))
+        builder.end_If()
+        builder.end_If()
 
         compared = set()
         tests = []
@@ -130,14 +144,70 @@ class DumpGenerator(MarkingTypeMethodGenerator):
         return cyast.to_ast(builder)
 
 class HashGenerator(MarkingTypeMethodGenerator):
+    """ Hash of markings, cached and incrementally updated (see C{StaticMarkingType.hash_units}).
+
+    C{neco_marking_hash_value} computes and caches the terms of dirty
+    units and adds them to the cached 64 bits hash.
+    """
 
     def generate(self, env):
+        return [ self.generate_hash_value(env), self.generate_hash(env) ]
+
+    def generate_hash_value(self, env):
+        marking_type = env.marking_type
+
+        vp = VariableProvider()
+        self_var = vp.new_variable(marking_type.type, 'self')
+        hash_attr = '{}.{}'.format(self_var.name, marking_type.hash_attribute)
+        terms_attr = '{}.{}'.format(self_var.name, marking_type.hash_terms_attribute)
+        dirty_attr = '{}.{}'.format(self_var.name, marking_type.hash_dirty_attribute)
+
+        builder = cyast.Builder()
+        builder.begin_FunctionCDef(name = "neco_marking_hash_value",
+                                   args = cyast.A(self_var.name, type = env.type2str(marking_type.type)),
+                                   returns = cyast.Name(from_neco_lib('fingerprint_t')))
+
+        for unit in range(len(marking_type.hash_units())):
+            word, bit = marking_type.hash_dirty_bit(unit)
+            term = cyast.E('{}[{!s}]'.format(terms_attr, unit))
+            builder.begin_If(cyast.E('{}[{!s}] & {!s}'.format(dirty_attr, word, bit)))
+            builder.emit(cyast.Assign(targets = [term],
+                                      value = marking_type.hash_term_expr(env, unit, self_var)))
+            builder.emit(cyast.Assign(targets = [cyast.E(hash_attr)],
+                                      value = cyast.BinOp(left = cyast.E(hash_attr),
+                                                          op = cyast.Add(),
+                                                          right = term)))
+            builder.end_If()
+
+        for word in range(marking_type.hash_dirty_words()):
+            builder.emit(cyast.E('{}[{!s}] = 0'.format(dirty_attr, word)))
+
+        builder.emit_Return(cyast.E(hash_attr))
+        builder.end_FunctionDef()
+        return cyast.to_ast(builder)
+
+    def generate_hash(self, env):
         builder = cyast.Builder()
         builder.begin_FunctionCDef(name = "neco_marking_hash",
                                     args = cyast.A("self", type = "Marking"),
                                     returns = cyast.E("int"),
-                                    public = True, api = True)
-        builder.emit_Return(cyast.E('self.__hash__()'))
+                                    public = True, api = True,
+                                    decl = [ cyast.Builder.CVar(name = 'h', type = from_neco_lib('fingerprint_t')) ])
+        builder.emit(cyast.E('h = neco_marking_hash_value(self)'))
+        builder.emit_Return(cyast.Cast(target = 'int', value = cyast.E('h ^ (h >> 32)')))
+        builder.end_FunctionDef()
+        return cyast.to_ast(builder)
+
+class FingerprintBitsGenerator(MarkingTypeMethodGenerator):
+    """ C{neco_fingerprint_bits}, the number of bits of marking
+    fingerprints (see C{StaticMarkingType.fingerprint_bits}).
+    """
+
+    def generate(self, env):
+        builder = cyast.Builder()
+        builder.begin_FunctionDef(name = "neco_fingerprint_bits",
+                                  args = cyast.A())
+        builder.emit_Return(cyast.Num(env.marking_type.fingerprint_bits()))
         builder.end_FunctionDef()
         return cyast.to_ast(builder)
 
@@ -1,7 +1,7 @@
+from common import from_neco_lib
 from neco.core.info import VariableProvider, TypeInfo
 from neco.core.nettypes import MarkingTypeMethodGenerator
 import cyast
-import sys
 
 class DeallocGenerator(MarkingTypeMethodGenerator):
 
@@ -13,6 +13,7 @@ class DeallocGenerator(MarkingTypeMethodGenerator):
         builder = cyast.Builder()
         builder.begin_FunctionDef( name = "__dealloc__",
                                    args = cyast.A("self", type="Marking") )
+        builder.emit(cyast.stmt(cyast.E("ctypes_ext.neco_marking_released({!s})".format(marking_type.config.marking_freelist))))
 
         for place_type in marking_type.place_types.itervalues():
             if place_type.is_packed or place_type.is_helper:
@@ -34,6 +35,13 @@ class InitGenerator(MarkingTypeMethodGenerator):
         builder.begin_FunctionDef( name = "__cinit__",
                                    args = cyast.A("self").param("alloc", default = "False"))
 
+        builder.emit(cyast.stmt(cyast.E("ctypes_ext.neco_marking_created()")))
+        for node in marking_type.gen_hash_reset(env, self_var):
+            builder.emit(node)
+        if marking_type.incremental_enabling:
+            for node in marking_type.gen_candidates_reset(env, self_var):
+                builder.emit(node)
+
         builder.begin_If( cyast.Name('alloc') )
 
         initialized = set()
@@ -108,6 +116,13 @@ class CopyGenerator(MarkingTypeMethodGenerator):
 
             builder.emit(place_type.copy_stmt(env, marking_var, self_var))
 
+        # copies have the same hash and terms
+        builder.emit( cyast.E('m.{0} = self.{0}'.format(marking_type.hash_attribute)) )
+        for node in marking_type.gen_hash_copy(env, self_var, marking_var, range(len(marking_type.hash_units()))):
+            builder.emit(node)
+        for word in range(marking_type.hash_dirty_words()):
+            builder.emit( cyast.E('m.{0}[{1!s}] = self.{0}[{1!s}]'.format(marking_type.hash_dirty_attribute, word)) )
+
 
         builder.emit_Return(cyast.E("m"))
         builder.end_FunctionDef()
@@ -138,65 +153,143 @@ class RichcmpGenerator(MarkingTypeMethodGenerator):
         return cyast.to_ast(builder)
 
 class HashGenerator(MarkingTypeMethodGenerator):
-    
+    """ Hash of markings, the cached hash maintained by C{neco_marking_hash_value}. """
+
+    def generate(self, env):
+        builder = cyast.Builder()
+        builder.begin_FunctionDef( name = "__hash__",
+                                   args = cyast.A("self", type = "Marking") )
+        builder.emit_Return(cyast.Cast(target = 'long', value = cyast.E('neco_marking_hash_value(self)')))
+        builder.end_FunctionDef()
+        return cyast.to_ast(builder)
+
+class FingerprintGenerator(MarkingTypeMethodGenerator):
+
     def generate(self, env):
         marking_type = env.marking_type
-        
+
         vp = VariableProvider()
         self_var = vp.new_variable(marking_type.type, 'self')
 
         builder = cyast.Builder()
-        builder.begin_FunctionDef( name = "__hash__",
-                                   args = cyast.A("self", type = "Marking"),
-                                   decl = [ cyast.Builder.CVar( name = 'h', type = 'int' ) ])
+        builder.begin_FunctionCDef( name = "fingerprint",
+                                    args = cyast.A(self_var.name, type = env.type2str(marking_type.type)),
+                                    returns = cyast.Name(from_neco_lib("fingerprint_t")),
+                                    decl = [ cyast.Builder.CVar( name = 'h', type = from_neco_lib("fingerprint_t") ) ])
 
-        builder.emit( cyast.E("h = 0xDEADDAD") )
-        mult = 0xBADBEEF
-        i = 0
+        builder.emit( cyast.E("h = 0") )
+        mix = from_neco_lib("fingerprint_mix")
 
-        hashed = set()
         if marking_type.chunk_manager.packed_bits() > 0:
             attr_name, _, count = marking_type.chunk_manager.packed_attribute()
-            hashed.add(attr_name)
-            attr = "{}.{}".format(self_var.name, attr_name)
-            
             for index in range(0, count):
-                attr_expr = cyast.E('{!s}[{!s}]'.format(attr, index))
-                builder.emit( cyast.Assign(targets=[cyast.Name('h')],
-                                           value=cyast.BinOp(left = cyast.BinOp(left=cyast.Name('h'),
-                                                                                op=cyast.BitXor(),
-                                                                                right=attr_expr ),
-                                                             op = cyast.Mult(),
-                                                             right = cyast.Num(mult) ) ) )
-                mult = (mult + (82520L + i + i)) % sys.maxint
-                i += 1
+                builder.emit( cyast.E('h = {mix}(h, {object}.{attribute}[{index!s}])'.format(mix = mix,
+                                                                                          object = self_var.name,
+                                                                                          attribute = attr_name,
+                                                                                          index = index)) )
+
+        for place_type in marking_type.fingerprint_places():
+            builder.emit( cyast.Assign(targets = [cyast.Name('h')],
+                                       value = place_type.fingerprint_expr(env, cyast.Name('h'), marking_var = self_var)) )
 
+        builder.emit_Return(cyast.E("{}(h)".format(from_neco_lib("fingerprint_final"))))
+        builder.end_FunctionDef()
+        return cyast.to_ast(builder)
+
+class CollapseGenerator(MarkingTypeMethodGenerator):
+
+    def generate(self, env):
+        marking_type = env.marking_type
+
+        vp = VariableProvider()
+        self_var = vp.new_variable(marking_type.type, 'self')
+        table_var = vp.new_variable(TypeInfo.get('CollapseTable'), 'table')
+
+        builder = cyast.Builder()
+        builder.begin_FunctionCDef( name = "collapse",
+                                    args = (cyast.A(self_var.name, type = env.type2str(marking_type.type))
+                                            .param(table_var.name, type = env.type2str(table_var.type))),
+                                    returns = cyast.E("void") )
+
+        collapsed = set()
         for place_type in marking_type.place_types.itervalues():
-#            if place_type.is_packed or place_type.is_helper:
-#                pass
-#            else:
-#                if place_type.type.is_Int or place_type.type.is_Short or place_type.type.is_Char:
-#                    native_place = marking_type.id_provider.get(place_type)
-#                    builder.emit(cyast.E('h = (h ^ self.{place_name}) * {mult}'.format(place_name=native_place,
-#                                                                                 mult=mult))
-#                                 )
-#                else:
-            if place_type.get_attribute_name() in hashed:
+            if place_type.is_packed or place_type.is_helper:
+                continue
+            if place_type.get_attribute_name() in collapsed:
                 continue
+            collapsed.add(place_type.get_attribute_name())
+            builder.emit( place_type.collapse_stmt(env, table_var = table_var, marking_var = self_var) )
 
-            place_hash = place_type.hash_expr(env, marking_var = self_var)
-            builder.emit(cyast.Assign(targets=[cyast.Name('h')],
-                                      value=cyast.BinOp(left=cyast.BinOp(left=cyast.Name('h'),
-                                                                         op=cyast.BitXor(),
-                                                                         right=place_hash),
-                                                        op=cyast.Mult(),
-                                                        right=cyast.Num(mult))
-                                      )
-                         )
-            mult = (mult + (82521 * i + i)) % sys.maxint
-            i += 1
+        builder.end_FunctionDef()
+        return cyast.to_ast(builder)
+
+def pickled_fields(marking_type):
+    """ Layout of the state tuple used by C{__reduce__} and C{__setstate__}.
+
+    Packed bytes come first (packed places are restored with them), then
+    one entry per remaining place type.
+
+    @return: packed attribute name, packed byte count and place types.
+    @rtype: C{tuple}
+    """
+    handled = set()
+    attr_name, count = None, 0
+    if marking_type.chunk_manager.packed_bits() > 0:
+        attr_name, _, count = marking_type.chunk_manager.packed_attribute()
+        handled.add(attr_name)
+
+    place_types = []
+    for place_type in marking_type.place_types.itervalues():
+        if place_type.get_attribute_name() in handled:
+            continue
+        handled.add(place_type.get_attribute_name())
+        place_types.append(place_type)
+    return attr_name, count, place_types
+
+class ReduceGenerator(MarkingTypeMethodGenerator):
+
+    def generate(self, env):
+        marking_type = env.marking_type
+
+        vp = VariableProvider()
+        self_var = vp.new_variable(marking_type.type, 'self')
+
+        builder = cyast.Builder()
+        builder.begin_FunctionDef( name = "__reduce__",
+                                   args = cyast.A("self", type = "Marking") )
+
+        attr_name, count, place_types = pickled_fields(marking_type)
+        state = [ cyast.E('{}.{}[{!s}]'.format(self_var.name, attr_name, index))
+                  for index in range(count) ]
+        for place_type in place_types:
+            state.append(place_type.getstate_expr(env, marking_var = self_var))
+
+        builder.emit_Return(cyast.Tuple([ cyast.E("Marking"),
+                                          cyast.Tuple(),
+                                          cyast.Tuple(state) ]))
+        builder.end_FunctionDef()
+        return cyast.to_ast(builder)
+
+class SetStateGenerator(MarkingTypeMethodGenerator):
+
+    def generate(self, env):
+        marking_type = env.marking_type
+
+        vp = VariableProvider()
+        self_var = vp.new_variable(marking_type.type, 'self')
+
+        builder = cyast.Builder()
+        builder.begin_FunctionDef( name = "__setstate__",
+                                   args = cyast.A("self", type = "Marking").param("state", type = "tuple") )
+
+        attr_name, count, place_types = pickled_fields(marking_type)
+        for index in range(count):
+            builder.emit(cyast.E('{}.{}[{!s}] = state[{!s}]'.format(self_var.name, attr_name, index, index)))
+
+        for index, place_type in enumerate(place_types, count):
+            state_expr = cyast.E('state[{!s}]'.format(index))
+            builder.emit(place_type.setstate_stmt(env, state_expr, marking_var = self_var))
 
-        builder.emit_Return(cyast.E("h"))
         builder.end_FunctionDef()
         return cyast.to_ast(builder)
 
@@ -278,7 +371,8 @@ class DumpExprGenerator(MarkingTypeMethodGenerator):
     def generate(self, env):
         marking_type = env.marking_type
         
-        items = list(marking_type.place_types.iteritems())
+        # implied places are dumped as if they were stored
+        items = list(marking_type.place_types.iteritems()) + list(marking_type.implied_place_types.iteritems())
         items.sort(lambda (n1, t1), (n2, t2) : cmp(n1, n2))
 
         vp = VariableProvider()
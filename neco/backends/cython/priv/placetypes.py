@@ -1,5 +1,5 @@
 from common import NecoTypeError, from_neco_lib
-from lowlevel import Mask
+from lowlevel import Mask, bits_sizeof, bits_per_byte
 from neco import extsnakes
 from neco.core.info import TypeInfo
 from neco.core.nettypes import provides_by_index_access, \
@@ -131,6 +131,36 @@ class CythonPlaceType(object):
     def checking_need_helper(self):
         return self._checking_need_helper_
 
+    def getstate_expr(self, env, marking_var):
+        """ Picklable expression holding the place content. """
+        return cyast.E('{}.{}'.format(marking_var.name, self.get_attribute_name()))
+
+    def setstate_stmt(self, env, state_expr, marking_var):
+        """ Restore the place content from a value built by L{getstate_expr}. """
+        return cyast.Assign(targets = [cyast.E('{}.{}'.format(marking_var.name, self.get_attribute_name()))],
+                            value = state_expr)
+
+    # bits of the folded place content that may differ between two
+    # contents, 32 for places folded through place or python hashes
+    fingerprint_bits = 32
+
+    def fingerprint_expr(self, env, h_expr, marking_var):
+        """ Fold the place content into the marking fingerprint C{h_expr}.
+
+        Place types whose content can be folded without loss set
+        L{fingerprint_bits} to 64 (see C{fingerprint_mix}).
+        """
+        # python hashes may be negative
+        return cyast.Call(func = cyast.E(from_neco_lib('fingerprint_mix')),
+                          args = [ h_expr, cyast.Cast(target = 'long', value = self.hash_expr(env, marking_var)) ])
+
+    def collapse_stmt(self, env, table_var, marking_var):
+        """ Replace the place content by the equal value stored in a collapse table.
+
+        Places holding scalar or packed values are left untouched.
+        """
+        return []
+
 ################################################################################
 
 @checking_without_helper
@@ -161,6 +191,11 @@ class ObjectPlaceType(coretypes.ObjectPlaceType, CythonPlaceType):
     def hash_expr(self, env, marking_var):
         return cyast.E('{}.{}.hash()'.format(marking_var.name, self.chunk.get_attribute_name()))
 
+    def fingerprint_expr(self, env, h_expr, marking_var):
+        # multiset hashes ignore multiplicities
+        return cyast.Call(func = cyast.E('{}.{}.fingerprint'.format(marking_var.name, self.chunk.get_attribute_name())),
+                          args = [ h_expr ])
+
     def eq_expr(self, env, left, right):
         return cyast.Compare(left = left, ops = [cyast.Eq()], comparators = [right])
 
@@ -238,6 +273,11 @@ class ObjectPlaceType(coretypes.ObjectPlaceType, CythonPlaceType):
 
     def card_expr(self, env, marking_var):
         return cyast.E('{}.{}.size()'.format(marking_var.name, self.chunk.get_attribute_name()))
+
+    def collapse_stmt(self, env, table_var, marking_var):
+        attr_name = self.chunk.get_attribute_name()
+        return cyast.E("{}.{} = {}.intern_multiset({}.{})".format(marking_var.name, attr_name, table_var.name,
+                                                                 marking_var.name, attr_name))
         # return cyast.Call(func = cyast.E('len'),
         #                  args = [ self.attribute_expr(env, marking_var) ])
 
@@ -283,6 +323,18 @@ class GenericPlaceType(coretypes.PlaceType, CythonPlaceType):
         place_expr = self.attribute_expr(env, marking_var)
         return cyast.Call(func = cyast.Builder.Helper(place_expr).attr("hash").ast())
 
+    @property
+    def fingerprint_bits(self):
+        # hashes of int tokens are bijective
+        return 64 if self.token_type.is_Int else 32
+
+    def fingerprint_expr(self, env, h_expr, marking_var):
+        if not self.token_type.is_Int:
+            return CythonPlaceType.fingerprint_expr(self, env, h_expr, marking_var)
+        place_expr = self.attribute_expr(env, marking_var)
+        return cyast.Call(func = cyast.Builder.Helper(place_expr).attr("fingerprint").ast(),
+                          args = [ h_expr ])
+
     def eq_expr(self, env, left, right):
         return cyast.Call(func = cyast.Builder.Helper(left).attr("equals").ast(), args = [ right ])
 
@@ -433,6 +485,296 @@ class IntPlaceType(GenericPlaceType):
         return cyast.Call(func = cyast.E(from_neco_lib("int_place_type_to_multiset")),
                           args = [place_expr])
 
+    def getstate_expr(self, env, marking_var):
+        check_marking_type(marking_var)
+
+        place_expr = self.attribute_expr(env, marking_var)
+        return cyast.Call(func = cyast.E(from_neco_lib("int_place_type_to_list")),
+                          args = [place_expr])
+
+    def setstate_stmt(self, env, state_expr, marking_var):
+        check_marking_type(marking_var)
+
+        return cyast.Assign(targets = [self.attribute_expr(env, marking_var)],
+                            value = cyast.Call(func = cyast.E(from_neco_lib("int_place_type_from_list")),
+                                               args = [state_expr]))
+
+    def collapse_stmt(self, env, table_var, marking_var):
+        check_marking_type(marking_var)
+
+        attr_name = self.chunk.get_attribute_name()
+        return cyast.E("{}.{} = {}.intern_int_place({}.{})".format(marking_var.name, attr_name, table_var.name,
+                                                                  marking_var.name, attr_name))
+
+
+class CountedIntPlaceType(GenericPlaceType):
+    """ Place type for 'int' places holding many identical tokens.
+
+    Tokens are stored as (value, count) pairs, single token arcs enumerate
+    distinct values and tokens are removed by value.
+    """
+
+    def __init__(self, place_info, marking_type):
+        assert(place_info.type == TypeInfo.get('Int'))
+        GenericPlaceType.__init__(self, place_info, marking_type,
+                                  TypeInfo.get("CountedIntPlace"), TypeInfo.get("Int"))
+        # removing by index would walk the pairs
+        self.disable_by_index_deletion()
+
+    def generic_type_name(self, env):
+        return from_neco_lib('TCountedPlaceType[' + env.type2str(self.token_type) + ']')
+
+    def enumerate(self, env, marking_var, token_var, compiled_body):
+        index_var = env.variable_provider.new_variable(variable_type = TypeInfo.get('Int'))
+        size_var = env.variable_provider.new_variable(variable_type = TypeInfo.get('Int'))
+
+        env.try_declare_cvar(token_var.name, token_var.type)
+        env.try_declare_cvar(index_var.name, TypeInfo.get('Int'))
+        env.try_declare_cvar(size_var.name, TypeInfo.get('Int'))
+
+        place_expr = self.attribute_expr(env, marking_var)
+        distinct = cyast.Call(func = cyast.Builder.Helper(place_expr).attr("distinct").ast())
+        get_value = cyast.Call(func = cyast.Builder.Helper(place_expr).attr("value").ast(),
+                               args = [ cyast.Name(index_var.name) ])
+
+        return [ cyast.Assign(targets = [cyast.Name(size_var.name)],
+                              value = distinct),
+                 cyast.Builder.CFor(start = cyast.Num(0),
+                                    start_op = cyast.LtE(),
+                                    target = cyast.Name(index_var.name),
+                                    stop_op = cyast.Lt(),
+                                    stop = cyast.Name(size_var.name),
+                                    body = [ cyast.Assign(targets = [cyast.Name(token_var.name)],
+                                                          value = get_value),
+                                             compiled_body ],
+                                    orelse = []) ]
+
+    def multiset_expr(self, env, marking_var):
+        check_marking_type(marking_var)
+
+        place_expr = self.attribute_expr(env, marking_var)
+        return cyast.Call(func = cyast.E(from_neco_lib("counted_place_type_to_multiset")),
+                          args = [place_expr])
+
+    def getstate_expr(self, env, marking_var):
+        check_marking_type(marking_var)
+
+        place_expr = self.attribute_expr(env, marking_var)
+        return cyast.Call(func = cyast.E(from_neco_lib("counted_place_type_to_list")),
+                          args = [place_expr])
+
+    def setstate_stmt(self, env, state_expr, marking_var):
+        check_marking_type(marking_var)
+
+        return cyast.Assign(targets = [self.attribute_expr(env, marking_var)],
+                            value = cyast.Call(func = cyast.E(from_neco_lib("counted_place_type_from_list")),
+                                               args = [state_expr]))
+
+class DensePlaceType(coretypes.PlaceType, CythonPlaceType):
+    """ Place type for 'int' places with a small known domain.
+
+    Tokens are counted in a fixed size vector stored in the marking, one
+    counter per value of the domain range, so adding and removing tokens
+    updates a single counter and hashing and comparing scan the vector.
+    Counters are the narrowest unsigned type holding the bound of the
+    place, C ints if the place is not known to be bounded.
+
+    Annotated domains are checked against the initial marking and the
+    values of output arcs by L{neco.core.info.NetInfo.infer_domains},
+    debug builds also check each added token.
+    """
+
+    # counter types from the narrowest one, with their largest count
+    counter_types = [ ('UnsignedChar', 0xff), ('UnsignedShort', 0xffff) ]
+
+    # maximal size of the counter vector of a place in bytes
+    max_bytes = 64
+
+    # counters are folded one by one
+    fingerprint_bits = 64
+
+    @classmethod
+    def counter_type(cls, place_info):
+        """ Type of the counters of a place and their largest count, C{None}
+        for C ints.
+        """
+        if place_info.bound is not None:
+            for type_name, largest in cls.counter_types:
+                if place_info.bound <= largest:
+                    return TypeInfo.get(type_name), largest
+        return TypeInfo.get('Int'), None
+
+    @classmethod
+    def fits(cls, place_info):
+        """ C{True} if the counter vector of a place fits in C{max_bytes}. """
+        width = place_info.domain[-1] - place_info.domain[0] + 1
+        counter_type, _ = cls.counter_type(place_info)
+        return width * bits_sizeof(counter_type) <= cls.max_bytes * bits_per_byte
+
+    def __init__(self, place_info, marking_type):
+        assert(place_info.type == TypeInfo.get('Int'))
+        coretypes.PlaceType.__init__(self,
+                                     place_info = place_info,
+                                     marking_type = marking_type,
+                                     type_info = TypeInfo.get('Int'),
+                                     token_type = TypeInfo.get('Int'))
+
+        self.low = place_info.domain[0]
+        self.width = place_info.domain[-1] - self.low + 1
+        assert(self.fits(place_info))
+
+        counter_type, self.largest = self.counter_type(place_info)
+        self.chunk = marking_type.chunk_manager.new_chunk(marking_type.id_provider.get(self),
+                                                          counter_type,
+                                                          count = self.width)
+        self.chunk.hint = "{} - {!s} (dense [{!s}, {!s}])".format(place_info.name, place_info.type,
+                                                                 self.low, self.low + self.width - 1)
+        # tokens outside of the range would be counted out of the vector,
+        # narrow counters silently wrap, check them in debug builds
+        self.check_domain = marking_type.config.debug
+
+    def attribute_expr(self, env, marking_var):
+        return cyast.E('{}.{}'.format(marking_var.name, self.chunk.get_attribute_name()))
+
+    def counter_expr(self, env, token_expr, marking_var):
+        """ Counter of a token. """
+        if self.low != 0:
+            token_expr = cyast.BinOp(left = token_expr,
+                                     op = cyast.Sub(),
+                                     right = cyast.Num(self.low))
+        return cyast.Subscript(value = self.attribute_expr(env, marking_var),
+                               slice = cyast.Index(token_expr))
+
+    def new_place_stmt(self, env, marking_var):
+        return cyast.stmt(cyast.Call(func = cyast.E(from_neco_lib('neco_dense_clear')),
+                                     args = [ self.attribute_expr(env, marking_var), cyast.Num(self.width) ]))
+
+    def delete_stmt(self, env, marking_var):
+        return []
+
+    def hash_expr(self, env, marking_var):
+        return cyast.Call(func = cyast.E(from_neco_lib('neco_dense_hash')),
+                          args = [ self.attribute_expr(env, marking_var), cyast.Num(self.width) ])
+
+    def compare_expr(self, env, left_marking_var, right_marking_var):
+        check_marking_type(left_marking_var)
+        check_marking_type(right_marking_var)
+
+        return cyast.Call(func = cyast.E(from_neco_lib('neco_dense_compare')),
+                          args = [ self.attribute_expr(env, left_marking_var),
+                                   self.attribute_expr(env, right_marking_var),
+                                   cyast.Num(self.width) ])
+
+    def card_expr(self, env, marking_var):
+        return cyast.Call(func = cyast.E(from_neco_lib('neco_dense_size')),
+                          args = [ self.attribute_expr(env, marking_var), cyast.Num(self.width) ])
+
+    def not_empty_expr(self, env, marking_var):
+        return self.card_expr(env, marking_var)
+
+    def dump_expr(self, env, marking_var):
+        check_marking_type(marking_var)
+
+        return cyast.Call(func = cyast.E(from_neco_lib('neco_dense_cstr')),
+                          args = [ self.attribute_expr(env, marking_var),
+                                   cyast.Num(self.width),
+                                   cyast.Num(self.low) ])
+
+    def iterable_expr(self, env, marking_var):
+        return cyast.Call(func = cyast.E(from_neco_lib('dense_place_type_to_list')),
+                          args = [ self.attribute_expr(env, marking_var),
+                                   cyast.Num(self.width),
+                                   cyast.Num(self.low) ])
+
+    def remove_token_stmt(self, env, token_expr, compiled_token, marking_var):
+        check_marking_type(marking_var)
+
+        return cyast.AugAssign(target = self.counter_expr(env, compiled_token, marking_var),
+                               op = cyast.Sub(),
+                               value = cyast.Num(1))
+
+    def add_token_stmt(self, env, token_expr, compiled_token, marking_var):
+        check_marking_type(marking_var)
+
+        update = cyast.AugAssign(target = self.counter_expr(env, compiled_token, marking_var),
+                                 op = cyast.Add(),
+                                 value = cyast.Num(1))
+        if not self.check_domain:
+            return update
+        checks = [ cyast.Assert(test = cyast.Compare(left = cyast.Num(self.low),
+                                                     ops = [ cyast.LtE(), cyast.Lt() ],
+                                                     comparators = [ compiled_token, cyast.Num(self.low + self.width) ]),
+                                msg = cyast.Str("place {} out of domain".format(self.info.name))) ]
+        if self.largest is not None:
+            checks.append(cyast.Assert(test = cyast.Compare(left = self.counter_expr(env, compiled_token, marking_var),
+                                                            ops = [ cyast.Lt() ],
+                                                            comparators = [ cyast.Num(self.largest) ]),
+                                       msg = cyast.Str("place {} overflow".format(self.info.name))))
+        return checks + [ update ]
+
+    def copy_stmt(self, env, dst_marking_var, src_marking_var):
+        check_marking_type(dst_marking_var)
+        check_marking_type(src_marking_var)
+
+        return cyast.stmt(cyast.Call(func = cyast.E(from_neco_lib('neco_dense_copy')),
+                                     args = [ self.attribute_expr(env, dst_marking_var),
+                                              self.attribute_expr(env, src_marking_var),
+                                              cyast.Num(self.width) ]))
+
+    def light_copy_stmt(self, env, dst_marking_var, src_marking_var):
+        return self.copy_stmt(env, dst_marking_var, src_marking_var)
+
+    def token_expr(self, env, token):
+        return cyast.E(repr(token))
+
+    def enumerate(self, env, marking_var, token_var, compiled_body):
+        """ Enumerate distinct tokens, values with a non null counter. """
+        index_var = env.variable_provider.new_variable(variable_type = TypeInfo.get('Int'))
+
+        env.try_declare_cvar(token_var.name, token_var.type)
+        env.try_declare_cvar(index_var.name, TypeInfo.get('Int'))
+
+        counter = cyast.Subscript(value = self.attribute_expr(env, marking_var),
+                                  slice = cyast.Index(cyast.Name(index_var.name)))
+        token = cyast.BinOp(left = cyast.Name(index_var.name),
+                            op = cyast.Add(),
+                            right = cyast.Num(self.low))
+        return [ cyast.Builder.CFor(start = cyast.Num(0),
+                                    start_op = cyast.LtE(),
+                                    target = cyast.Name(index_var.name),
+                                    stop_op = cyast.Lt(),
+                                    stop = cyast.Num(self.width),
+                                    body = [ cyast.If(test = cyast.Compare(left = counter,
+                                                                           ops = [ cyast.Gt() ],
+                                                                           comparators = [ cyast.Num(0) ]),
+                                                      body = [ cyast.Assign(targets = [cyast.Name(token_var.name)],
+                                                                            value = token),
+                                                               compiled_body ],
+                                                      orelse = []) ],
+                                    orelse = []) ]
+
+    def enumerate_tokens(self, env, token_var, marking_var, body):
+        return self.enumerate(env, marking_var, token_var, body)
+
+    def multiset_expr(self, env, marking_var):
+        check_marking_type(marking_var)
+
+        return cyast.Call(func = cyast.E(from_neco_lib('dense_place_type_to_multiset')),
+                          args = [ self.attribute_expr(env, marking_var),
+                                   cyast.Num(self.width),
+                                   cyast.Num(self.low) ])
+
+    def getstate_expr(self, env, marking_var):
+        return self.iterable_expr(env, marking_var)
+
+    def setstate_stmt(self, env, state_expr, marking_var):
+        check_marking_type(marking_var)
+
+        return cyast.stmt(cyast.Call(func = cyast.E(from_neco_lib('dense_place_type_from_list')),
+                                     args = [ self.attribute_expr(env, marking_var),
+                                              cyast.Num(self.width),
+                                              cyast.Num(self.low),
+                                              state_expr ]))
 
 class PidPlaceType(GenericPlaceType):
     """ Place type for small unbounded 'int' places. """
@@ -442,6 +784,14 @@ class PidPlaceType(GenericPlaceType):
         GenericPlaceType.__init__(self, place_info, marking_type,
                                   TypeInfo.get("PidPlace"), TypeInfo.get("Pid"))
 
+    def getstate_expr(self, env, marking_var):
+        # pids are native pointers without a python counterpart, nets
+        # compiled with pid normalization have no pickling support
+        raise NotImplementedError("markings with pid places cannot be pickled")
+
+    def setstate_stmt(self, env, state_expr, marking_var):
+        raise NotImplementedError("markings with pid places cannot be pickled")
+
 class OneSafePlaceType(coretypes.OneSafePlaceType, CythonPlaceType):
     """ Cython one safe place Type implementation.
 
@@ -467,6 +817,11 @@ class OneSafePlaceType(coretypes.OneSafePlaceType, CythonPlaceType):
         self.helper_chunk.hint = "{} - {!s} <helper>".format(place_info.name, place_info.type)
         self.chunk.hint = "{} - {!s}".format(place_info.name, place_info.type)
 
+    @property
+    def is_native(self):
+        """ C{True} if the token is stored in a native type, C{False} otherwise """
+        return self.info.type.is_Int
+
     def new_place_stmt(self, env, marking_var):
         helper = self.helper_chunk
         if helper.packed:
@@ -478,20 +833,43 @@ class OneSafePlaceType(coretypes.OneSafePlaceType, CythonPlaceType):
     def delete_stmt(self, env, marking_var):
         return []
 
-    def hash_expr(self, env, marking_var):
-        h = "hash({}.{})".format(marking_var.name, self.chunk.get_attribute_name())
+    def _present_source(self, marking_var):
         if self.helper_chunk.packed:
             mask = int(self.helper_chunk.mask())
             bytes_offset, _ = self.helper_chunk.offset()
-            test = "{}.{}[{}] & {}".format(marking_var.name,
+            return "{}.{}[{}] & {}".format(marking_var.name,
                                            self.helper_chunk.get_attribute_name(),
                                            bytes_offset,
                                            mask)
         else:
-            test = "{}.{}".format(marking_var.name, self.helper_chunk.get_attribute_name())
+            return "{}.{}".format(marking_var.name, self.helper_chunk.get_attribute_name())
+
+    def hash_expr(self, env, marking_var):
+        if self.is_native:
+            # native tokens are their own hash
+            h = "{}.{}".format(marking_var.name, self.chunk.get_attribute_name())
+        else:
+            h = "hash({}.{})".format(marking_var.name, self.chunk.get_attribute_name())
+        test = self._present_source(marking_var)
 
         return cyast.E("{hash} if {test} else 1".format(hash = h, test = test))
 
+    @property
+    def fingerprint_bits(self):
+        return 64 if self.is_native else 32
+
+    def fingerprint_expr(self, env, h_expr, marking_var):
+        """ Fold the presence of the token, then its value if present. """
+        if not self.is_native:
+            return CythonPlaceType.fingerprint_expr(self, env, h_expr, marking_var)
+        mix = cyast.E(from_neco_lib('fingerprint_mix'))
+        token = cyast.E("{}.{}".format(marking_var.name, self.chunk.get_attribute_name()))
+        return cyast.IfExp(test = cyast.E(self._present_source(marking_var)),
+                           body = cyast.Call(func = mix,
+                                             args = [ cyast.Call(func = mix, args = [ h_expr, cyast.Num(1) ]),
+                                                      token ]),
+                           orelse = cyast.Call(func = mix, args = [ h_expr, cyast.Num(0) ]))
+
     def eq_expr(self, env, left, right):
         return cyast.Compare(left = left,
                              ops = [cyast.Eq()],
@@ -662,12 +1040,36 @@ class OneSafePlaceType(coretypes.OneSafePlaceType, CythonPlaceType):
                             body = [ cyast.E('1') ],
                             orelse = [ cyast.E('0')])
 
+    def getstate_expr(self, env, marking_var):
+        place_expr = cyast.E("{}.{}".format(marking_var.name, self.chunk.get_attribute_name()))
+        if self.helper_chunk.packed:
+            # the helper bit is restored with the packed field
+            return place_expr
+        helper_expr = cyast.E("{}.{}".format(marking_var.name, self.helper_chunk.get_attribute_name()))
+        return cyast.Tuple([ helper_expr, place_expr ])
+
+    def setstate_stmt(self, env, state_expr, marking_var):
+        place_expr = cyast.E("{}.{}".format(marking_var.name, self.chunk.get_attribute_name()))
+        if self.helper_chunk.packed:
+            return cyast.Assign(targets = [place_expr], value = state_expr)
+        helper_expr = cyast.E("{}.{}".format(marking_var.name, self.helper_chunk.get_attribute_name()))
+        return [ cyast.Assign(targets = [helper_expr],
+                              value = cyast.Subscript(state_expr, cyast.Index(cyast.Num(0)))),
+                 cyast.Assign(targets = [place_expr],
+                              value = cyast.Subscript(state_expr, cyast.Index(cyast.Num(1)))) ]
+
 
 ################################################################################
 
 class BTPlaceType(coretypes.BTPlaceType, CythonPlaceType):
     """ Python black token place type implementation.
 
+    Packed places hold their token count in C{bits} bits of the packed
+    attribute, enough for the place bound (one bit for one safe places).
+    Bounds given by place annotations are not checked: if a count
+    exceeds one, the count of that place is wrong in release builds but
+    the other packed places are left intact.
+
     @attention: Using this place type without the BTTokenEnumerator may introduce inconsistency.
     """
 
@@ -678,20 +1080,36 @@ class BTPlaceType(coretypes.BTPlaceType, CythonPlaceType):
                                        type_info = TypeInfo.get('Short'),
                                        token_type = TypeInfo.get('Short'))
 
+        self.bound = place_info.bound
         if packed:
             cython_type = TypeInfo.get('Bool')
+            bits = self.needed_bits(self.bound)
             packed = True
         else:
             cython_type = TypeInfo.get('Short')
+            bits = None
             packed = False
 
         self.chunk = marking_type.chunk_manager.new_chunk(marking_type.id_provider.get(self),
                                                           cython_type,
-                                                          packed = packed)
+                                                          packed = packed,
+                                                          bits = bits)
 
         self.chunk.hint = "{} - {!s}".format(place_info.name, place_info.type)
         self.info = place_info
         self.marking_type = marking_type
+        # counts of packed places silently wrap in their field, check them
+        # in debug builds
+        self.check_overflow = packed and marking_type.config.debug
+
+    @staticmethod
+    def needed_bits(bound):
+        """ Number of bits holding a token count up to C{bound}.
+
+        >>> BTPlaceType.needed_bits(1), BTPlaceType.needed_bits(3), BTPlaceType.needed_bits(4)
+        (1, 2, 3)
+        """
+        return bound.bit_length()
 
     def delete_stmt(self, env, marking_var):
         return []
@@ -699,9 +1117,27 @@ class BTPlaceType(coretypes.BTPlaceType, CythonPlaceType):
     def attribute_expr(self, env, marking_var):
         return cyast.E('{}.{}'.format(marking_var.name, self.chunk.get_attribute_name()))
 
+    def _count_source(self, marking_var):
+        if self.chunk.packed:
+            byte_offset, bit_offset = self.chunk.offset()
+            return '(({object}.{attribute}[{index}] & {mask}) >> {offset})'.format(object = marking_var.name,
+                                                                                attribute = self.chunk.get_attribute_name(),
+                                                                                index = byte_offset,
+                                                                                mask = int(self.chunk.mask()),
+                                                                                offset = bit_offset)
+        else:
+            return '{}.{}'.format(marking_var.name, self.chunk.get_attribute_name())
+
+    def count_expr(self, env, marking_var):
+        """ Number of tokens in the place. """
+        return cyast.E(self._count_source(marking_var))
+
     def hash_expr(self, env, marking_var):
         return cyast.E('{}.{}'.format(marking_var.name, self.chunk.get_attribute_name()))
 
+    # unpacked counts are folded as they are, packed ones with the packed bytes
+    fingerprint_bits = 64
+
     def eq_expr(self, env, left, right):
         return cyast.Compare(left = left,
                              ops = [cyast.Eq()],
@@ -732,12 +1168,12 @@ class BTPlaceType(coretypes.BTPlaceType, CythonPlaceType):
             return cyast.E('{}.{}'.format(marking_var.name, self.chunk.get_attribute_name()))
 
     def dump_expr(self, env, marking_var):
-        if self.chunk.packed:
+        if self.chunk.packed and self.chunk.bits == 1:
             return cyast.IfExp(test = self.not_empty_expr(env, marking_var),
                                body = cyast.Str('[dot]'),
                                orelse = cyast.Str('[]'))
         else:
-            place_expr = cyast.E('{}.{}'.format(marking_var.name, self.chunk.get_attribute_name()))
+            place_expr = self.count_expr(env, marking_var)
             return cyast.BinOp(left = cyast.Str('['),
                                op = cyast.Add(),
                                right = cyast.BinOp(left = cyast.Call(func = cyast.E("', '.join"),
@@ -748,23 +1184,46 @@ class BTPlaceType(coretypes.BTPlaceType, CythonPlaceType):
                                                  right = cyast.Str(']')))
 
     def iterable_expr(self, env, marking_var):
-        if self.chunk.packed:
-            raise NotImplementedError
-        else:
-            place_expr = cyast.E('{}.{}'.format(marking_var.name, self.chunk.get_attribute_name()))
-            return cyast.Call(func = cyast.Name('range'),
-                              args = [ cyast.Num(0), place_expr ])
+        return cyast.Call(func = cyast.Name('range'),
+                          args = [ cyast.Num(0), self.count_expr(env, marking_var) ])
 
-    def remove_token_stmt(self, env, token_expr, compiled_token, marking_var):
-        if self.chunk.packed:
-            # 1 bit only, should be 1, just reset it
-            mask = int(self.chunk.mask())
-            attr = self.chunk.get_attribute_name()
-            byte_offset, _ = self.chunk.offset()
+    def update_packed_stmt(self, env, marking_var, op):
+        """ Add or remove one token of a packed place.
+
+        Only the bits of the place change. A count exceeding the bound
+        of the place wraps modulo 2**bits, which debug builds assert
+        against.
+        """
+        attr = self.chunk.get_attribute_name()
+        byte_offset, bit_offset = self.chunk.offset()
+        if self.chunk.bits == 1:
+            # 1 bit only, flip it
             return cyast.E('{object}.{attribute}[{byte_offset}] ^= {mask}'.format(object = marking_var.name,
                                                                                   attribute = attr,
                                                                                   byte_offset = byte_offset,
-                                                                                  mask = mask))
+                                                                                  mask = int(self.chunk.mask())))
+        # the update is masked, a count going past the field wraps in it
+        # instead of carrying into the neighbouring fields
+        mask = int(self.chunk.mask())
+        byte = '{}.{}[{}]'.format(marking_var.name, attr, byte_offset)
+        update = cyast.E('{byte} = ({byte} & {keep}) | (({byte} {op} {unit}) & {mask})'.format(byte = byte,
+                                                                                           keep = 0xff & ~mask,
+                                                                                           op = op,
+                                                                                           unit = 1 << bit_offset,
+                                                                                           mask = mask))
+        if not self.check_overflow:
+            return update
+        if op == '+':
+            check = cyast.E('assert {} < {!s}, "place {} overflow"'.format(self._count_source(marking_var),
+                                                                            self.bound, self.info.name))
+        else:
+            check = cyast.E('assert {} > 0, "place {} underflow"'.format(self._count_source(marking_var),
+                                                                          self.info.name))
+        return [ check, update ]
+
+    def remove_token_stmt(self, env, token_expr, compiled_token, marking_var):
+        if self.chunk.packed:
+            return self.update_packed_stmt(env, marking_var, '-')
 
         else:
             place_expr = cyast.E('{}.{}'.format(marking_var.name, self.chunk.get_attribute_name()))
@@ -774,14 +1233,7 @@ class BTPlaceType(coretypes.BTPlaceType, CythonPlaceType):
 
     def add_token_stmt(self, env, token_expr, compiled_token, marking_var):
         if self.chunk.packed:
-            # 1 bit only, should be 1, just reset it
-            mask = int(self.chunk.mask())
-            attr = self.chunk.get_attribute_name()
-            byte_offset, _ = self.chunk.offset()
-            return cyast.E('{object}.{attribute}[{byte_offset}] ^= {mask}'.format(object = marking_var.name,
-                                                                                  attribute = attr,
-                                                                                  byte_offset = byte_offset,
-                                                                                  mask = mask))
+            return self.update_packed_stmt(env, marking_var, '+')
         else:
             place_expr = cyast.E('{}.{}'.format(marking_var.name, self.chunk.get_attribute_name()))
             return cyast.AugAssign(target = place_expr,
@@ -813,13 +1265,15 @@ class BTPlaceType(coretypes.BTPlaceType, CythonPlaceType):
                         orelse = [])
 
     def card_expr(self, env, marking_var):
-        return cyast.IfExp(test = self.not_empty_expr(env, marking_var),
-                           body = [ cyast.E('1') ],
-                           orelse = [ cyast.E('0')])
+        if self.chunk.packed and self.chunk.bits == 1:
+            return cyast.IfExp(test = self.not_empty_expr(env, marking_var),
+                               body = [ cyast.E('1') ],
+                               orelse = [ cyast.E('0')])
+        return self.count_expr(env, marking_var)
 
 
     def multiset_expr(self, env, marking_var):
-        if self.chunk.packed:
+        if self.chunk.packed and self.chunk.bits == 1:
             ifexp = cyast.IfExp(test = self.not_empty_expr(env, marking_var),
                                 body = [ cyast.E('{dot : 1}') ],
                                 orelse = [ cyast.E('{}')])
@@ -827,8 +1281,7 @@ class BTPlaceType(coretypes.BTPlaceType, CythonPlaceType):
                               args = [ ifexp ])
 
         else:
-            dict_expr = cyast.Dict([cyast.E('dot')], [cyast.E('{}.{}'.format(marking_var.name,
-                                                                             self.chunk.get_attribute_name()))])
+            dict_expr = cyast.Dict([cyast.E('dot')], [self.count_expr(env, marking_var)])
 
             ifexp = cyast.IfExp(test = self.not_empty_expr(env, marking_var),
                                 body = [ dict_expr ],
@@ -849,6 +1302,89 @@ class BTPlaceType(coretypes.BTPlaceType, CythonPlaceType):
                                       body = [ compiled_body ])
             return [ ifnode ]
 
+class ImpliedBTPlaceType(coretypes.BTPlaceType, CythonPlaceType):
+    """ Black token place omitted from markings.
+
+    The token count of the place is computed from the stored black token
+    places of a P-invariant (see L{neco.core.bounds.implied_places}), adding
+    or removing tokens is a no-op. Implied place types are not part of the
+    marking structure, they are kept apart from other place types by the
+    marking type.
+    """
+
+    def __init__(self, place_info, marking_type):
+        coretypes.BTPlaceType.__init__(self,
+                                       place_info = place_info,
+                                       marking_type = marking_type,
+                                       type_info = TypeInfo.get('Short'),
+                                       token_type = TypeInfo.get('Short'))
+        self.weight, self.constant, self.terms = place_info.invariant
+
+    def _count_source(self, marking_var):
+        source = str(self.constant)
+        for name, weight in self.terms:
+            place_type = self.marking_type.get_place_type_by_name(name)
+            term = place_type._count_source(marking_var)
+            if weight != 1:
+                term = '{!s} * {}'.format(weight, term)
+            source = '{} - {}'.format(source, term)
+        if self.weight != 1:
+            return '(({}) // {!s})'.format(source, self.weight)
+        return '({})'.format(source)
+
+    def count_expr(self, env, marking_var):
+        """ Number of tokens in the place. """
+        return cyast.E(self._count_source(marking_var))
+
+    def not_empty_expr(self, env, marking_var):
+        return cyast.E('{} > 0'.format(self._count_source(marking_var)))
+
+    def dump_expr(self, env, marking_var):
+        place_expr = self.count_expr(env, marking_var)
+        return cyast.BinOp(left = cyast.Str('['),
+                           op = cyast.Add(),
+                           right = cyast.BinOp(left = cyast.Call(func = cyast.E("', '.join"),
+                                                             args = [cyast.BinOp(left = cyast.List([cyast.Str('dot')]),
+                                                                               op = cyast.Mult(),
+                                                                               right = place_expr)]),
+                                             op = cyast.Add(),
+                                             right = cyast.Str(']')))
+
+    def iterable_expr(self, env, marking_var):
+        return cyast.Call(func = cyast.Name('range'),
+                          args = [ cyast.Num(0), self.count_expr(env, marking_var) ])
+
+    def remove_token_stmt(self, env, token_expr, compiled_token, marking_var):
+        return []
+
+    def add_token_stmt(self, env, token_expr, compiled_token, marking_var):
+        return []
+
+    def token_expr(self, env, token):
+        return cyast.E("dot")
+
+    def enumerate_tokens(self, checker_env, loop_var, marking_var, body):
+        return cyast.If(test = self.not_empty_expr(checker_env, marking_var),
+                        body = [cyast.Assign(targets = [cyast.Name(loop_var.name)],
+                                           value = cyast.E("dot")),
+                              body],
+                        orelse = [])
+
+    def card_expr(self, env, marking_var):
+        return self.count_expr(env, marking_var)
+
+    def multiset_expr(self, env, marking_var):
+        dict_expr = cyast.Dict([cyast.E('dot')], [self.count_expr(env, marking_var)])
+        ifexp = cyast.IfExp(test = self.not_empty_expr(env, marking_var),
+                            body = [ dict_expr ],
+                            orelse = [ cyast.E('{}')])
+        return cyast.Call(func = cyast.E(env.type2str(TypeInfo.get('MultiSet'))),
+                          args = [ ifexp ])
+
+    def enumerate(self, env, marking_var, token_var, compiled_body):
+        return [ cyast.Builder.If(test = self.not_empty_expr(env = env, marking_var = marking_var),
+                                  body = [ compiled_body ]) ]
+
 ################################################################################
 #
 ################################################################################
@@ -1340,6 +1876,13 @@ class GeneratorPlaceType(coretypes.PlaceType, CythonPlaceType):
         place_expr = self.attribute_expr(env, marking_var)
         return cyast.Builder.Helper(place_expr).attr("hash").call().eq(cyast.Num(0)).ast()
 
+    def getstate_expr(self, env, marking_var):
+        # see PidPlaceType.getstate_expr
+        raise NotImplementedError("markings with generator places cannot be pickled")
+
+    def setstate_stmt(self, env, state_expr, marking_var):
+        raise NotImplementedError("markings with generator places cannot be pickled")
+
     @should_not_be_called
     def iterable_expr(self, env, marking_var):
         pass
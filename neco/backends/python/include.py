@@ -69,107 +69,129 @@ def normalize_marking(marking, current_set, state_space, hash_set, todo_set):
     perm_log.write(".")
     return marking
 
-def state_space():
+class StateTable(object):
+    """ Markings indexed by dense ids assigned on insertion. """
+    __slots__ = ('states', 'ids')
+
+    def __init__(self):
+        self.states = []
+        self.ids = {}
+
+    def add(self, marking):
+        """ Id of a marking, added with the next id if absent. """
+        count = len(self.states)
+        i = self.ids.setdefault(marking, count)
+        if i == count:
+            self.states.append(marking)
+        return i
+
+    def lookup(self, marking):
+        """ Id of a marking, -1 if absent. """
+        return self.ids.get(marking, -1)
+
+    def __len__(self):
+        return len(self.states)
+
+    def __getitem__(self, i):
+        return self.states[i]
+
+    def __iter__(self):
+        return iter(self.states)
+
+    def __contains__(self, marking):
+        return marking in self.ids
+
+def state_space_table():
+    """ State space exploration.
+
+    Markings are numbered in discovery order by a state table, the
+    markings to expand are the ones with ids not reached yet.
+
+    @return: table of reachable markings, with ids from 0.
+    """
     ctx = NecoCtx()
-    succ = set()
-    succs2 = set()
+    visited = StateTable()
+    states = visited.states
     count = 0
     start = time()
     last_time = start
 
-    done = set()
-    todo = set([init()])
-    hash_set = set()
-
-    ctx.state_space = done
-    ctx.remaining = todo
-    ctx.pid_free_hash = hash_set
-
-    try:
-        while True:
-            m = todo.pop()
-            count += 1
-
-            done.add(m)
-            succ = succs(m, ctx)
-            succs2 = succ.difference(done)
-            todo.update(succs2)
-            succ.clear()
-            succs2.clear()
-            if (count % 250 == 0):
-                new_time = time()
-                elapsed_time = new_time - start
-                sys.stdout.write('\r{}st {:5.3f}s (global {:5.0f}st/s, since last log {:5.0f}st/s)'.format(count,
-                                                                                                           elapsed_time,
-                                                                                                           count / elapsed_time,
-                                                                                                           100 / (new_time - last_time)))
-                sys.stdout.flush()
-                last_time = new_time
-
-    except KeyError:
-        pass
+    # the table holds both expanded and pending markings
+    ctx.state_space = visited
+    ctx.remaining = set()
+    ctx.pid_free_hash = set()
+
+    visited.add(init())
+    while count < len(states):
+        m = states[count]
+        count += 1
+        for s_mrk in succs(m, ctx):
+            visited.add(s_mrk)
+        if (count % 250 == 0):
+            new_time = time()
+            elapsed_time = new_time - start
+            sys.stdout.write('\r{}st {:5.3f}s (global {:5.0f}st/s, since last log {:5.0f}st/s)'.format(count,
+                                                                                                       elapsed_time,
+                                                                                                       count / elapsed_time,
+                                                                                                       250 / (new_time - last_time)))
+            sys.stdout.flush()
+            last_time = new_time
     print
-    return done
+    return visited
 
 
-def state_space_graph():
+def state_space_graph_table():
+    """ Reachability graph exploration.
+
+    @return: successor ids of each marking, indexed by id, and the
+    table of reachable markings, with ids from 0.
+    """
     ctx = NecoCtx()
-    done = set()
+    visited = StateTable()
+    states = visited.states
+    graph = []
     count = 0
-    next = 1
-    graph = {}
-    mrk_id_map = {}
-    succ_list = []
     start = time()
     last_time = start
 
-    m = init()
-
-    todo = set([m])
-    mrk_id_map[m] = next
-    next += 1
-
-    hash_set = set()
-    ctx.state_space = done
-    ctx.remaining = todo
-    ctx.pid_free_hash = hash_set
-
-    try:
-        while True:
-            count += 1
-            m = todo.pop()
-            done.add(m)
-
-            # new marking, get the id
-            current_node_id = mrk_id_map[m]
-            succ = succs(m, ctx)
-            succ_list = []
-
-            for s_mrk in succ:
-                if mrk_id_map.has_key(s_mrk):
-                    node_id = mrk_id_map[s_mrk]
-                    succ_list.append(node_id)
-                else:
-                    node_id = next
-                    next += 1
-                    succ_list.append(node_id)
-                    mrk_id_map[s_mrk] = node_id
-
-            graph[current_node_id] = succ_list
-
-            todo.update(succ.difference(done))
-            if (count % 250 == 0):
-                new_time = time()
-                elapsed_time = new_time - start
-                sys.stdout.write('\r{}st {:5.3f}s (global {:5.0f}st/s, since last log {:5.0f}st/s)'.format(count,
-                                                                                                            elapsed_time,
-                                                                                                            count / elapsed_time,
-                                                                                                            250 / (new_time - last_time)))
-                sys.stdout.flush()
-                last_time = new_time
-    except KeyError:
-        print
-        return graph, mrk_id_map
+    ctx.state_space = visited
+    ctx.remaining = set()
+    ctx.pid_free_hash = set()
+
+    visited.add(init())
+    while count < len(states):
+        m = states[count]
+        count += 1
+        graph.append([ visited.add(s_mrk) for s_mrk in succs(m, ctx) ])
+        if (count % 250 == 0):
+            new_time = time()
+            elapsed_time = new_time - start
+            sys.stdout.write('\r{}st {:5.3f}s (global {:5.0f}st/s, since last log {:5.0f}st/s)'.format(count,
+                                                                                                       elapsed_time,
+                                                                                                       count / elapsed_time,
+                                                                                                       250 / (new_time - last_time)))
+            sys.stdout.flush()
+            last_time = new_time
     print
-    return graph, mrk_id_map
+    return graph, visited
+
+def state_space():
+    """ State space exploration.
 
+    @return: set of reachable markings.
+    """
+    return set(state_space_table())
+
+def state_space_graph():
+    """ Reachability graph exploration.
+
+    Markings are numbered from 1 in discovery order.
+
+    @return: successor ids indexed by marking ids, and marking ids
+    indexed by markings.
+    """
+    table_graph, visited = state_space_graph_table()
+    graph = dict( (i + 1, [ node_id + 1 for node_id in succ_list ])
+                  for i, succ_list in enumerate(table_graph) )
+    mrk_id_map = dict( (m, i + 1) for i, m in enumerate(visited) )
+    return graph, mrk_id_map
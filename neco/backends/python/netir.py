@@ -1,6 +1,6 @@
 """ Python AST compilser. """
 
-from neco.core.info import ExpressionInfo
+from neco.core.info import ExpressionInfo, VariableInfo
 from nettypes import type2str
 from priv import pyast, mrkpidmethods
 import StringIO
@@ -367,10 +367,47 @@ class CompilerVisitor(coreir.CompilerVisitor):
 
         body.extend(self.compile(node.body))
         body.append(pyast.Return(pyast.Name(id = node.arg_marking_acc_var.name)))
-        return pyast.FunctionDef(name = node.function_name,
-                                  args = pyast.arguments(args = [ pyast.Name(id = node.arg_marking_var.name),
-                                                                  pyast.Name(id = node.arg_ctx_var.name) ]),
-                                  body = body)
+        function = pyast.FunctionDef(name = node.function_name,
+                                     args = pyast.arguments(args = [ pyast.Name(id = node.arg_marking_var.name),
+                                                                     pyast.Name(id = node.arg_ctx_var.name) ]),
+                                     body = body)
+        if self.config.normalize_pids:
+            # normalized successors may differ in any place
+            return function
+        return [ function, self.delta_succs_function(node) ]
+
+    def delta_succs_function(self, node):
+        """ Successors paired with the fields that may differ from the
+        argument marking, used by delta exploration (see L{neco.delta}).
+        """
+        env = self.env
+        marking_type = env.marking_type
+        m = node.arg_marking_var.name
+        acc = node.arg_marking_acc_var.name
+        ctx = node.arg_ctx_var.name
+        succ_var = VariableInfo('s', variable_type = marking_type.type)
+
+        if self.config.optimize_flow:
+            function_names = env.process_succ_functions
+        else:
+            function_names = env.succ_functions
+
+        body = [ pyast.E('l = []') ]
+        for function_name in sorted(function_names):
+            record = marking_type.delta_record_expr(env, succ_var, env.modified_places(function_name))
+            body.append(pyast.Assign(targets = [pyast.Name(id = acc)],
+                                     value = env.marking_set_type.new_marking_set_expr(env)))
+            body.append(pyast.stmt(pyast.E('{}({}, {}, {})'.format(function_name, m, acc, ctx))))
+            body.append(pyast.For(target = pyast.Name(id = 's'),
+                                  iter = pyast.Name(id = acc),
+                                  body = [ pyast.stmt(pyast.Call(func = pyast.E('l.append'),
+                                                                 args = [ pyast.Tuple([ pyast.Name(id = 's'), record ]) ])) ],
+                                  orelse = []))
+        body.append(pyast.E('return l'))
+        return pyast.FunctionDef(name = 'delta_succs',
+                                 args = pyast.arguments(args = [ pyast.Name(id = m),
+                                                                 pyast.Name(id = ctx) ]),
+                                 body = body)
 
     def compile_Init(self, node):
         new_marking = pyast.Assign(targets = [ pyast.Name(id = node.marking_var.name) ],
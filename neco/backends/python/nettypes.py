@@ -157,11 +157,8 @@ class StaticMarkingType(coretypes.MarkingType):
         cls = pyast.ClassDef('Marking', bases=[pyast.Name(id='object')])
 
         elts = []
-        names = []
-        for field in self.fields: # self.place_types.iteritems():
-            name = field.name
+        for name in self.slot_names():
             elts.append(pyast.Str(name))
-            names.append(name)
         
         slots = pyast.Assign(targets=[pyast.Name('__slots__')],
                              value=pyast.Tuple(elts))
@@ -169,6 +166,36 @@ class StaticMarkingType(coretypes.MarkingType):
         cls.body = [slots] + self.generate_methods(env)
         return cls
 
+    def slot_names(self):
+        """ Field names, in the order of marking slots. """
+        return sorted( field.name for field in self.fields )
+
+    def delta_record_expr(self, env, marking_var, modified_places):
+        """ Fields of a successor that may differ from its parent.
+
+        The record flattens pairs of slot indices and values (see
+        L{neco.delta}), the cached hash is always reset.
+
+        @param modified_places: places modified by the fired transitions.
+        @type modified_places: C{set}
+        """
+        names = set([ self.get_field('_hash').name ])
+        for place_info in modified_places:
+            if place_info.name in self.place_types:
+                place_type = self.place_types[place_info.name]
+            else:
+                # flow control places are merged into their process place
+                place_type = self.place_types[place_info.process_name]
+            names.add(place_type.field.name)
+
+        items = []
+        for index, name in enumerate(self.slot_names()):
+            if name in names:
+                items.append(pyast.Num(index))
+                items.append(pyast.E('None' if name == self.get_field('_hash').name
+                                     else '{}.{}'.format(marking_var.name, name)))
+        return pyast.Tuple(items)
+
     def copy_marking_expr(self, env, marking_var, *args):
         return pyast.Call(func=pyast.Attribute(value=pyast.Name(id=marking_var.name),
                                                attr='copy'))
@@ -177,7 +177,7 @@ class LineDumpGenerator(MarkingTypeMethodGenerator):
             if place_type.is_ProcessPlace:
                 builder.emit(place_type.dump_expr(env, self_var, list_var))
             else:
-                builder.begin_If(test = place_type.place_expr(env, self_var))
+                builder.begin_If(test = place_type.not_empty_expr(env, self_var))
                 builder.emit(pyast.stmt(pyast.Call(func = pyast.E('{}.append'.format(list_var.name)),
                                            args = [ pyast.BinOp(left = pyast.Str(s = repr(place_name) + " : "),
                                                               op = pyast.Add(),
@@ -14,6 +14,9 @@ class PythonPlaceType(object):
     def place_expr(self, env, marking_var):
         return pyast.E(self.field.access_from(marking_var))
 
+    def not_empty_expr(self, env, marking_var):
+        return self.place_expr(env, marking_var)
+
     @property
     def is_ProcessPlace(self):
         return False
@@ -232,9 +235,13 @@ class OneSafePlaceType(coretypes.OneSafePlaceType, PythonPlaceType):
         return pyast.E("{} = copy.deepcopy({})".format(self.field.access_from(dst_marking_var),
                                                        self.field.access_from(src_marking_var)))
 
+    def not_empty_expr(self, env, marking_var):
+        # tokens may be false values such as 0
+        return pyast.E("{} is not None".format(self.field.access_from(marking_var)))
+
     def dump_expr(self, env, marking_var):
         place_expr = pyast.E(self.field.access_from(marking_var))
-        return pyast.IfExp(test=place_expr,
+        return pyast.IfExp(test=self.not_empty_expr(env, marking_var),
                            body=pyast.BinOp(left=pyast.Str('['),
                                             op=pyast.Add(),
                                             right=pyast.BinOp(left=pyast.Call(func=pyast.Name('dump'),
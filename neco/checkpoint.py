@@ -0,0 +1,275 @@
+""" Checkpointed state space exploration.
+
+The visited set, the todo list and exploration counters are periodically
+saved to a checkpoint file so that a long exploration can be resumed
+after a crash or a preemption. Checkpoints are requested by a time
+interval or by sending C{SIGUSR1} to the exploration process.
+
+Where C{os.fork} is available checkpoints are written by a child process
+working on a copy-on-write snapshot of the explorer state, so exploration
+only stalls for the duration of the fork. Otherwise they are written
+synchronously.
+
+A checkpoint file is a stream of pickles: a header holding the initial
+marking of the net, the counters, then the todo list and the remaining
+visited markings written by chunks. Checkpoints are written to a
+temporary file which is renamed once complete, so a valid checkpoint
+always exists after the first one. A checkpoint that cannot be written
+is reported and written again at the next interval, exploration goes on.
+"""
+
+from neco.parallel import check_picklable
+from time import time
+import cPickle
+import os
+import signal
+import sys
+
+MAGIC = 'neco-checkpoint'
+VERSION = 1
+
+_CHUNK_SIZE = 4096
+
+def _write_chunks(pickler, markings, count):
+    pickler.dump(count)
+    chunk = []
+    for marking in markings:
+        chunk.append(marking)
+        if len(chunk) == _CHUNK_SIZE:
+            pickler.dump(chunk)
+            pickler.clear_memo()
+            chunk = []
+    if chunk:
+        pickler.dump(chunk)
+        pickler.clear_memo()
+
+def _read_chunks(unpickler):
+    count = unpickler.load()
+    while count > 0:
+        chunk = unpickler.load()
+        count -= len(chunk)
+        for marking in chunk:
+            yield marking
+
+def _same_marking(left, right):
+    # markings only implement equality and may fail on foreign objects
+    try:
+        return type(left) is type(right) and left == right
+    except (AttributeError, TypeError):
+        return False
+
+def write_checkpoint(path, initial, counters, visited, todo):
+    """ Write a checkpoint file.
+
+    @param path: checkpoint file path.
+    @type path: C{str}
+    @param initial: initial marking of the net.
+    @type initial: C{Marking}
+    @param counters: exploration counters.
+    @type counters: C{dict}
+    @param visited: visited markings, including the ones in C{todo}.
+    @type visited: C{set}
+    @param todo: markings to be expanded.
+    @type todo: C{list}
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb', 1 << 16) as f:
+        pickler = cPickle.Pickler(f, cPickle.HIGHEST_PROTOCOL)
+        pickler.dump((MAGIC, VERSION, initial, counters))
+        pickler.clear_memo()
+        _write_chunks(pickler, todo, len(todo))
+
+        frontier = set(todo)
+        _write_chunks(pickler,
+                      ( marking for marking in visited if marking not in frontier ),
+                      len(visited) - len(frontier))
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(tmp_path, path)
+
+def read_checkpoint(path, initial):
+    """ Read a checkpoint file.
+
+    @param path: checkpoint file path.
+    @type path: C{str}
+    @param initial: initial marking of the explored net.
+    @type initial: C{Marking}
+    @return: counters, visited set and todo list.
+    @rtype: C{tuple}
+    @raise ValueError: if the file is not a checkpoint of this net.
+    """
+    with open(path, 'rb', 1 << 16) as f:
+        unpickler = cPickle.Unpickler(f)
+        try:
+            magic, version, saved_initial, counters = unpickler.load()
+        except Exception:
+            raise ValueError("{} is not a checkpoint file".format(path))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{} is not a checkpoint file".format(path))
+        if not _same_marking(saved_initial, initial):
+            raise ValueError("{} is a checkpoint of another net".format(path))
+
+        todo = list(_read_chunks(unpickler))
+        visited = set(todo)
+        visited.update(_read_chunks(unpickler))
+    return counters, visited, todo
+
+class CheckpointExplorer(object):
+    """ Depth first explorer saving its state to a checkpoint file. """
+
+    def __init__(self, net, path, interval = 600):
+        """ Initialize the explorer.
+
+        @param net: compiled net module.
+        @type net: C{module}
+        @param path: checkpoint file path.
+        @type path: C{str}
+        @param interval: seconds between checkpoints, C{None} to only
+                         checkpoint on C{SIGUSR1}.
+        @type interval: C{float}
+        """
+        check_picklable(net)
+        self.net = net
+        self.path = path
+        self.interval = interval
+        self.initial = net.init()
+
+        self.visited = set([ self.initial ])
+        self.todo = [ self.initial ]
+        self.counters = { 'expanded' : 0, 'elapsed' : 0.0, 'checkpoints' : 0 }
+
+        self._requested = False
+        self._writer = None
+        self._session_start = time()
+        self._last_checkpoint = self._session_start
+
+    def resume(self, path):
+        """ Restore explorer state from a checkpoint file. """
+        self.counters, self.visited, self.todo = read_checkpoint(path, self.initial)
+
+    def request(self, signum = None, frame = None):
+        """ Request a checkpoint, used as C{SIGUSR1} handler. """
+        self._requested = True
+
+    def _failed(self, reason):
+        """ Report a checkpoint that could not be written.
+
+        Exploration goes on and the checkpoint is written again at the
+        next interval, the previous checkpoint file is left untouched.
+        """
+        self.counters['checkpoints'] -= 1
+        print >> sys.stderr, "[W] checkpoint failed ({}), retrying at next interval".format(reason)
+
+    def _reap(self, block = False):
+        """ Wait for the checkpoint writer process, return C{True} if none is running. """
+        if self._writer is None:
+            return True
+        pid, status = os.waitpid(self._writer, 0 if block else os.WNOHANG)
+        if pid == 0:
+            return False
+        self._writer = None
+        if status != 0:
+            if os.WIFSIGNALED(status):
+                self._failed("writer killed by signal {}".format(os.WTERMSIG(status)))
+            else:
+                self._failed("writer exited with status {}".format(os.WEXITSTATUS(status)))
+        return True
+
+    def _counters(self):
+        counters = dict(self.counters)
+        counters['elapsed'] += time() - self._session_start
+        counters['checkpoints'] += 1
+        return counters
+
+    def checkpoint(self):
+        """ Save the explorer state, in background if possible. """
+        if not self._reap():
+            # previous checkpoint still being written
+            return
+        self._requested = False
+        self._last_checkpoint = time()
+        counters = self._counters()
+        self.counters['checkpoints'] += 1
+
+        if not hasattr(os, 'fork'):
+            try:
+                write_checkpoint(self.path, self.initial, counters, self.visited, self.todo)
+            except (IOError, OSError) as e:
+                self._failed(e)
+            return
+
+        try:
+            pid = os.fork()
+        except OSError as e:
+            self._failed(e)
+            return
+        if pid == 0:
+            status = 1
+            try:
+                if hasattr(signal, 'SIGUSR1'):
+                    signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+                write_checkpoint(self.path, self.initial, counters, self.visited, self.todo)
+                status = 0
+            finally:
+                os._exit(status)
+        self._writer = pid
+
+    def _checkpoint_due(self):
+        if self._requested:
+            return True
+        return self.interval is not None and time() - self._last_checkpoint >= self.interval
+
+    def explore(self):
+        """ Explore the state space.
+
+        @return: number of states and exploration counters.
+        @rtype: C{tuple}
+        """
+        net = self.net
+        ctx = net.NecoCtx()
+        ctx.state_space = self.visited
+        visited = self.visited
+        todo = self.todo
+
+        handler = None
+        if hasattr(signal, 'SIGUSR1'):
+            handler = signal.signal(signal.SIGUSR1, self.request)
+        try:
+            expanded = self.counters['expanded']
+            while todo:
+                marking = todo.pop()
+                for succ in net.succs(marking, ctx):
+                    if succ not in visited:
+                        visited.add(succ)
+                        todo.append(succ)
+                expanded += 1
+                if expanded & 0xFF == 0 and self._checkpoint_due():
+                    self.counters['expanded'] = expanded
+                    self.checkpoint()
+            self.counters['expanded'] = expanded
+            self._reap(block = True)
+        finally:
+            if handler is not None:
+                signal.signal(signal.SIGUSR1, handler)
+
+        self.counters['elapsed'] += time() - self._session_start
+        return len(visited), self.counters
+
+def state_space_size(net, path, interval = 600, resume = None):
+    """ Explore the state space with periodic checkpoints.
+
+    @param net: compiled net module.
+    @type net: C{module}
+    @param path: checkpoint file path.
+    @type path: C{str}
+    @param interval: seconds between checkpoints.
+    @type interval: C{float}
+    @param resume: checkpoint file to resume from.
+    @type resume: C{str}
+    @return: number of reachable states and exploration counters.
+    @rtype: C{tuple}
+    """
+    explorer = CheckpointExplorer(net, path, interval)
+    if resume:
+        explorer.resume(resume)
+    return explorer.explore()
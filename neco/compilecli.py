@@ -71,6 +71,12 @@ class Main(object):
                                     help = 'enable optimizations.')
         optimize_group.add_argument('--optimize-pack', '-Op', default = False, dest = 'bit_packing', action = 'store_true',
                                     help = 'enable bit packing. [cython only]')
+        optimize_group.add_argument('--optimize-invariants', '-Oi', default = False, dest = 'invariants', action = 'store_true',
+                                    help = 'omit places implied by P-invariants from markings. [cython only]')
+        optimize_group.add_argument('--optimize-enabling', '-Oe', default = False, dest = 'incremental_enabling', action = 'store_true',
+                                    help = 'only check transitions whose input places were modified by the last firing. [cython only]')
+        optimize_group.add_argument('--join-profile', default = 0, dest = 'join_profile', metavar = 'MARKINGS', type = int,
+                                    help = 'explore MARKINGS markings with SNAKES to measure place sizes used to order input arcs, static estimates are used otherwise. [requires -O]')
         optimize_group.add_argument('--optimize-flow', '-Of', default = False, dest = 'optimize_flow', action = 'store_true',
                                     help = 'enable flow control optimizations.')
 
@@ -97,6 +103,8 @@ class Main(object):
                                  help = 'setup trace file name, trace files are used by neco-check.')
         other_group.add_argument('--include', '-I', default = [], dest = 'includes', action = 'append',
                                  help = 'additional include paths.')
+        other_group.add_argument('--marking-freelist', default = 256, dest = 'marking_freelist', metavar = 'SIZE', type = int,
+                                 help = 'number of released markings kept for reuse, 0 disables the free list.')
 
         if cli_args:
             args = parser.parse_args(cli_args)
@@ -151,10 +159,14 @@ class Main(object):
         self.config = Config()
         self.config.set_options(optimize = args.optimize,
                                 bit_packing = args.bit_packing,
+                                invariants = args.invariants,
+                                incremental_enabling = args.incremental_enabling,
+                                join_profile = args.join_profile,
                                 backend = args.language,
                                 profile = args.profile,
                                 imports = args.imports,
                                 no_stats = args.no_stats,
+                                marking_freelist = args.marking_freelist,
                                 optimize_flow = args.optimize_flow,
                                 search_paths = args.includes,
                                 trace_calls = False,
@@ -10,6 +10,10 @@ class Config(object):
                          optimize=False,
                          optimize_flow=False,
                          bit_packing=False,
+                         invariants=False,
+                         incremental_enabling=False,
+                         join_profile=0,
+                         marking_freelist=256,
                          debug=False,
                          dump_enabled=False,
                          no_stats=True,
@@ -5,7 +5,7 @@ from collections import defaultdict
 from snakes.nets import *
 import neco.config as config
 from neco.utils import flatten_lists
-import netir, nettypes
+import netir, nettypes, bounds, guards, joins
 from info import *
 from itertools import izip_longest
 
@@ -33,6 +33,7 @@ class CompilingEnvironment(object):
 
         self._succ_function_names = {}
         self._process_succ_function_names = set()
+        self._modified_places = {}
 
     def function_nodes(self):
         for node in self.successor_function_nodes:
@@ -64,19 +65,34 @@ class CompilingEnvironment(object):
         @type function_name: C{str}
         """
         self._succ_function_names[transition_info.name] = function_name
+        self._modified_places[function_name] = transition_info.modified_places()
 
     @property
     def process_succ_functions(self):
         """ process successor function names. """
         return self._process_succ_function_names
 
-    def register_process_succ_function(self, function_name):
+    def register_process_succ_function(self, function_name, modified_places):
         """ Registers a function name as a process successor function.
 
         @param function_name: successor function name
         @type function_name: C{str}
+        @param modified_places: places modified by the transitions the
+                                function fires.
+        @type modified_places: C{set}
         """
         self._process_succ_function_names.add(function_name)
+        self._modified_places[function_name] = modified_places
+
+    def modified_places(self, function_name):
+        """ Places that may differ between a marking and the successors
+        produced by a successor function.
+
+        @param function_name: transition or process successor function name.
+        @type function_name: C{str}
+        @rtype: C{set}
+        """
+        return self._modified_places[function_name]
 
 ################################################################################
 
@@ -112,7 +128,11 @@ class ProcessSuccGenerator(object):
         self.arg_marking_acc_var = variable_provider.new_variable(variable_type = marking_type.container_type)
         self.arg_ctx_var = variable_provider.new_variable(variable_type = TypeInfo.get('NecoCtx'))
 
-        env.register_process_succ_function(function_name)
+        modified_places = set()
+        for flow_place in process_info.flow_places:
+            for transition in flow_place.post:
+                modified_places.update(transition.modified_places())
+        env.register_process_succ_function(function_name, modified_places)
 
     def __call__(self):
         """ Generate function.
@@ -272,6 +292,10 @@ class SuccTGenerator(object):
         if self.config.optimize:
             trans.order_inputs()
 
+        self.gen_guard_conjuncts()
+        enumerated = []
+        self.gen_guard_checks(set())
+
         # loop over input_arcs
         for input_arc in trans.input_arcs:
             if self.config.optimize_flow and input_arc.place_info.flow_control:
@@ -487,6 +511,81 @@ class SuccTGenerator(object):
             else:
                 raise NotImplementedError, input_arc.arc_annotation.__class__
 
+            # check guard conjuncts as soon as their variables are bound
+            enumerated.append(input_arc)
+            self.gen_guard_checks(self.bound_variables(enumerated))
+
+    def gen_guard_conjuncts(self):
+        """ Prepare the guard checks of the transition.
+
+        When optimizing, the guard is split into its conjuncts (see
+        L{guards.conjuncts}), each one being checked by
+        L{gen_guard_checks} once the variables given by
+        L{guards.requirements} are bound. The whole guard is checked
+        after all enumerations otherwise.
+        """
+        trans = self.transition
+        if self.config.optimize:
+            expressions = guards.conjuncts(trans.trans.guard._str)
+        else:
+            expressions = [ trans.trans.guard._str ]
+
+        # names assigned by the successor function, other names are globals
+        local_names = set(trans.input_variables())
+        if trans.generator_arc:
+            local_names.update(pid.name for pid in trans.generator_arc.new_pids)
+
+        checked = []
+        for expr in expressions:
+            try:
+                if eval(expr) == True:
+                    continue
+            except:
+                pass
+            checked.append(expr)
+
+        if self.config.optimize:
+            required = guards.requirements(checked, local_names)
+        else:
+            required = [ None ] * len(checked)
+        self.guard_conjuncts = [ (ExpressionInfo(expr), names) for expr, names in zip(checked, required) ]
+
+    def bound_variables(self, input_arcs):
+        """ Names of input variables bound after enumerating input arcs.
+
+        Shared variables are only bound once unified.
+
+        @param input_arcs: enumerated input arcs.
+        @type input_arcs: C{list}
+        @rtype: C{set}
+        """
+        helper = self.variable_helper
+        names = set()
+        for input_arc in input_arcs:
+            for name in input_arc.variables():
+                variable = VariableInfo(name)
+                if not helper.is_shared(variable) or helper.unified(variable):
+                    names.add(name)
+        return names
+
+    def gen_guard_checks(self, bound = None):
+        """ Produce the checks of guard conjuncts whose variables are bound.
+
+        Conjuncts are checked in guard order and removed from the pending
+        conjuncts.
+
+        @param bound: names of bound variables, C{None} if all variables
+                      are bound.
+        @type bound: C{set}
+        """
+        pending = []
+        for expr, required in self.guard_conjuncts:
+            if bound is None or (required is not None and required <= bound):
+                self.builder.begin_GuardCheck(condition = netir.PyExpr(expr))
+            else:
+                pending.append((expr, required))
+        self.guard_conjuncts = pending
+
     def _gen_names(self, token_info):
         """ Produce names for intermediary variables when handling tuples.
 
@@ -791,13 +890,8 @@ class SuccTGenerator(object):
                 builder.emit_Assign(variable = new_pid, expr = PyExpr(expr))
                 i += 1
 
-        # guard
-        guard = ExpressionInfo(trans.trans.guard._str)
-        try:
-            if eval(guard.raw) != True:
-                builder.begin_GuardCheck(condition = netir.PyExpr(guard))
-        except:
-            builder.begin_GuardCheck(condition = netir.PyExpr(guard))
+        # remaining guard conjuncts
+        self.gen_guard_checks()
 
         computed_productions = defaultdict(list)
         for output in trans.outputs:
@@ -916,6 +1010,31 @@ class Compiler(object):
         self.backend = backend
         self.net_info = NetInfo(net)
 
+        if self.config.optimize:
+            place_bounds = bounds.infer_bounds(self.net_info)
+            bounds.report(self.net_info, place_bounds)
+            bounds.apply_bounds(self.net_info, place_bounds)
+
+            explored = 0
+            if self.config.join_profile:
+                try:
+                    means, explored = joins.profile_places(net, self.config.join_profile)
+                    joins.apply_profile(self.net_info, means)
+                except Exception as e:
+                    print >> sys.stderr, "[W] profiling exploration failed ({}), using static estimates".format(e)
+                    explored = 0
+            for trans in self.net_info.transitions:
+                trans.order_inputs()
+            joins.report(self.net_info, explored)
+
+        if self.config.invariants:
+            # flow control places are merged into flow places when optimized
+            eligible = lambda place : (place.type.is_BlackToken and
+                                       not (self.config.optimize_flow and place.flow_control))
+            implied = bounds.implied_places(self.net_info, eligible)
+            bounds.report_invariants(self.net_info, implied)
+            bounds.apply_invariants(self.net_info, implied)
+
         if self.config.normalize_pids:
             if self.config.pid_first and not self.check_first_pid():
                 exit(-1)
@@ -0,0 +1,237 @@
+""" Structural place bound inference and invariant compression.
+
+A P-semiflow is a non negative weighting C{y} of places such that every
+transition consumes and produces the same weighted number of tokens,
+the weighted token count C{y.M} is then the same in every reachable
+marking C{M}. Each place C{p} with C{y[p] > 0} holds at most
+C{y.M0 // y[p]} tokens.
+
+Semiflows are computed with the Farkas algorithm on the incidence matrix
+of the net. Arc weights are the number of tokens consumed or produced by
+arcs, places connected to arcs consuming or producing an unknown number
+of tokens (flush and generator arcs) are left out of semiflows.
+
+A semiflow also allows to omit one of its places from markings, the
+token count of this place is computed from the other places of the
+semiflow (see L{implied_places}).
+"""
+
+from fractions import gcd
+
+def arc_weight(arc):
+    """ Number of tokens consumed or produced by an arc, C{None} if unknown.
+
+    @param arc: arc.
+    @type arc: C{ArcInfo}
+    @rtype: C{int}
+    """
+    if arc.is_MultiArc:
+        weights = [ arc_weight(sub_arc) for sub_arc in arc.sub_arcs ]
+        return None if None in weights else sum(weights)
+    elif arc.is_Test:
+        return 0
+    elif arc.is_Flush or arc.is_GeneratorMultiArc:
+        return None
+    return 1
+
+def incidence(net_info):
+    """ Incidence matrix of a net.
+
+    @param net_info: net.
+    @type net_info: C{NetInfo}
+    @return: places that can be weighted and their rows, a row holds the
+             token count change of the place for each transition.
+    @rtype: C{tuple}
+    """
+    rows = dict( (place.name, [0] * len(net_info.transitions)) for place in net_info.places )
+    for column, trans in enumerate(net_info.transitions):
+        arcs = [ (arc, -1) for arc in trans.input_arcs ] + [ (arc, 1) for arc in trans.outputs ]
+        for arc, sign in arcs:
+            name = arc.place_info.name
+            if name not in rows:
+                continue
+            weight = arc_weight(arc)
+            if weight is None:
+                del rows[name]
+            else:
+                rows[name][column] += sign * weight
+
+    places = [ place.name for place in net_info.places if place.name in rows ]
+    return places, [ rows[name] for name in places ]
+
+def _normalize(row):
+    divisor = reduce(gcd, (abs(value) for value in row if value), 0)
+    if divisor > 1:
+        return tuple(value // divisor for value in row)
+    return tuple(row)
+
+def semiflows(matrix, max_rows = 1000):
+    """ P-semiflows of an incidence matrix (Farkas algorithm).
+
+    >>> semiflows([[-1, 1], [1, -1]])
+    [(1, 1)]
+    >>> semiflows([[-1, 1], [2, -2], [0, 1]])
+    [(2, 1, 0)]
+    >>> semiflows([[1], [0]])
+    [(0, 1)]
+
+    @param matrix: incidence matrix, one row per place.
+    @type matrix: C{list}
+    @param max_rows: maximal number of intermediate rows, the computation
+                     is abandoned beyond.
+    @type max_rows: C{int}
+    @return: semiflows as place weight tuples, C{None} if abandoned.
+    @rtype: C{list}
+    """
+    count = len(matrix)
+    # each row is the incidence part followed by the place weights
+    rows = set( tuple(row) + tuple(int(i == j) for j in range(count))
+                for i, row in enumerate(matrix) )
+    columns = len(matrix[0]) if matrix else 0
+
+    for column in range(columns):
+        positive = [ row for row in rows if row[column] > 0 ]
+        negative = [ row for row in rows if row[column] < 0 ]
+        rows = set( row for row in rows if row[column] == 0 )
+        for left in positive:
+            for right in negative:
+                a, b = left[column], -right[column]
+                rows.add(_normalize([ b * l + a * r for l, r in zip(left, right) ]))
+                if len(rows) > max_rows:
+                    return None
+
+    return sorted( row[columns:] for row in rows )
+
+def infer_bounds(net_info, max_rows = 1000):
+    """ Upper bounds of places implied by the P-semiflows of a net.
+
+    @param net_info: net.
+    @type net_info: C{NetInfo}
+    @return: bounds of bounded places indexed by place names.
+    @rtype: C{dict}
+    """
+    places, matrix = incidence(net_info)
+    flows = semiflows(matrix, max_rows) if places else None
+    if not flows:
+        return {}
+
+    counts = dict( (place.name, len(place.tokens)) for place in net_info.places )
+    initial = [ counts[name] for name in places ]
+    bounds = {}
+    for flow in flows:
+        total = sum(weight * tokens for weight, tokens in zip(flow, initial))
+        for name, weight in zip(places, flow):
+            if weight > 0:
+                bound = total // weight
+                bounds[name] = min(bounds.get(name, bound), bound)
+    return bounds
+
+def implied_places(net_info, eligible, max_rows = 1000):
+    """ Places whose token count is implied by a P-invariant.
+
+    Only semiflows over eligible places are considered. Each selected
+    semiflow C{y} implies one place C{p} of its support, for every
+    marking C{M}, C{M[p] = (y.M0 - sum(y[q] * M[q], q != p)) / y[p]}.
+    Places read by a selected semiflow are never implied by another one,
+    so implied places are always computed from stored places. Semiflows
+    with a small support are preferred, then places with a large bound.
+
+    @param net_info: net.
+    @type net_info: C{NetInfo}
+    @param eligible: predicate on place informations, C{True} if the
+                     place can be implied or read by an invariant.
+    @type eligible: C{function}
+    @return: invariants C{(weight, constant, terms)} indexed by the names
+             of implied places, C{terms} is a tuple of C{(name, weight)}
+             pairs of the places the implied place is computed from.
+    @rtype: C{dict}
+    """
+    places, matrix = incidence(net_info)
+    infos = dict( (place.name, place) for place in net_info.places )
+    rows = [ (name, row) for name, row in zip(places, matrix) if eligible(infos[name]) ]
+    flows = semiflows([ row for _, row in rows ], max_rows) if rows else None
+    if not flows:
+        return {}
+
+    places = [ name for name, _ in rows ]
+    initial = [ len(infos[name].tokens) for name in places ]
+    flows.sort(key = lambda flow : (len(filter(None, flow)), flow))
+
+    implied = {}
+    read = set()
+    for flow in flows:
+        support = [ (name, weight) for name, weight in zip(places, flow) if weight > 0 ]
+        if any(name in implied for name, _ in support):
+            continue
+        candidates = [ (name, weight) for name, weight in support if name not in read ]
+        if not candidates:
+            continue
+        total = sum(weight * tokens for weight, tokens in zip(flow, initial))
+        name, weight = max(candidates, key = lambda (name, weight) : (total // weight, name))
+        implied[name] = (weight, total, tuple( term for term in support if term[0] != name ))
+        read.update(name for name, _ in support)
+    return implied
+
+def apply_bounds(net_info, bounds):
+    """ Record inferred bounds in place informations.
+
+    Black token and int places bounded by one become one safe, bounds
+    already known from the net are only lowered.
+
+    @param net_info: net.
+    @type net_info: C{NetInfo}
+    @param bounds: bounds indexed by place names.
+    @type bounds: C{dict}
+    """
+    for place in net_info.places:
+        if place.name in bounds:
+            place.narrow_bound(bounds[place.name])
+
+def apply_invariants(net_info, implied):
+    """ Record invariants of implied places in place informations.
+
+    @param net_info: net.
+    @type net_info: C{NetInfo}
+    @param implied: invariants indexed by place names (see L{implied_places}).
+    @type implied: C{dict}
+    """
+    for place in net_info.places:
+        if place.name in implied:
+            place.set_invariant(*implied[place.name])
+
+def report(net_info, bounds):
+    """ Print inferred bounds.
+
+    @param net_info: net.
+    @type net_info: C{NetInfo}
+    @param bounds: bounds indexed by place names.
+    @type bounds: C{dict}
+    """
+    print "################################################################################"
+    print "inferred place bounds ({} of {} places bounded)".format(len(bounds), len(net_info.places))
+    print "################################################################################"
+    width = max([ len(place.name) for place in net_info.places ] + [1])
+    for place in net_info.places:
+        bound = bounds.get(place.name)
+        print "{name:{width}} : {bound}".format(name = place.name,
+                                                width = width,
+                                                bound = bound if bound is not None else 'unknown')
+
+def report_invariants(net_info, implied):
+    """ Print places omitted from markings and their invariants.
+
+    @param net_info: net.
+    @type net_info: C{NetInfo}
+    @param implied: invariants indexed by place names (see L{implied_places}).
+    @type implied: C{dict}
+    """
+    print "################################################################################"
+    print "implied places ({} of {} places omitted from markings)".format(len(implied), len(net_info.places))
+    print "################################################################################"
+    width = max([ len(name) for name in implied ] + [1])
+    for name in sorted(implied):
+        weight, constant, terms = implied[name]
+        expr = " - ".join([ str(constant) ] + [ "{}*{}".format(w, n) if w != 1 else n for n, w in terms ])
+        if weight != 1:
+            expr = "({}) / {}".format(expr, weight)
+        print "{name:{width}} = {expr}".format(name = name, width = width, expr = expr)
@@ -0,0 +1,165 @@
+""" Guard splitting.
+
+A guard C{a and b and c} holds for a binding only if each of its
+conjuncts holds, and conjuncts are evaluated from left to right. The
+successor functions check each conjunct in turn, as soon as the
+variables it reads are bound, so bindings failing a conjunct are
+rejected before the remaining tokens are enumerated. A conjunct is only
+checked before a previous one if both are pure comparisons (see
+L{requirements}), so calls made by the guard keep their order.
+"""
+
+import ast, tokenize
+from StringIO import StringIO
+
+def _parse(expr):
+    return ast.parse(expr.strip(), mode = 'eval').body
+
+def _split(expr):
+    """ Split an expression on C{and} keywords outside of brackets. """
+    lines = StringIO(expr).readlines()
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line))
+
+    pieces = []
+    depth = 0
+    start = 0
+    for kind, string, begin, end, _ in tokenize.generate_tokens(StringIO(expr).readline):
+        if kind == tokenize.OP and string in '([{':
+            depth += 1
+        elif kind == tokenize.OP and string in ')]}':
+            depth -= 1
+        elif kind == tokenize.NAME and string == 'and' and depth == 0:
+            pieces.append(expr[start:offsets[begin[0] - 1] + begin[1]])
+            start = offsets[end[0] - 1] + end[1]
+    pieces.append(expr[start:])
+    return [ piece.strip(' \t\r\n\\') for piece in pieces ]
+
+def _unparenthesize(expr):
+    """ Expression between enclosing parentheses, C{None} if not enclosed. """
+    if expr.startswith('(') and expr.endswith(')'):
+        try:
+            if ast.dump(_parse(expr[1:-1])) == ast.dump(_parse(expr)):
+                return expr[1:-1].strip()
+        except SyntaxError:
+            pass
+    return None
+
+def conjuncts(expr):
+    """ Conjuncts of an expression, in evaluation order.
+
+    Parenthesized conjunctions are split too, other expressions are
+    left as they are.
+
+    >>> conjuncts('x > 0 and (y or z) and f(x, y)')
+    ['x > 0', '(y or z)', 'f(x, y)']
+    >>> conjuncts('((a and b)) and [ c and d ]')
+    ['a', 'b', '[ c and d ]']
+    >>> conjuncts('a and b or c')
+    ['a and b or c']
+    >>> conjuncts('x if c else y and z')
+    ['x if c else y and z']
+
+    @param expr: python expression.
+    @type expr: C{str}
+    @return: expressions whose conjunction is C{expr}.
+    @rtype: C{list}
+    """
+    expr = expr.strip()
+    inner = _unparenthesize(expr)
+    if inner is not None:
+        pieces = conjuncts(inner)
+        return pieces if len(pieces) > 1 else [ expr ]
+
+    try:
+        tree = _parse(expr)
+        if not (isinstance(tree, ast.BoolOp) and isinstance(tree.op, ast.And)):
+            return [ expr ]
+        pieces = _split(expr)
+        joined = ast.BoolOp(op = ast.And(), values = [ _parse(piece) for piece in pieces ])
+        if ast.dump(joined) != ast.dump(tree):
+            return [ expr ]
+    except (SyntaxError, tokenize.TokenError):
+        return [ expr ]
+
+    result = []
+    for piece in pieces:
+        result.extend(conjuncts(piece))
+    return result
+
+def names(expr):
+    """ Names read by an expression.
+
+    Names bound inside the expression, e.g., by comprehensions, are
+    included.
+
+    >>> sorted(names('f(x, y.z) > len([ t for t in l ])'))
+    ['f', 'l', 'len', 't', 'x', 'y']
+
+    @param expr: python expression.
+    @type expr: C{str}
+    @rtype: C{set}
+    """
+    return set( node.id for node in ast.walk(_parse(expr)) if isinstance(node, ast.Name) )
+
+# nodes of expressions that call no user code
+_PURE_NODES = (ast.Compare, ast.BoolOp, ast.UnaryOp, ast.Name, ast.Num, ast.Str, ast.Tuple,
+               ast.Load, ast.boolop, ast.unaryop, ast.cmpop)
+
+def pure(expr):
+    """ Tell whether an expression only compares names and constants.
+
+    >>> pure('x > 0 and not y == (1, z)')
+    True
+    >>> pure('f(x) > 0'), pure('x.y > 0'), pure('x / y > 1')
+    (False, False, False)
+
+    @param expr: python expression.
+    @type expr: C{str}
+    @rtype: C{bool}
+    """
+    try:
+        tree = _parse(expr)
+    except SyntaxError:
+        return False
+    return all( isinstance(node, _PURE_NODES) for node in ast.walk(tree) )
+
+def requirements(exprs, local_names):
+    """ Names that must be bound before each conjunct is checked.
+
+    A conjunct needs the local names it reads. It also needs the names
+    of each previous conjunct it shares names with, so that C{x != 0}
+    still protects C{y / x > 1}, or that is not a pure comparison like
+    itself (see L{pure}), so that C{f(x)} is still called before
+    C{g(y)}. Only pure comparisons are thus checked out of order.
+
+    >>> def show(exprs):
+    ...     return [ ''.join(sorted(names)) for names in requirements(exprs, set('xyz')) ]
+    >>> show(['x > 0', 'y < 1', 'y / x > 1'])
+    ['x', 'y', 'xy']
+    >>> show(['f(x)', 'g(y)', 'z == 0'])
+    ['x', 'xy', 'xyz']
+
+    @param exprs: guard conjuncts in evaluation order.
+    @type exprs: C{list}
+    @param local_names: names bound by the successor function, other
+                        names are globals.
+    @type local_names: C{set}
+    @return: sets of names, one per conjunct.
+    @rtype: C{list}
+    """
+    result = []
+    previous = []
+    for expr in exprs:
+        try:
+            required = names(expr) & local_names
+        except SyntaxError:
+            required = set(local_names)
+        is_pure = pure(expr)
+        for other, other_pure in previous:
+            if other & required or not (is_pure and other_pure):
+                required |= other
+        previous.append((required, is_pure))
+        result.append(required)
+    return result
@@ -1,7 +1,7 @@
 """ Petri net info structures. """
 from collections import defaultdict
 from abc import ABCMeta, abstractmethod
-from neco.core import netir
+from neco.core import netir, joins
 from neco.extsnakes import Pid
 from neco.utils import Enum, TypeMatch, RegDict
 from snakes.nets import BlackToken, dot, Place
@@ -880,18 +880,8 @@ class TransitionInfo(object):
         self._intermediary_variables.append(variable)
 
     def order_inputs(self):
-        def transform(p):
-            if p.place_info.one_safe:
-                if p.place_info.type.is_BlackToken:
-                    return 1
-                else: return 2
-            elif p.is_Value:
-                return 4
-            elif p.is_Test:
-                return 5
-            else:
-                return 6
-        self.input_arcs.sort(key = transform)
+        """ Order input arcs by expected enumeration cost (see L{joins.best_order}). """
+        self.input_arcs = joins.best_order(self)
 
     def shared_input_variables(self):
         variables = self.input_variables()
@@ -958,6 +948,21 @@ class TransitionInfo(object):
 
         return mod
 
+    def dependent_transitions(self):
+        """ Return transitions whose enabling may change when this
+        transition fires, ie., the post sets of modified places.
+
+        A transition that is not dependent has the same input places in
+        a marking and in its successors by this transition.
+
+        @return: dependent transitions.
+        @rtype: C{set}
+        """
+        dependent = set([])
+        for place_info in self.modified_places():
+            dependent.update(place_info.post)
+        return dependent
+
 
 ################################################################################
 
@@ -967,6 +972,7 @@ class PlaceInfo(object):
     def __init__(self, place, one_safe = False, bound = None, process_name = None, flow_control = False):
 
         self._1safe = place.one_safe if hasattr(place, 'one_safe') else one_safe
+        self._bound = place.bound if hasattr(place, 'bound') else bound
         if not self._1safe:
             try:
                 capacity = place.label('capacity') if hasattr(place, 'label') else None
@@ -976,6 +982,8 @@ class PlaceInfo(object):
                 (_, high) = capacity
                 if high == 1:
                     self._1safe = True
+                if self._bound is None:
+                    self._bound = high
 
         self.snk_place = place
         self._name = place.name
@@ -983,6 +991,22 @@ class PlaceInfo(object):
         self._type = TypeInfo.from_snakes_checker(place.checker())
         self.tokens = [ token for token in place.tokens ]
 
+        # int places may be annotated with the values their tokens can take
+        domain = place.domain if hasattr(place, 'domain') else None
+        if domain is None and hasattr(place, 'label'):
+            try:
+                domain = place.label('domain')
+            except KeyError: pass
+        self._domain = tuple(sorted(set(domain))) if domain is not None else None
+        self._domain_annotated = domain is not None
+
+        # counted places store tokens with their multiplicity
+        self._counted = place.counted if hasattr(place, 'counted') else False
+        if not self._counted:
+            try:
+                self._counted = bool(place.label('counted')) if hasattr(place, 'label') else False
+            except KeyError: pass
+
         # process name
         if hasattr(place, 'label'):
             path = place.label('path')
@@ -1011,6 +1035,12 @@ class PlaceInfo(object):
         self._pre = set()
         self._post = set()
 
+        # token count computed from other places, see neco.core.bounds
+        self._invariant = None
+
+        # mean token count measured by a profiling exploration, see neco.core.joins
+        self._mean_tokens = None
+
     def __getstate__(self):
         d = self.__dict__
         d['_post'] = set()
@@ -1043,6 +1073,90 @@ class PlaceInfo(object):
     def type(self):
         return self._type
 
+    @property
+    def bound(self):
+        """ Maximal number of tokens of the place, C{None} if unknown. """
+        return 1 if self._1safe else self._bound
+
+    def narrow_bound(self, bound):
+        """ Record a proven bound, black token and int places bounded by one
+        become one safe.
+
+        @param bound: maximal number of tokens of the place.
+        @type bound: C{int}
+        """
+        if self._bound is None or bound < self._bound:
+            self._bound = bound
+        # one safe places of other types hold their token as a python
+        # object, which is only supported for places declared one safe
+        if bound <= 1 and (self.type.is_BlackToken or self.type.is_Int):
+            self._1safe = True
+
+    @property
+    def expected_tokens(self):
+        """ Expected number of tokens of the place.
+
+        The mean token count measured by a profiling exploration if any,
+        otherwise the initial number of tokens, at least one, or half the
+        bound of the place if larger.
+        """
+        if self._1safe:
+            return 1.
+        elif self._mean_tokens is not None:
+            return self._mean_tokens
+        estimate = float(max(len(self.tokens), 1))
+        if self._bound is not None:
+            estimate = max(estimate, self._bound / 2.)
+        return estimate
+
+    def set_mean_tokens(self, mean):
+        """ Record the mean token count measured by a profiling exploration.
+
+        @param mean: mean number of tokens of the place.
+        @type mean: C{float}
+        """
+        self._mean_tokens = mean
+
+    @property
+    def invariant(self):
+        """ Invariant C{(weight, constant, terms)} the token count of the place
+        is computed from, C{None} if the place is stored in markings (see
+        L{neco.core.bounds.implied_places}).
+        """
+        return self._invariant
+
+    def set_invariant(self, weight, constant, terms):
+        """ Omit the place from markings, its token count is computed from other places.
+
+        @param weight: weight of the place in the invariant.
+        @type weight: C{int}
+        @param constant: weighted token count of the invariant.
+        @type constant: C{int}
+        @param terms: C{(name, weight)} pairs of the other places of the invariant.
+        @type terms: C{tuple}
+        """
+        self._invariant = (weight, constant, terms)
+
+    @property
+    def domain(self):
+        """ Sorted tuple of the values tokens can take, C{None} if unknown (see L{NetInfo.infer_domains}). """
+        return self._domain
+
+    @property
+    def domain_annotated(self):
+        """ C{True} if the domain was given by the net rather than inferred. """
+        return self._domain_annotated
+
+    @property
+    def counted(self):
+        """ C{True} if the place is annotated as holding many identical tokens. """
+        return self._counted
+
+    @property
+    def duplicated(self):
+        """ C{True} if the initial marking holds many identical tokens. """
+        return len(self.tokens) >= 8 and len(self.tokens) >= 2 * len(set(self.tokens))
+
     @classmethod
     def Dummy(cls, name, one_safe = False, process_name = None, flow_control = False):
         place = Place(name)
@@ -1138,6 +1252,108 @@ class NetInfo(object):
             self.process_info.append(ProcessInfo(name = process_name,
                                                  net_info = self))
 
+        self.infer_domains()
+
+    def infer_domains(self, max_size = 16):
+        """ Infer the values tokens of int places can take.
+
+        The domain of a place holds its initial tokens, the values produced
+        by output arcs and, for variables produced by output arcs, the
+        domains of the input places binding them. Domains are computed as a
+        least fixpoint, a place gets no domain if one of its output arcs
+        produces an expression or an unbound variable, or if its domain
+        has more than C{max_size} values. Places emptied by flush arcs get
+        no domain. Annotated domains are kept, they must hold the initial
+        tokens and the values produced by output arcs.
+
+        @param max_size: maximal number of values of a domain.
+        @type max_size: C{int}
+        @raise ValueError: if a token or a value produced by an output arc
+                           is not in the annotated domain of its place.
+        """
+        def is_int(value):
+            return isinstance(value, (int, long)) and not isinstance(value, bool)
+
+        def leaves(arc):
+            if arc.is_MultiArc:
+                for sub_arc in arc.sub_arcs:
+                    for leaf in leaves(sub_arc):
+                        yield leaf
+            else:
+                yield arc
+
+        for place in self.places:
+            if place.domain_annotated:
+                for token in place.tokens:
+                    if token not in place.domain:
+                        raise ValueError("token {!r} of place {} is not in its domain".format(token, place.name))
+        for trans in self.transitions:
+            for output_arc in trans.outputs:
+                place = output_arc.place_info
+                if not place.domain_annotated:
+                    continue
+                for arc in leaves(output_arc):
+                    if arc.is_Value and arc.value.raw not in place.domain:
+                        raise ValueError("transition {} produces {!r} in place {}, "
+                                         "out of its domain".format(trans.name, arc.value.raw, place.name))
+
+        domains = {}
+        for place in self.places:
+            if place.domain_annotated:
+                domains[place.name] = set(place.domain)
+            elif place.type.is_Int and all(is_int(token) for token in place.tokens):
+                domains[place.name] = set(place.tokens)
+            else:
+                domains[place.name] = None
+
+        for trans in self.transitions:
+            for input_arc in trans.input_arcs:
+                if input_arc.is_Flush and not input_arc.place_info.domain_annotated:
+                    domains[input_arc.place_info.name] = None
+
+        changed = True
+        while changed:
+            changed = False
+            for trans in self.transitions:
+                # values of variables, narrowed by every place binding them
+                variables = {}
+                for input_arc in trans.input_arcs:
+                    for arc in leaves(input_arc):
+                        if arc.is_Variable:
+                            name = arc.variable.name
+                        elif arc.is_Test and arc.inner.is_Variable:
+                            name = arc.inner.name
+                        else:
+                            continue
+                        domain = domains[arc.place_info.name]
+                        if domain is not None:
+                            variables[name] = domain & variables[name] if name in variables else domain
+
+                for output_arc in trans.outputs:
+                    place = output_arc.place_info
+                    if place.domain_annotated or domains[place.name] is None:
+                        continue
+                    produced = set()
+                    for arc in leaves(output_arc):
+                        if arc.is_Value and is_int(arc.value.raw):
+                            produced.add(arc.value.raw)
+                        elif arc.is_Variable and arc.variable.name in variables:
+                            produced |= variables[arc.variable.name]
+                        else:
+                            produced = None
+                            break
+                    if produced is None or len(domains[place.name] | produced) > max_size:
+                        domains[place.name] = None
+                        changed = True
+                    elif not produced <= domains[place.name]:
+                        domains[place.name] |= produced
+                        changed = True
+
+        for place in self.places:
+            if not place.domain_annotated:
+                domain = domains[place.name]
+                place._domain = tuple(sorted(domain)) if domain else None
+
 
     def place_by_name(self, name):
         for p in self.places:
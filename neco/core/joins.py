@@ -0,0 +1,245 @@
+""" Cost based ordering of input arcs.
+
+Successor functions enumerate the tokens of input arcs in nested loops,
+the first input arc being the outermost loop. The cost of an order is
+the expected number of loop iterations per marking,
+C{sum(B[k-1] * n[k])}, where C{n[k]} is the expected number of tokens
+enumerated for the C{k}-th arc and C{B[k]} the expected number of
+bindings left after the C{k} first arcs,
+C{B[k] = B[k-1] * n[k] * s[k]}. The selectivity C{s[k]} accounts for
+the equality tests of the arc, with values or already bound variables,
+and for the guard conjuncts that can be checked once the arc is
+enumerated (see L{neco.core.guards}).
+
+The expected number of tokens of a place is measured by a profiling
+exploration (see L{profile_places}) or estimated from its initial
+marking and bound (see C{PlaceInfo.expected_tokens}).
+"""
+
+from collections import defaultdict, deque
+from itertools import permutations
+from snakes.nets import dot
+import guards
+
+# probability a guard conjunct holds
+GUARD_SELECTIVITY = 0.5
+
+# all orders are compared up to this number of input arcs, orders are
+# built greedily beyond
+EXHAUSTIVE_ARCS = 6
+
+def rank(arc):
+    """ Static rank of an input arc, used to break ties between orders.
+
+    One safe places come first, then values, tests and other arcs.
+
+    @param arc: input arc.
+    @type arc: C{ArcInfo}
+    @rtype: C{int}
+    """
+    if arc.place_info.one_safe:
+        if arc.place_info.type.is_BlackToken:
+            return 1
+        else: return 2
+    elif arc.is_Value:
+        return 4
+    elif arc.is_Test:
+        return 5
+    else:
+        return 6
+
+def enumerated(arc):
+    """ Expected number of tokens enumerated for an input arc.
+
+    @param arc: input arc.
+    @type arc: C{ArcInfo}
+    @rtype: C{float}
+    """
+    place = arc.place_info
+    if arc.is_Flush or place.type.is_BlackToken:
+        return 1.
+    if arc.is_MultiArc:
+        return place.expected_tokens ** len(arc.sub_arcs)
+    return place.expected_tokens
+
+def _values(token):
+    """ Number of values in a token pattern. """
+    if token.is_Value:
+        return 0 if token.raw == dot else 1
+    elif token.is_Tuple:
+        return sum(_values(component) for component in token)
+    return 0
+
+def selectivity(arc, bound):
+    """ Probability an enumerated token matches an input arc.
+
+    Values and variables bound by previous arcs or repeated in the arc
+    are compared, each comparison holds for one value of the domain of
+    the place, or one token if the domain is unknown.
+
+    @param arc: input arc.
+    @type arc: C{ArcInfo}
+    @param bound: names of the variables bound by previous arcs.
+    @type bound: C{set}
+    @rtype: C{float}
+    """
+    place = arc.place_info
+    if arc.is_Flush or place.type.is_BlackToken:
+        return 1.
+
+    if arc.is_Value:
+        tests = _values(arc.value)
+    elif arc.is_Test:
+        tests = _values(arc.inner)
+    elif arc.is_Tuple:
+        tests = _values(arc.tuple)
+    elif arc.is_MultiArc:
+        tests = sum(_values(sub_arc.value) for sub_arc in arc.sub_arcs if sub_arc.is_Value)
+    else:
+        tests = 0
+
+    for name, occurences in arc.variables().iteritems():
+        tests += occurences if name in bound else occurences - 1
+
+    size = len(place.domain) if place.domain else place.expected_tokens
+    return 1. / max(size, 1) ** tests
+
+def order_cost(arcs, conjuncts):
+    """ Expected number of loop iterations of an input arc order.
+
+    @param arcs: input arcs in enumeration order.
+    @type arcs: C{list}
+    @param conjuncts: names of the variables read by each guard conjunct.
+    @type conjuncts: C{list}
+    @rtype: C{float}
+    """
+    bound = set()
+    pending = [ names for names in conjuncts if names ]
+    bindings = GUARD_SELECTIVITY ** (len(conjuncts) - len(pending))
+    cost = 0.
+    for arc in arcs:
+        tokens = enumerated(arc)
+        cost += bindings * tokens
+        bindings *= tokens * selectivity(arc, bound)
+        bound.update(arc.variables())
+
+        ready = [ names for names in pending if names <= bound ]
+        pending = [ names for names in pending if not names <= bound ]
+        bindings *= GUARD_SELECTIVITY ** len(ready)
+    return cost
+
+def guard_conjuncts(trans):
+    """ Input variables needed by each guard conjunct of a transition.
+
+    @param trans: transition.
+    @type trans: C{TransitionInfo}
+    @rtype: C{list}
+    """
+    checked = []
+    for expr in guards.conjuncts(trans.trans.guard._str):
+        try:
+            if eval(expr) == True:
+                continue
+        except:
+            pass
+        checked.append(expr)
+    return guards.requirements(checked, set(trans.input_variables()))
+
+def best_order(trans):
+    """ Input arc order of a transition with the least expected cost.
+
+    The order does not depend on the current order of input arcs, equal
+    costs are decided by L{rank} then place names.
+
+    @param trans: transition.
+    @type trans: C{TransitionInfo}
+    @return: input arcs in enumeration order.
+    @rtype: C{list}
+    """
+    arcs = sorted(trans.input_arcs, key = lambda arc : (rank(arc), arc.place_info.name))
+    conjuncts = guard_conjuncts(trans)
+
+    if len(arcs) <= EXHAUSTIVE_ARCS:
+        # min keeps the first best order, permutations follow the ranks
+        return list(min(permutations(arcs), key = lambda order : order_cost(order, conjuncts)))
+
+    order = []
+    while arcs:
+        arc = min(arcs, key = lambda arc : order_cost(order + [ arc ], conjuncts))
+        arcs.remove(arc)
+        order.append(arc)
+    return order
+
+def profile_places(net, max_markings):
+    """ Mean token counts of places over the first reachable markings.
+
+    The markings are explored breadth first with SNAKES, on a copy of the
+    net since evaluating expressions adds builtins to its globals.
+
+    @param net: Petri net.
+    @type net: C{snakes.nets.PetriNet}
+    @param max_markings: maximal number of explored markings.
+    @type max_markings: C{int}
+    @return: mean token counts indexed by place names, and the number of
+             explored markings.
+    @rtype: C{tuple}
+    """
+    net = net.copy()
+    initial = net.get_marking()
+    visited = set([ initial ])
+    todo = deque([ initial ])
+    counts = defaultdict(int)
+    explored = 0
+    while todo and explored < max_markings:
+        marking = todo.popleft()
+        explored += 1
+        for name, tokens in marking.iteritems():
+            counts[name] += len(tokens)
+
+        for trans in net.transition():
+            net.set_marking(marking)
+            for mode in trans.modes():
+                trans.fire(mode)
+                successor = net.get_marking()
+                net.set_marking(marking)
+                if successor not in visited and len(visited) < max_markings:
+                    visited.add(successor)
+                    todo.append(successor)
+
+    means = dict( (place.name, float(counts[place.name]) / explored) for place in net.place() )
+    return means, explored
+
+def apply_profile(net_info, means):
+    """ Record measured token counts in place informations.
+
+    @param net_info: net.
+    @type net_info: C{NetInfo}
+    @param means: mean token counts indexed by place names.
+    @type means: C{dict}
+    """
+    for place in net_info.places:
+        if place.name in means:
+            place.set_mean_tokens(means[place.name])
+
+def report(net_info, explored = 0):
+    """ Print input arc orders of transitions with several input arcs.
+
+    @param net_info: net.
+    @type net_info: C{NetInfo}
+    @param explored: number of markings of the profiling exploration,
+                     C{0} for static estimates.
+    @type explored: C{int}
+    """
+    source = ("profiled over {} markings".format(explored) if explored
+              else "static estimates")
+    print "################################################################################"
+    print "input arc order ({})".format(source)
+    print "################################################################################"
+    transitions = [ trans for trans in net_info.transitions if len(trans.input_arcs) > 1 ]
+    width = max([ len(trans.name) for trans in transitions ] + [1])
+    for trans in transitions:
+        conjuncts = guard_conjuncts(trans)
+        print "{name:{width}} : {places} (cost {cost:.3g})".format(name = trans.name,
+                                                                  width = width,
+                                                                  places = ", ".join(arc.place_name for arc in trans.input_arcs),
+                                                                  cost = order_cost(trans.input_arcs, conjuncts))
@@ -1,5 +1,50 @@
 #include "ctypes.h"
 
+neco_alloc_state_t   neco_alloc_state;
+int                  neco_alloc_enabled   = 1;
+size_t               neco_alloc_slab_size = NECO_ALLOC_SLAB_SIZE;
+neco_marking_stats_t neco_marking_stats;
+
+// blocks are requested by place operator new and token buffer growth,
+// which cannot report a failure to generated code, the process stops
+void neco_alloc_failed(size_t size)
+{
+    std::cerr << "neco: out of memory allocating " << size << " bytes" << std::endl;
+    abort();
+}
+
+// start a new slab holding a first block of size bytes, the end of the
+// current slab is lost
+void* neco_alloc_refill(size_t size)
+{
+    neco_alloc_state_t& state = neco_alloc_state;
+    size_t slab_size = neco_alloc_slab_size;
+    if (slab_size < size)
+        slab_size = size;
+
+    char* slab = (char*)malloc(slab_size);
+    if (!slab)
+        neco_alloc_failed(slab_size);
+
+    state.slab = slab;
+    state.stats.slab_bytes += slab_size;
+    void* block     = state.slab;
+    state.slab     += size;
+    state.slab_left = slab_size - size;
+    return block;
+}
+
+void neco_alloc_configure(int enabled, size_t slab_size)
+{
+    neco_alloc_enabled   = enabled;
+    neco_alloc_slab_size = slab_size;
+}
+
+neco_alloc_stats_t neco_alloc_stats()
+{
+    return neco_alloc_state.stats;
+}
+
 void neco_list_delete_elts(neco_list_t* list, deletion_callback_t del)
 {
     if (del == 0)
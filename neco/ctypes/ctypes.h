@@ -5,12 +5,185 @@
 #include <cstdio>
 #include <cstdlib>
 #include <cstring>
+#include <string>
 #include <vector>
 #include <utility>
 #include <iostream>
 
-#define INT_INIT_MAX_SIZE 2
-#define INT_RESIZE 4
+// tokens stored in the place object itself, larger places use a heap
+// buffer grown geometrically
+#define INT_INLINE_SIZE 4
+#define COUNTED_INLINE_SIZE 2
+
+/////////////////////////////////////////////////////
+// size class allocator
+/////////////////////////////////////////////////////
+
+// Place objects and token buffers are small blocks allocated and
+// released at each successor. Blocks of up to NECO_ALLOC_CLASSES
+// granules are carved from slabs and recycled through one free list per
+// size class, larger blocks use malloc. Each module has its own
+// allocator, blocks are preceded by a header holding the allocator they
+// come from and their size class (0 for malloc blocks), so that blocks
+// can be released by any module and the allocator can be disabled at
+// any time. Slabs are never returned to the system. Places are only
+// allocated and released with the GIL held.
+
+#define NECO_ALLOC_GRANULE 16
+#define NECO_ALLOC_CLASSES 32
+#define NECO_ALLOC_SLAB_SIZE (64 << 10)
+
+typedef struct
+{
+    long long allocations; // blocks handed out
+    long long reuses;      // blocks taken from a free list
+    long long live;        // blocks in use
+    long long live_bytes;  // bytes of blocks in use, headers included
+    long long slab_bytes;  // bytes reserved by slabs
+} neco_alloc_stats_t;
+
+typedef struct
+{
+    void*              free_lists[NECO_ALLOC_CLASSES + 1];
+    char*              slab;
+    size_t             slab_left;
+    neco_alloc_stats_t stats;
+} neco_alloc_state_t;
+
+typedef struct
+{
+    neco_alloc_state_t* owner;
+    unsigned int        size_class;
+    unsigned int        size;
+} neco_block_header_t;
+
+extern neco_alloc_state_t neco_alloc_state;
+extern int                neco_alloc_enabled;
+extern size_t             neco_alloc_slab_size;
+
+void               neco_alloc_failed(size_t size);
+void*              neco_alloc_refill(size_t size);
+void               neco_alloc_configure(int enabled, size_t slab_size);
+neco_alloc_stats_t neco_alloc_stats();
+
+inline void* neco_alloc(size_t size)
+{
+    neco_alloc_state_t& state = neco_alloc_state;
+    size_t size_class = (size + sizeof(neco_block_header_t) + NECO_ALLOC_GRANULE - 1) / NECO_ALLOC_GRANULE;
+    size_t bytes      = size_class * NECO_ALLOC_GRANULE;
+    neco_block_header_t* header;
+
+    if (!neco_alloc_enabled || size_class > NECO_ALLOC_CLASSES)
+    {
+        header = (neco_block_header_t*)malloc(bytes);
+        if (!header)
+            neco_alloc_failed(bytes);
+        size_class = 0;
+    }
+    else if (state.free_lists[size_class])
+    {
+        header = (neco_block_header_t*)state.free_lists[size_class];
+        state.free_lists[size_class] = *(void**)(header + 1);
+        state.stats.reuses++;
+    }
+    else if (state.slab_left >= bytes)
+    {
+        header = (neco_block_header_t*)state.slab;
+        state.slab += bytes;
+        state.slab_left -= bytes;
+    }
+    else
+    {
+        header = (neco_block_header_t*)neco_alloc_refill(bytes);
+    }
+
+    header->owner      = &state;
+    header->size_class = size_class;
+    header->size       = bytes;
+    state.stats.allocations++;
+    state.stats.live++;
+    state.stats.live_bytes += bytes;
+    return header + 1;
+}
+
+inline void neco_free(void* block)
+{
+    if (!block)
+        return;
+
+    neco_block_header_t* header = (neco_block_header_t*)block - 1;
+    neco_alloc_state_t&  state  = *header->owner;
+    state.stats.live--;
+    state.stats.live_bytes -= header->size;
+    if (header->size_class == 0)
+    {
+        free(header);
+    }
+    else
+    {
+        *(void**)block = state.free_lists[header->size_class];
+        state.free_lists[header->size_class] = header;
+    }
+}
+
+// counters of the markings of a generated module, markings are recycled
+// by a cython free list of size freelist, whose occupancy is mirrored.
+typedef struct
+{
+    long long allocations;
+    long long reuses;
+    long long live;
+    long long free;
+} neco_marking_stats_t;
+
+extern neco_marking_stats_t neco_marking_stats;
+
+inline void neco_marking_created()
+{
+    neco_marking_stats.allocations++;
+    neco_marking_stats.live++;
+    if (neco_marking_stats.free > 0)
+    {
+        neco_marking_stats.free--;
+        neco_marking_stats.reuses++;
+    }
+}
+
+inline void neco_marking_released(int freelist)
+{
+    neco_marking_stats.live--;
+    if (neco_marking_stats.free < freelist)
+        neco_marking_stats.free++;
+}
+
+/////////////////////////////////////////////////////
+// marking fingerprints (hash compaction)
+/////////////////////////////////////////////////////
+
+#define FINGERPRINT_INIT_CAPACITY 1024
+#define FINGERPRINT_OFFSET 0xcbf29ce484222325ULL
+#define FINGERPRINT_PRIME 0x100000001b3ULL
+
+typedef unsigned long long fingerprint_t;
+
+// fold a value into a fingerprint (FNV-1a on 64 bits words), place
+// contents are folded as values they can be restored from when
+// possible so that fingerprints keep all their 64 bits
+inline fingerprint_t fingerprint_mix(fingerprint_t h, fingerprint_t value)
+{
+    return (h ^ value) * FINGERPRINT_PRIME;
+}
+
+// final avalanche step (MurmurHash3 fmix64)
+inline fingerprint_t fingerprint_final(fingerprint_t h)
+{
+    h ^= h >> 33;
+    h *= 0xff51afd7ed558ccdULL;
+    h ^= h >> 33;
+    h *= 0xc4ceb9fe1a85ec53ULL;
+    h ^= h >> 33;
+    return h;
+}
 
 /////////////////////////////////////////////////////
 // int place type
@@ -54,16 +227,23 @@ struct THashProvider
 template <>
 struct THashProvider< int >
 {
+    // MurmurHash3 fmix32, neighbouring values get unrelated hashes
     inline static int hash(int value)
     {
-        return value;
+        unsigned int h = value;
+        h ^= h >> 16;
+        h *= 0x85ebca6bU;
+        h ^= h >> 13;
+        h *= 0xc2b2ae35U;
+        h ^= h >> 16;
+        return h;
     }
 };
 
 template < typename T >
 struct TDefaultComparisonProvider
 {
-    inline static int compare(T& left, T& right)
+    inline static int compare(const T& left, const T& right)
     {
         ASSERT(0, "no suitable specialization (DefaultComparisonProvider)");
         return 0;
@@ -73,7 +253,7 @@ struct TDefaultComparisonProvider
 template < typename T >
 struct TDefaultComparisonProvider< T* >
 {
-    inline static int compare(T* left, T* right)
+    inline static int compare(const T* left, const T* right)
     {
         ASSERT(0, "no suitable specialization (Ptr DefaultComparisonProvider)");
         return 0;
@@ -94,9 +274,10 @@ template <>
 struct TDefaultComparisonProvider< int >
 {
     typedef int       T;
-    inline static int compare(T& left, T& right)
+    inline static int compare(const T& left, const T& right)
     {
-        return left - right;
+        // left - right overflows for distant values
+        return (left > right) - (left < right);
     }
 };
 
@@ -115,7 +296,9 @@ struct TDefaultDataTypeHandler
 #define TGenericPlaceType_CLS \
     TGenericPlaceType< DataType, DataTypeHandler >
 
-// T is assumed to be a POD type
+// Sorted multiset of tokens, T is assumed to be a POD type (tokens are
+// moved with memmove). Up to INT_INLINE_SIZE tokens are stored inline,
+// insertion, removal and lookup use a binary search.
 template < typename DataType,
            template < typename > class DataTypeHandler = TDefaultDataTypeHandler >
 class TGenericPlaceType
@@ -129,6 +312,10 @@ public:
     inline TGenericPlaceType(const TGenericPlaceType& src);
     inline ~TGenericPlaceType();
 
+    // places are allocated by the size class allocator
+    static void* operator new(size_t size) { return neco_alloc(size); }
+    static void  operator delete(void* place) { neco_free(place); }
+
     inline void decrement_ref();
     inline void increment_ref();
 
@@ -146,14 +333,23 @@ public:
     int equals(const TGenericPlaceType< DataType >& right) const;
     int compare(const TGenericPlaceType< DataType >& right) const;
     int hash() const;
+    fingerprint_t fingerprint(fingerprint_t h) const;
 
     char* cstr() const;
 
 protected:
+    inline int lower_bound(const DataType& value) const;
+    inline void reserve(int size);
+
     int       mRefs;
     int       mSize;
     int       mMaxSize;
     DataType* mData;
+    DataType  mInline[INT_INLINE_SIZE];
+
+private:
+    // mData may point to mInline, places are only copied by the copy constructor
+    TGenericPlaceType& operator=(const TGenericPlaceType&);
 };
 
 //
@@ -162,8 +358,8 @@ TGenericPlaceType_TARGS
 TGenericPlaceType_CLS::TGenericPlaceType()
     : mRefs(1)
     , mSize(0)
-    , mMaxSize(INT_INIT_MAX_SIZE)
-    , mData(new DataType[INT_INIT_MAX_SIZE])
+    , mMaxSize(INT_INLINE_SIZE)
+    , mData(mInline)
 {
 }
 
@@ -171,16 +367,23 @@ TGenericPlaceType_TARGS
 TGenericPlaceType_CLS::TGenericPlaceType(const TGenericPlaceType& src)
     : mRefs(1)
     , mSize(src.mSize)
-    , mMaxSize(src.mMaxSize)
-    , mData(new DataType[src.mMaxSize])
+    , mMaxSize(INT_INLINE_SIZE)
+    , mData(mInline)
 {
+    // copies are usually modified, keep the capacity of the source
+    if (src.mSize > INT_INLINE_SIZE)
+    {
+        mMaxSize = src.mMaxSize;
+        mData    = (DataType*)neco_alloc(mMaxSize * sizeof(DataType));
+    }
     memcpy(mData, src.mData, src.mSize * sizeof(DataType));
 }
 
 TGenericPlaceType_TARGS
     TGenericPlaceType_CLS::~TGenericPlaceType()
 {
-    delete[] mData;
+    if (mData != mInline)
+        neco_free(mData);
 }
 
 TGenericPlaceType_TARGS void TGenericPlaceType_CLS::clean()
@@ -284,46 +487,64 @@ TGenericPlaceType_TARGS int TGenericPlaceType_CLS::compare(const TGenericPlaceTy
 
 TGenericPlaceType_TARGS int TGenericPlaceType_CLS::hash() const
 {
-    int i    = mSize - 1;
-    int hash = 0; // int_hash(pt->size);
-    for (; i >= 0; i--)
+    // tokens are sorted, hash them in order (FNV-1a on token hashes)
+    unsigned int hash = 0x811c9dc5U ^ mSize;
+    for (int i = 0; i < mSize; i++)
     {
-        hash ^= hash << 5;
-        hash = (hash ^ HashProvider_t::hash(mData[i]));
+        hash = (hash ^ (unsigned int)HashProvider_t::hash(mData[i])) * 0x01000193U;
     }
     return hash;
 }
 
-TGenericPlaceType_TARGS void TGenericPlaceType_CLS::add(DataType value)
+// folds the size then each token hash into h, token hashes of int
+// tokens are bijective so the place can be restored from what is folded
+TGenericPlaceType_TARGS fingerprint_t TGenericPlaceType_CLS::fingerprint(fingerprint_t h) const
 {
-    int i, j;
-    if (mSize >= mMaxSize)
+    h = fingerprint_mix(h, mSize);
+    for (int i = 0; i < mSize; i++)
     {
-        mMaxSize += INT_RESIZE;
-        DataType* new_data = new DataType[mMaxSize];
-        for (int i = 0; i < mSize; ++i)
-        {
-            new_data[i] = mData[i];
-        }
-        delete mData;
-        mData = new_data;
+        h = fingerprint_mix(h, (unsigned int)HashProvider_t::hash(mData[i]));
     }
-    // find suitable index
-    for (i = 0; i < mSize; i++)
+    return h;
+}
+
+// index of the first token not lower than value
+TGenericPlaceType_TARGS int TGenericPlaceType_CLS::lower_bound(const DataType& value) const
+{
+    int low  = 0;
+    int high = mSize;
+    while (low < high)
     {
-        if (ComparisonProvider_t::compare(mData[i], value) < 0)
-            continue;
+        int middle = (low + high) >> 1;
+        if (ComparisonProvider_t::compare(mData[middle], value) < 0)
+            low = middle + 1;
         else
-            break;
+            high = middle;
     }
+    return low;
+}
 
-    // shift values
-    for (j = mSize + 1; j > i; j--)
-    {
-        mData[j] = mData[j - 1];
-    }
+TGenericPlaceType_TARGS void TGenericPlaceType_CLS::reserve(int size)
+{
+    if (size <= mMaxSize)
+        return;
+
+    int max_size = mMaxSize * 2;
+    if (max_size < size)
+        max_size = size;
+    DataType* data = (DataType*)neco_alloc(max_size * sizeof(DataType));
+    memcpy(data, mData, mSize * sizeof(DataType));
+    if (mData != mInline)
+        neco_free(mData);
+    mData    = data;
+    mMaxSize = max_size;
+}
 
-    // store new value
+TGenericPlaceType_TARGS void TGenericPlaceType_CLS::add(DataType value)
+{
+    reserve(mSize + 1);
+    int i = lower_bound(value);
+    memmove(mData + i + 1, mData + i, (mSize - i) * sizeof(DataType));
     mData[i] = value;
     mSize++;
 }
@@ -331,23 +552,14 @@ TGenericPlaceType_TARGS void TGenericPlaceType_CLS::add(DataType value)
 TGenericPlaceType_TARGS void TGenericPlaceType_CLS::remove_by_index(int index)
 {
     mSize--;
-    for (int i = index; i < mSize; i++)
-        mData[i] = mData[i + 1];
+    memmove(mData + index, mData + index + 1, (mSize - index) * sizeof(DataType));
 }
 
 TGenericPlaceType_TARGS void TGenericPlaceType_CLS::remove_by_value(DataType value)
 {
-    int index = 0;
-    for (; index < mSize; index++)
-    {
-        if (mData[index] == value)
-        {
-            mSize--;
-            mData[index] = mData[mSize];
-            break;
-        }
-    }
-    qsort(mData, mSize, sizeof(int), int_cmp);
+    int index = index_of(value);
+    if (index >= 0)
+        remove_by_index(index);
 }
 
 TGenericPlaceType_TARGS const DataType& TGenericPlaceType_CLS::get(int index) const
@@ -367,18 +579,355 @@ TGenericPlaceType_TARGS void TGenericPlaceType_CLS::update(const TGenericPlaceTy
 
 TGenericPlaceType_TARGS int TGenericPlaceType_CLS::index_of(const DataType& value) const
 {
-    for (int i = 0; i < mSize; ++i)
+    int i = lower_bound(value);
+    if (i < mSize && ComparisonProvider_t::compare(mData[i], value) == 0)
+        return i;
+    return -1;
+}
+
+#undef TGenericPlaceType_TARGS
+#undef TGenericPlaceType_CLS
+
+#define TCountedPlaceType_TARGS   \
+    template < typename DataType, \
+               template < typename > class DataTypeHandler >
+
+#define TCountedPlaceType_CLS \
+    TCountedPlaceType< DataType, DataTypeHandler >
+
+// Multiset of tokens stored as sorted (value, count) pairs, copy, hash
+// and comparison are linear in the number of distinct tokens. Tokens
+// are accessed as in TGenericPlaceType, get and index_of use positions
+// in the sorted sequence of tokens. Up to COUNTED_INLINE_SIZE distinct
+// tokens are stored inline.
+template < typename DataType,
+           template < typename > class DataTypeHandler = TDefaultDataTypeHandler >
+class TCountedPlaceType
+{
+    typedef typename DataTypeHandler< DataType >::ComparisonProvider_t ComparisonProvider_t;
+    typedef typename DataTypeHandler< DataType >::HashProvider_t       HashProvider_t;
+    typedef typename DataTypeHandler< DataType >::Formatter_t          Formatter_t;
+
+    struct Entry
+    {
+        DataType value;
+        int      count;
+    };
+
+public:
+    inline TCountedPlaceType();
+    inline TCountedPlaceType(const TCountedPlaceType& src);
+    inline ~TCountedPlaceType();
+
+    static void* operator new(size_t size) { return neco_alloc(size); }
+    static void  operator delete(void* place) { neco_free(place); }
+
+    inline void decrement_ref();
+    inline void increment_ref();
+
+    void        add(DataType value);
+    void        remove_by_index(int index);
+    void        remove_by_value(DataType value);
+    void        update(const TCountedPlaceType& right);
+    inline void clean();
+
+    inline int             size() const;
+    inline bool            not_empty() const;
+    const DataType&        get(int index) const;
+    int                    index_of(const DataType& value) const;
+
+    inline int             distinct() const;
+    inline const DataType& value(int index) const;
+    inline int             count(int index) const;
+
+    int equals(const TCountedPlaceType& right) const;
+    int compare(const TCountedPlaceType& right) const;
+    int hash() const;
+    fingerprint_t fingerprint(fingerprint_t h) const;
+
+    char* cstr() const;
+
+protected:
+    inline int lower_bound(const DataType& value) const;
+    inline void reserve(int distinct);
+    inline void remove_entry(int entry);
+
+    int    mRefs;
+    int    mSize;
+    int    mDistinct;
+    int    mMaxDistinct;
+    Entry* mEntries;
+    Entry  mInline[COUNTED_INLINE_SIZE];
+
+private:
+    // mEntries may point to mInline, places are only copied by the copy constructor
+    TCountedPlaceType& operator=(const TCountedPlaceType&);
+};
+
+TCountedPlaceType_TARGS
+TCountedPlaceType_CLS::TCountedPlaceType()
+    : mRefs(1)
+    , mSize(0)
+    , mDistinct(0)
+    , mMaxDistinct(COUNTED_INLINE_SIZE)
+    , mEntries(mInline)
+{
+}
+
+TCountedPlaceType_TARGS
+TCountedPlaceType_CLS::TCountedPlaceType(const TCountedPlaceType& src)
+    : mRefs(1)
+    , mSize(src.mSize)
+    , mDistinct(src.mDistinct)
+    , mMaxDistinct(COUNTED_INLINE_SIZE)
+    , mEntries(mInline)
+{
+    if (src.mDistinct > COUNTED_INLINE_SIZE)
+    {
+        mMaxDistinct = src.mMaxDistinct;
+        mEntries     = (Entry*)neco_alloc(mMaxDistinct * sizeof(Entry));
+    }
+    memcpy(mEntries, src.mEntries, src.mDistinct * sizeof(Entry));
+}
+
+TCountedPlaceType_TARGS
+    TCountedPlaceType_CLS::~TCountedPlaceType()
+{
+    if (mEntries != mInline)
+        neco_free(mEntries);
+}
+
+TCountedPlaceType_TARGS void TCountedPlaceType_CLS::clean()
+{
+    assert(0);
+    mSize = 0;
+}
+
+TCountedPlaceType_TARGS void TCountedPlaceType_CLS::decrement_ref()
+{
+    mRefs--;
+    if (mRefs == 0)
+        delete this;
+}
+
+TCountedPlaceType_TARGS void TCountedPlaceType_CLS::increment_ref()
+{
+    mRefs++;
+}
+
+TCountedPlaceType_TARGS int TCountedPlaceType_CLS::size() const
+{
+    return mSize;
+}
+
+TCountedPlaceType_TARGS bool TCountedPlaceType_CLS::not_empty() const
+{
+    return mSize > 0;
+}
+
+TCountedPlaceType_TARGS int TCountedPlaceType_CLS::distinct() const
+{
+    return mDistinct;
+}
+
+TCountedPlaceType_TARGS const DataType& TCountedPlaceType_CLS::value(int index) const
+{
+    return mEntries[index].value;
+}
+
+TCountedPlaceType_TARGS int TCountedPlaceType_CLS::count(int index) const
+{
+    return mEntries[index].count;
+}
+
+// index of the first entry whose value is not lower than value
+TCountedPlaceType_TARGS int TCountedPlaceType_CLS::lower_bound(const DataType& value) const
+{
+    int low  = 0;
+    int high = mDistinct;
+    while (low < high)
+    {
+        int middle = (low + high) >> 1;
+        if (ComparisonProvider_t::compare(mEntries[middle].value, value) < 0)
+            low = middle + 1;
+        else
+            high = middle;
+    }
+    return low;
+}
+
+TCountedPlaceType_TARGS void TCountedPlaceType_CLS::reserve(int distinct)
+{
+    if (distinct <= mMaxDistinct)
+        return;
+
+    int max_distinct = mMaxDistinct * 2;
+    if (max_distinct < distinct)
+        max_distinct = distinct;
+    Entry* entries = (Entry*)neco_alloc(max_distinct * sizeof(Entry));
+    memcpy(entries, mEntries, mDistinct * sizeof(Entry));
+    if (mEntries != mInline)
+        neco_free(mEntries);
+    mEntries     = entries;
+    mMaxDistinct = max_distinct;
+}
+
+TCountedPlaceType_TARGS void TCountedPlaceType_CLS::add(DataType value)
+{
+    int i = lower_bound(value);
+    mSize++;
+    if (i < mDistinct && ComparisonProvider_t::compare(mEntries[i].value, value) == 0)
+    {
+        mEntries[i].count++;
+        return;
+    }
+    reserve(mDistinct + 1);
+    memmove(mEntries + i + 1, mEntries + i, (mDistinct - i) * sizeof(Entry));
+    mEntries[i].value = value;
+    mEntries[i].count = 1;
+    mDistinct++;
+}
+
+// remove one token of an entry
+TCountedPlaceType_TARGS void TCountedPlaceType_CLS::remove_entry(int entry)
+{
+    mSize--;
+    if (--mEntries[entry].count > 0)
+        return;
+    mDistinct--;
+    memmove(mEntries + entry, mEntries + entry + 1, (mDistinct - entry) * sizeof(Entry));
+}
+
+TCountedPlaceType_TARGS void TCountedPlaceType_CLS::remove_by_index(int index)
+{
+    int i = 0;
+    while (index >= mEntries[i].count)
+        index -= mEntries[i++].count;
+    remove_entry(i);
+}
+
+TCountedPlaceType_TARGS void TCountedPlaceType_CLS::remove_by_value(DataType value)
+{
+    int i = lower_bound(value);
+    if (i < mDistinct && ComparisonProvider_t::compare(mEntries[i].value, value) == 0)
+        remove_entry(i);
+}
+
+TCountedPlaceType_TARGS void TCountedPlaceType_CLS::update(const TCountedPlaceType& right)
+{
+    assert(0);
+}
+
+TCountedPlaceType_TARGS const DataType& TCountedPlaceType_CLS::get(int index) const
+{
+    int i = 0;
+    while (index >= mEntries[i].count)
+        index -= mEntries[i++].count;
+    return mEntries[i].value;
+}
+
+TCountedPlaceType_TARGS int TCountedPlaceType_CLS::index_of(const DataType& value) const
+{
+    int i = lower_bound(value);
+    if (i == mDistinct || ComparisonProvider_t::compare(mEntries[i].value, value) != 0)
+        return -1;
+
+    int index = 0;
+    for (int j = 0; j < i; j++)
+        index += mEntries[j].count;
+    return index;
+}
+
+TCountedPlaceType_TARGS int TCountedPlaceType_CLS::equals(const TCountedPlaceType& right) const
+{
+    if (this == &right)
+        return 1;
+
+    if (mSize != right.mSize || mDistinct != right.mDistinct)
+        return 0;
+
+    for (int i = 0; i < mDistinct; i++)
+    {
+        if (mEntries[i].count != right.mEntries[i].count
+            || ComparisonProvider_t::compare(mEntries[i].value, right.mEntries[i].value) != 0)
+            return 0;
+    }
+    return 1;
+}
+
+TCountedPlaceType_TARGS int TCountedPlaceType_CLS::compare(const TCountedPlaceType& right) const
+{
+    int tmp;
+
+    if (this == &right)
+        return 0;
+
+    tmp = mSize - right.mSize;
+    if (tmp != 0)
+        return tmp;
+
+    tmp = mDistinct - right.mDistinct;
+    if (tmp != 0)
+        return tmp;
+
+    for (int i = 0; i < mDistinct; i++)
+    {
+        tmp = ComparisonProvider_t::compare(mEntries[i].value, right.mEntries[i].value);
+        if (tmp != 0)
+            return tmp;
+        tmp = mEntries[i].count - right.mEntries[i].count;
+        if (tmp != 0)
+            return tmp;
+    }
+    return 0;
+}
+
+TCountedPlaceType_TARGS int TCountedPlaceType_CLS::hash() const
+{
+    unsigned int hash = 0x811c9dc5U ^ mSize;
+    for (int i = 0; i < mDistinct; i++)
+    {
+        hash = (hash ^ (unsigned int)HashProvider_t::hash(mEntries[i].value)) * 0x01000193U;
+        hash = (hash ^ (unsigned int)mEntries[i].count) * 0x01000193U;
+    }
+    return hash;
+}
+
+// same as TGenericPlaceType::fingerprint, on (value, count) pairs
+TCountedPlaceType_TARGS fingerprint_t TCountedPlaceType_CLS::fingerprint(fingerprint_t h) const
+{
+    h = fingerprint_mix(h, mDistinct);
+    for (int i = 0; i < mDistinct; i++)
     {
-        if (mData[i] == value)
+        h = fingerprint_mix(h, (unsigned int)HashProvider_t::hash(mEntries[i].value));
+        h = fingerprint_mix(h, (unsigned int)mEntries[i].count);
+    }
+    return h;
+}
+
+// same format as TGenericPlaceType, tokens are listed in decreasing order
+TCountedPlaceType_TARGS char* TCountedPlaceType_CLS::cstr() const
+{
+    static std::string s_buf;
+    char tmp[20];
+
+    s_buf = "[";
+    for (int i = mDistinct - 1; i >= 0; i--)
+    {
+        Formatter_t::format(tmp, mEntries[i].value);
+        for (int j = mEntries[i].count; j > 0; j--)
         {
-            return i;
+            s_buf += tmp;
+            if (i > 0 || j > 1)
+                s_buf += ", ";
         }
     }
-    return -1;
+    s_buf += "]";
+    return const_cast< char* >(s_buf.c_str());
 }
 
-#undef TGenericPlaceType_TARGS
-#undef TGenericPlaceType_CLS
+#undef TCountedPlaceType_TARGS
+#undef TCountedPlaceType_CLS
 
 #define TPid_TARGS template < typename T >
 #define TPid_CLS TPid< T >
@@ -588,6 +1137,361 @@ struct TFormatter< std::pair< TLeft, TRight > >
     }
 };
 
+/////////////////////////////////////////////////////
+// incremental marking hash
+/////////////////////////////////////////////////////
+
+// A marking hash is the sum of one term per unit (a place attribute or
+// the packed bytes), so a successor only recomputes the terms of the
+// places modified by the fired transition. Terms are 64 bits wide and
+// fully mixed so that sums of terms do not cluster.
+inline fingerprint_t neco_hash_term(fingerprint_t value, unsigned int unit)
+{
+    return fingerprint_final(value ^ ((fingerprint_t)(unit + 1) * 0x9e3779b97f4a7c15ULL));
+}
+
+// hash of the packed bytes of a marking (FNV-1a)
+inline fingerprint_t neco_hash_bytes(const unsigned char* data, int size)
+{
+    fingerprint_t h = FINGERPRINT_OFFSET;
+    for (int i = 0; i < size; ++i)
+        h = (h ^ data[i]) * FINGERPRINT_PRIME;
+    return h;
+}
+
+/////////////////////////////////////////////////////
+// dense places
+/////////////////////////////////////////////////////
+
+// A dense place holds int tokens of a small known range [low, low + size)
+// as a fixed size vector of counters stored in the marking, counts[i]
+// being the number of tokens of value low + i. Counters are unsigned
+// char, unsigned short or int depending on the bound of the place.
+
+template <typename CounterType>
+inline int neco_dense_size(const CounterType* counts, int size)
+{
+    int card = 0;
+    for (int i = 0; i < size; ++i)
+        card += counts[i];
+    return card;
+}
+
+template <typename CounterType>
+inline int neco_dense_compare(const CounterType* left, const CounterType* right, int size)
+{
+    for (int i = 0; i < size; ++i)
+    {
+        if (left[i] != right[i])
+            return left[i] < right[i] ? -1 : 1;
+    }
+    return 0;
+}
+
+template <typename CounterType>
+inline fingerprint_t neco_dense_hash(const CounterType* counts, int size)
+{
+    fingerprint_t h = FINGERPRINT_OFFSET;
+    for (int i = 0; i < size; ++i)
+        h = fingerprint_mix(h, (unsigned int)counts[i]);
+    return h;
+}
+
+template <typename CounterType>
+inline void neco_dense_clear(CounterType* counts, int size)
+{
+    memset(counts, 0, size * sizeof(CounterType));
+}
+
+template <typename CounterType>
+inline void neco_dense_copy(CounterType* dst, const CounterType* src, int size)
+{
+    memcpy(dst, src, size * sizeof(CounterType));
+}
+
+// same format as TGenericPlaceType, tokens are listed in decreasing order
+template <typename CounterType>
+inline char* neco_dense_cstr(const CounterType* counts, int size, int low)
+{
+    static std::string s_buf;
+    char tmp[20];
+    bool first = true;
+
+    s_buf = "[";
+    for (int i = size - 1; i >= 0; i--)
+    {
+        snprintf(tmp, sizeof(tmp), "%d", low + i);
+        for (int j = counts[i]; j > 0; j--)
+        {
+            if (!first)
+                s_buf += ", ";
+            s_buf += tmp;
+            first = false;
+        }
+    }
+    s_buf += "]";
+    return const_cast< char* >(s_buf.c_str());
+}
+
+// Open addressing table mapping fingerprints to state ids, the
+// fingerprint 0 marks free slots. Ids are 64 bits wide, as are the
+// numbers of states the table can hold.
+class TFingerprintTable
+{
+public:
+    inline TFingerprintTable()
+        : mSize(0)
+        , mCapacity(FINGERPRINT_INIT_CAPACITY)
+        , mKeys(new fingerprint_t[FINGERPRINT_INIT_CAPACITY]())
+        , mIds(new long long[FINGERPRINT_INIT_CAPACITY])
+    {
+    }
+
+    inline ~TFingerprintTable()
+    {
+        delete[] mKeys;
+        delete[] mIds;
+    }
+
+    // returns the id associated to fingerprint, or -1 if fingerprint
+    // was not in the table, in this case (fingerprint, id) is added.
+    inline long long insert(fingerprint_t fingerprint, long long id)
+    {
+        if (2 * (mSize + 1) > mCapacity)
+            grow();
+        if (fingerprint == 0)
+            fingerprint = 1;
+
+        size_t mask = mCapacity - 1;
+        size_t i    = fingerprint & mask;
+        while (mKeys[i] != 0)
+        {
+            if (mKeys[i] == fingerprint)
+                return mIds[i];
+            i = (i + 1) & mask;
+        }
+        mKeys[i] = fingerprint;
+        mIds[i]  = id;
+        mSize++;
+        return -1;
+    }
+
+    inline size_t size() const
+    {
+        return mSize;
+    }
+
+    // memory used by the table, in bytes
+    inline size_t memory() const
+    {
+        return mCapacity * (sizeof(fingerprint_t) + sizeof(long long));
+    }
+
+private:
+    inline void grow()
+    {
+        size_t         old_capacity = mCapacity;
+        fingerprint_t* old_keys     = mKeys;
+        long long*     old_ids      = mIds;
+
+        mCapacity *= 2;
+        mKeys = new fingerprint_t[mCapacity]();
+        mIds  = new long long[mCapacity];
+
+        size_t mask = mCapacity - 1;
+        for (size_t j = 0; j < old_capacity; ++j)
+        {
+            if (old_keys[j] == 0)
+                continue;
+            size_t i = old_keys[j] & mask;
+            while (mKeys[i] != 0)
+                i = (i + 1) & mask;
+            mKeys[i] = old_keys[j];
+            mIds[i]  = old_ids[j];
+        }
+        delete[] old_keys;
+        delete[] old_ids;
+    }
+
+    size_t         mSize;
+    size_t         mCapacity;
+    fingerprint_t* mKeys;
+    long long*     mIds;
+};
+
+/////////////////////////////////////////////////////
+// bitstate hashing (supertrace)
+/////////////////////////////////////////////////////
+
+// Fixed size bit array, a marking is represented by k bits whose
+// positions are derived from its fingerprint by double hashing
+// (h1 + i * h2), which behaves like k independent hash functions.
+class TBitstateTable
+{
+public:
+    inline TBitstateTable(size_t bytes, int hashes)
+        : mBits(bytes * 8)
+        , mHashes(hashes)
+        , mBitsSet(0)
+        , mData(new unsigned char[bytes]())
+    {
+    }
+
+    inline ~TBitstateTable()
+    {
+        delete[] mData;
+    }
+
+    // sets the bits of fingerprint, returns true if at least one of them
+    // was not set, ie. the marking is new.
+    // h1 and h2 are computed from the whole fingerprint so that tables of
+    // more than 2^32 bits are fully used.
+    inline bool insert(fingerprint_t fingerprint)
+    {
+        fingerprint_t h1  = fingerprint;
+        fingerprint_t h2  = fingerprint_final(fingerprint ^ 0x9e3779b97f4a7c15ULL) | 1;
+        bool          new_bit = false;
+        for (int i = 0; i < mHashes; ++i)
+        {
+            size_t        bit  = (h1 + i * h2) % mBits;
+            unsigned char mask = 1 << (bit & 7);
+            if (!(mData[bit >> 3] & mask))
+            {
+                mData[bit >> 3] |= mask;
+                mBitsSet++;
+                new_bit = true;
+            }
+        }
+        return new_bit;
+    }
+
+    inline size_t bits() const
+    {
+        return mBits;
+    }
+
+    inline size_t bits_set() const
+    {
+        return mBitsSet;
+    }
+
+    inline int hashes() const
+    {
+        return mHashes;
+    }
+
+private:
+    size_t         mBits;
+    int            mHashes;
+    size_t         mBitsSet;
+    unsigned char* mData;
+};
+
+/////////////////////////////////////////////////////
+// collapse compression
+/////////////////////////////////////////////////////
+
+#define INTERN_INIT_CAPACITY 1024
+
+// Hash-consing table of reference counted values (T provides hash,
+// equals, increment_ref and decrement_ref), the table holds a reference
+// to each value it stores. Stored values must not be modified.
+template < typename T >
+class TInternTable
+{
+public:
+    inline TInternTable()
+        : mSize(0)
+        , mReferences(0)
+        , mCapacity(INTERN_INIT_CAPACITY)
+        , mValues(new T*[INTERN_INIT_CAPACITY]())
+    {
+    }
+
+    inline ~TInternTable()
+    {
+        for (size_t i = 0; i < mCapacity; ++i)
+        {
+            if (mValues[i])
+                mValues[i]->decrement_ref();
+        }
+        delete[] mValues;
+    }
+
+    // returns the stored value equal to value, the reference to value is
+    // transferred to the returned one.
+    inline T* intern(T* value)
+    {
+        if (2 * (mSize + 1) > mCapacity)
+            grow();
+        mReferences++;
+
+        size_t mask = mCapacity - 1;
+        size_t i    = slot(value) & mask;
+        while (mValues[i] != 0)
+        {
+            T* stored = mValues[i];
+            if (stored == value)
+                return value;
+            if (stored->equals(*value))
+            {
+                stored->increment_ref();
+                value->decrement_ref();
+                return stored;
+            }
+            i = (i + 1) & mask;
+        }
+        value->increment_ref();
+        mValues[i] = value;
+        mSize++;
+        return value;
+    }
+
+    // number of distinct values
+    inline size_t size() const
+    {
+        return mSize;
+    }
+
+    // number of interned values, including duplicates
+    inline size_t references() const
+    {
+        return mReferences;
+    }
+
+private:
+    static inline size_t slot(const T* value)
+    {
+        return (size_t)(((unsigned int)value->hash()) * 2654435761U);
+    }
+
+    inline void grow()
+    {
+        size_t old_capacity = mCapacity;
+        T**    old_values   = mValues;
+
+        mCapacity *= 2;
+        mValues = new T*[mCapacity]();
+
+        size_t mask = mCapacity - 1;
+        for (size_t j = 0; j < old_capacity; ++j)
+        {
+            if (old_values[j] == 0)
+                continue;
+            size_t i = slot(old_values[j]) & mask;
+            while (mValues[i] != 0)
+                i = (i + 1) & mask;
+            mValues[i] = old_values[j];
+        }
+        delete[] old_values;
+    }
+
+    size_t mSize;
+    size_t mReferences;
+    size_t mCapacity;
+    T**    mValues;
+};
+
 ///
 
 typedef std::vector< void* > neco_list_t;
@@ -1,5 +1,12 @@
+from cpython.ref cimport PyObject
+
 cdef extern from "ctypes.h":
         void __Pyx_INCREF(object o)
+
+        ctypedef unsigned long long fingerprint_t
+        fingerprint_t fingerprint_mix(fingerprint_t h, fingerprint_t value)
+        fingerprint_t fingerprint_final(fingerprint_t h)
+
         cdef cppclass TGenericPlaceType[T]:
                 TGenericPlaceType()
                 TGenericPlaceType(TGenericPlaceType[T]&)
@@ -10,6 +17,7 @@ cdef extern from "ctypes.h":
                 int equals(TGenericPlaceType[T]&)
                 int compare(TGenericPlaceType[T]&)
                 int hash()
+                fingerprint_t fingerprint(fingerprint_t h)
                 int not_empty()
 
                 clean()
@@ -23,6 +31,33 @@ cdef extern from "ctypes.h":
                 void update(TGenericPlaceType[T]&)
                 char* cstr()
 
+        cdef cppclass TCountedPlaceType[T]:
+                TCountedPlaceType()
+                TCountedPlaceType(TCountedPlaceType[T]&)
+
+                void decrement_ref()
+                void increment_ref()
+
+                int equals(TCountedPlaceType[T]&)
+                int compare(TCountedPlaceType[T]&)
+                int hash()
+                fingerprint_t fingerprint(fingerprint_t h)
+                int not_empty()
+
+                clean()
+
+                void add(T& value)
+                void remove_by_value(T&)
+                void remove_by_index(int)
+
+                T& get(int)
+                int size()
+                int distinct()
+                T& value(int)
+                int count(int)
+                void update(TCountedPlaceType[T]&)
+                char* cstr()
+
         cdef cppclass TPid[T]:
                 TPid()
                 TPid(int i)
@@ -51,6 +86,68 @@ cdef extern from "ctypes.h":
                 int hash()
                 int compare(TGeneratorPlaceType[PidType, CounterType]&)
 
+        fingerprint_t neco_hash_term(fingerprint_t value, unsigned int unit)
+        fingerprint_t neco_hash_bytes(unsigned char* data, int size)
+
+        # dense counters are unsigned char, unsigned short or int
+        int neco_dense_size(unsigned char* counts, int size)
+        int neco_dense_size(unsigned short* counts, int size)
+        int neco_dense_size(int* counts, int size)
+        int neco_dense_compare(unsigned char* left, unsigned char* right, int size)
+        int neco_dense_compare(unsigned short* left, unsigned short* right, int size)
+        int neco_dense_compare(int* left, int* right, int size)
+        fingerprint_t neco_dense_hash(unsigned char* counts, int size)
+        fingerprint_t neco_dense_hash(unsigned short* counts, int size)
+        fingerprint_t neco_dense_hash(int* counts, int size)
+        void neco_dense_clear(unsigned char* counts, int size)
+        void neco_dense_clear(unsigned short* counts, int size)
+        void neco_dense_clear(int* counts, int size)
+        void neco_dense_copy(unsigned char* dst, unsigned char* src, int size)
+        void neco_dense_copy(unsigned short* dst, unsigned short* src, int size)
+        void neco_dense_copy(int* dst, int* src, int size)
+        char* neco_dense_cstr(unsigned char* counts, int size, int low)
+        char* neco_dense_cstr(unsigned short* counts, int size, int low)
+        char* neco_dense_cstr(int* counts, int size, int low)
+
+        ctypedef struct neco_alloc_stats_t:
+                long long allocations
+                long long reuses
+                long long live
+                long long live_bytes
+                long long slab_bytes
+
+        void neco_alloc_configure(int enabled, size_t slab_size)
+        neco_alloc_stats_t neco_alloc_stats()
+
+        ctypedef struct neco_marking_stats_t:
+                long long allocations
+                long long reuses
+                long long live
+                long long free
+
+        neco_marking_stats_t neco_marking_stats
+        void neco_marking_created()
+        void neco_marking_released(int freelist)
+
+        cdef cppclass TFingerprintTable:
+                TFingerprintTable()
+                long long insert(fingerprint_t fingerprint, long long id)
+                size_t size()
+                size_t memory()
+
+        cdef cppclass TBitstateTable:
+                TBitstateTable(size_t bytes, int hashes)
+                bint insert(fingerprint_t fingerprint)
+                size_t bits()
+                size_t bits_set()
+                int hashes()
+
+        cdef cppclass TInternTable[T]:
+                TInternTable()
+                T* intern(T* value)
+                size_t size()
+                size_t references()
+
         cdef cppclass neco_list_t:
                 neco_list_t()
                 void push_back(void*)
@@ -78,12 +175,54 @@ cdef class MultiSet:
         cdef void remove(MultiSet self, elt)
         cdef int size(MultiSet self)
         cdef int hash(MultiSet self)
+        cdef fingerprint_t fingerprint(MultiSet self, fingerprint_t h)
         cdef int compare(MultiSet self, MultiSet other)
         cdef void update(MultiSet self, MultiSet other)
         cdef list domain(MultiSet self)
         cpdef __dump__(MultiSet self)
         cdef has_key(MultiSet self, object key)
 
+cdef inline size_t state_table_slot(long h, int shift):
+        # Fibonacci hashing, marking hashes often have poor low bits
+        return <size_t> ((<unsigned long long> h * 11400714819323198485ULL) >> shift)
+
+cdef class StateTable:
+        cdef readonly list states
+        cdef unsigned int* slots
+        cdef long* hashes
+        cdef Py_ssize_t capacity
+        cdef int shift
+        cdef size_t empty
+
+        cdef int grow(StateTable self) except -1
+        cdef Py_ssize_t find(StateTable self, object obj, long h) except -2
+        cpdef Py_ssize_t add(StateTable self, object obj) except -1
+        cdef Py_ssize_t insert(StateTable self, object obj, long h) except -1
+        cpdef Py_ssize_t lookup(StateTable self, object obj) except -2
+
+cdef public class MarkingVector[object MarkingVector, type MarkingVectorType]:
+        cdef PyObject** items
+        cdef Py_ssize_t count
+        cdef Py_ssize_t capacity
+
+        cdef int append(MarkingVector self, object obj) except -1
+        cdef void clear(MarkingVector self)
+        cpdef set as_set(MarkingVector self)
+
+cdef class IdStamps:
+        cdef Py_ssize_t* stamps
+        cdef Py_ssize_t capacity
+
+        cdef int stamp(IdStamps self, Py_ssize_t i, Py_ssize_t stamp) except -1
+
+cdef class CollapseTable:
+        cdef TInternTable[TGenericPlaceType[int]]* int_places
+        cdef dict multisets
+        cdef size_t multiset_references
+
+        cdef TGenericPlaceType[int]* intern_int_place(CollapseTable self, TGenericPlaceType[int]* value)
+        cdef MultiSet intern_multiset(CollapseTable self, MultiSet value)
+
 cdef api class Pid[object Pid, type Pid]:
         cdef TPid[int]* mPid
 
@@ -122,4 +261,19 @@ cdef api class Pid[object Pid, type Pid]:
 # cdef pid_place_type_cstr(list pid)
 
 cdef MultiSet int_place_type_to_multiset(TGenericPlaceType[int]* place_type)
+cdef list int_place_type_to_list(TGenericPlaceType[int]* place_type)
+cdef TGenericPlaceType[int]* int_place_type_from_list(list tokens)
+
+cdef MultiSet counted_place_type_to_multiset(TCountedPlaceType[int]* place_type)
+cdef list counted_place_type_to_list(TCountedPlaceType[int]* place_type)
+cdef TCountedPlaceType[int]* counted_place_type_from_list(list counts)
+
+ctypedef fused dense_counter_t:
+        unsigned char
+        unsigned short
+        int
+
+cdef MultiSet dense_place_type_to_multiset(dense_counter_t* counts, int size, int low)
+cdef list dense_place_type_to_list(dense_counter_t* counts, int size, int low)
+cdef void dense_place_type_from_list(dense_counter_t* counts, int size, int low, list tokens)
 
@@ -1,4 +1,7 @@
 cimport ctypes_ext # this line will be replaced in profiler mode !
+from libc.stdlib cimport calloc, free, malloc, realloc
+from libc.string cimport memset
+from cpython.ref cimport PyObject, Py_INCREF, Py_DECREF
 
 import operator, sys, traceback
 
@@ -84,6 +87,14 @@ cdef class MultiSet:
         if self._data[elt] == 0:
             del self._data[elt]
 
+    def __reduce__(MultiSet self):
+        """ pickling support, a MultiSet is rebuilt from its data dict
+
+        @return: reconstruction information for C{pickle}
+        @rtype: C{tuple}
+        """
+        return (MultiSet, (self._data,))
+
     def __iter__(MultiSet self):
         """ iterator over the values (with repetitions)
         """
@@ -136,6 +147,19 @@ cdef class MultiSet:
         x += 97531L
         return x
 
+    cdef fingerprint_t fingerprint(MultiSet self, fingerprint_t h):
+        """ Fold the multiset into a marking fingerprint.
+
+        Unlike L{hash}, values are folded with their multiplicities, as a
+        sum of mixed terms so that the order of the dict does not matter.
+        """
+        cdef fingerprint_t terms = 0
+        cdef long y
+        for key, count in self._data.iteritems():
+            y = hash(key)
+            terms += fingerprint_final(fingerprint_mix(<fingerprint_t> y, <long> count))
+        return fingerprint_mix(fingerprint_mix(h, len(self._data)), terms)
+
     def __hash__ (MultiSet self) :
         """
         """
@@ -244,6 +268,325 @@ cdef MultiSet int_place_type_to_multiset(TGenericPlaceType[int]* place_type):
 
     return ms
 
+cdef list int_place_type_to_list(TGenericPlaceType[int]* place_type):
+    cdef list tokens = []
+    cdef int size = place_type.size()
+
+    for 0 <= i < size:
+        tokens.append(<int> place_type.get(i))
+
+    return tokens
+
+cdef TGenericPlaceType[int]* int_place_type_from_list(list tokens):
+    cdef TGenericPlaceType[int]* place_type = new TGenericPlaceType[int]()
+    cdef int token
+
+    for token in tokens:
+        place_type.add(token)
+
+    return place_type
+
+cdef MultiSet counted_place_type_to_multiset(TCountedPlaceType[int]* place_type):
+    cdef dict counts = {}
+    cdef int distinct = place_type.distinct()
+
+    for 0 <= i < distinct:
+        counts[<int> place_type.value(i)] = place_type.count(i)
+
+    return MultiSet(counts)
+
+cdef list counted_place_type_to_list(TCountedPlaceType[int]* place_type):
+    """ (value, count) pairs of a counted place. """
+    cdef list counts = []
+    cdef int distinct = place_type.distinct()
+
+    for 0 <= i < distinct:
+        counts.append((<int> place_type.value(i), place_type.count(i)))
+
+    return counts
+
+cdef TCountedPlaceType[int]* counted_place_type_from_list(list counts):
+    cdef TCountedPlaceType[int]* place_type = new TCountedPlaceType[int]()
+    cdef int token
+    cdef int count
+
+    for token, count in counts:
+        for 0 <= i < count:
+            place_type.add(token)
+
+    return place_type
+
+cdef MultiSet dense_place_type_to_multiset(dense_counter_t* counts, int size, int low):
+    cdef dict tokens = {}
+
+    for 0 <= i < size:
+        if counts[i] > 0:
+            tokens[low + i] = counts[i]
+
+    return MultiSet(tokens)
+
+cdef list dense_place_type_to_list(dense_counter_t* counts, int size, int low):
+    """ Tokens of a dense place in increasing order. """
+    cdef list tokens = []
+
+    for 0 <= i < size:
+        for 0 <= j < counts[i]:
+            tokens.append(low + i)
+
+    return tokens
+
+cdef void dense_place_type_from_list(dense_counter_t* counts, int size, int low, list tokens):
+    cdef int token
+
+    for 0 <= i < size:
+        counts[i] = 0
+    for token in tokens:
+        counts[token - low] += 1
+
+################################################################################
+# State tables
+################################################################################
+
+DEF STATE_TABLE_INIT_BITS = 10
+
+cdef class StateTable:
+    """ Objects indexed by dense ids assigned on insertion.
+
+    Objects are stored once, in insertion order, in the C{states}
+    list. The index is an open addressing table of ids and hashes are
+    cached so that they are compared before objects and never computed
+    again when the index grows.
+    """
+
+    def __cinit__(StateTable self):
+        self.states = []
+        self.capacity = 1 << STATE_TABLE_INIT_BITS
+        self.shift = 64 - STATE_TABLE_INIT_BITS
+        self.slots = <unsigned int*> calloc(self.capacity, sizeof(unsigned int))
+        self.hashes = <long*> calloc(self.capacity // 2, sizeof(long))
+        if self.slots == NULL or self.hashes == NULL:
+            raise MemoryError()
+
+    def __dealloc__(StateTable self):
+        free(self.slots)
+        free(self.hashes)
+
+    cdef int grow(StateTable self) except -1:
+        cdef Py_ssize_t capacity = self.capacity * 2
+        cdef Py_ssize_t count = len(self.states)
+        cdef unsigned int* slots = <unsigned int*> calloc(capacity, sizeof(unsigned int))
+        cdef long* hashes
+        cdef Py_ssize_t i
+        cdef size_t j
+
+        if slots == NULL:
+            raise MemoryError()
+        hashes = <long*> realloc(self.hashes, capacity // 2 * sizeof(long))
+        if hashes == NULL:
+            free(slots)
+            raise MemoryError()
+
+        self.hashes = hashes
+        self.shift -= 1
+        for i in range(count):
+            j = state_table_slot(hashes[i], self.shift)
+            while slots[j] != 0:
+                j = (j + 1) & (capacity - 1)
+            slots[j] = i + 1
+
+        free(self.slots)
+        self.slots = slots
+        self.capacity = capacity
+        return 0
+
+    cdef Py_ssize_t find(StateTable self, object obj, long h) except -2:
+        """ Id of an object, -1 if absent. The last probed slot is kept in C{empty}. """
+        cdef size_t mask = self.capacity - 1
+        cdef size_t j = state_table_slot(h, self.shift)
+        cdef Py_ssize_t i
+
+        while self.slots[j] != 0:
+            i = self.slots[j] - 1
+            if self.hashes[i] == h and self.states[i] == obj:
+                return i
+            j = (j + 1) & mask
+        self.empty = j
+        return -1
+
+    cpdef Py_ssize_t add(StateTable self, object obj) except -1:
+        """ Id of an object, added with the next id if absent. """
+        return self.insert(obj, hash(obj))
+
+    cdef Py_ssize_t insert(StateTable self, object obj, long h) except -1:
+        """ Id of an object of hash C{h}, added with the next id if absent. """
+        cdef Py_ssize_t count = len(self.states)
+        cdef Py_ssize_t i
+
+        if 2 * (count + 1) > self.capacity:
+            self.grow()
+        i = self.find(obj, h)
+        if i >= 0:
+            return i
+        self.slots[self.empty] = count + 1
+        self.hashes[count] = h
+        self.states.append(obj)
+        return count
+
+    cpdef Py_ssize_t lookup(StateTable self, object obj) except -2:
+        """ Id of an object, -1 if absent. """
+        return self.find(obj, hash(obj))
+
+    def __len__(StateTable self):
+        return len(self.states)
+
+    def __getitem__(StateTable self, Py_ssize_t i):
+        return self.states[i]
+
+    def __iter__(StateTable self):
+        return iter(self.states)
+
+    def __contains__(StateTable self, object obj):
+        return self.lookup(obj) >= 0
+
+DEF MARKING_VECTOR_INIT_CAPACITY = 64
+
+cdef public class MarkingVector[object MarkingVector, type MarkingVectorType]:
+    """ Successor accumulator, objects are kept in insertion order.
+
+    Duplicates are not removed, they are expected to be filtered once
+    by the table of visited markings. Clearing a vector keeps its
+    storage so that a single vector can be reused for every expanded
+    marking.
+    """
+
+    def __cinit__(MarkingVector self):
+        self.count = 0
+        self.capacity = MARKING_VECTOR_INIT_CAPACITY
+        self.items = <PyObject**> malloc(self.capacity * sizeof(PyObject*))
+        if self.items == NULL:
+            raise MemoryError()
+
+    def __dealloc__(MarkingVector self):
+        self.clear()
+        free(self.items)
+
+    cdef int append(MarkingVector self, object obj) except -1:
+        cdef PyObject** items
+        if self.count == self.capacity:
+            items = <PyObject**> realloc(self.items, 2 * self.capacity * sizeof(PyObject*))
+            if items == NULL:
+                raise MemoryError()
+            self.items = items
+            self.capacity *= 2
+        Py_INCREF(obj)
+        self.items[self.count] = <PyObject*> obj
+        self.count += 1
+        return 0
+
+    cdef void clear(MarkingVector self):
+        cdef Py_ssize_t i
+        for i in range(self.count):
+            Py_DECREF(<object> self.items[i])
+        self.count = 0
+
+    cpdef set as_set(MarkingVector self):
+        """ Distinct objects of the vector. """
+        cdef set result = set()
+        cdef Py_ssize_t i
+        for i in range(self.count):
+            result.add(<object> self.items[i])
+        return result
+
+    def __len__(MarkingVector self):
+        return self.count
+
+    def __getitem__(MarkingVector self, Py_ssize_t i):
+        if i < 0:
+            i += self.count
+        if i < 0 or i >= self.count:
+            raise IndexError(i)
+        return <object> self.items[i]
+
+    def __iter__(MarkingVector self):
+        cdef Py_ssize_t i
+        for i in range(self.count):
+            yield <object> self.items[i]
+
+DEF ID_STAMPS_INIT_CAPACITY = 1024
+
+cdef class IdStamps:
+    """ Last stamp given to each id, ids are small non negative integers.
+
+    Successor lists deduplicate their ids by stamping each id with the
+    number of the expanded marking, an id already holding this stamp is
+    a duplicate. Stamps must be positive, ids start with no stamp.
+    """
+
+    def __cinit__(IdStamps self):
+        self.capacity = ID_STAMPS_INIT_CAPACITY
+        self.stamps = <Py_ssize_t*> calloc(self.capacity, sizeof(Py_ssize_t))
+        if self.stamps == NULL:
+            raise MemoryError()
+
+    def __dealloc__(IdStamps self):
+        free(self.stamps)
+
+    cdef int stamp(IdStamps self, Py_ssize_t i, Py_ssize_t stamp) except -1:
+        """ Stamp an id, return 0 if it already held the stamp, 1 otherwise. """
+        cdef Py_ssize_t* stamps
+        cdef Py_ssize_t capacity = self.capacity
+        if i >= capacity:
+            while i >= capacity:
+                capacity *= 2
+            stamps = <Py_ssize_t*> realloc(self.stamps, capacity * sizeof(Py_ssize_t))
+            if stamps == NULL:
+                raise MemoryError()
+            memset(stamps + self.capacity, 0, (capacity - self.capacity) * sizeof(Py_ssize_t))
+            self.stamps = stamps
+            self.capacity = capacity
+        if self.stamps[i] == stamp:
+            return 0
+        self.stamps[i] = stamp
+        return 1
+
+cdef class CollapseTable:
+    """ Place values shared by all stored markings (collapse compression).
+
+    Equal place values are replaced by a single stored value, so a stored
+    marking only holds references to values of the table. Stored values
+    must never be modified, as for light copies.
+    """
+
+    def __cinit__(CollapseTable self):
+        self.int_places = new TInternTable[TGenericPlaceType[int]]()
+        self.multisets = {}
+        self.multiset_references = 0
+
+    def __dealloc__(CollapseTable self):
+        del self.int_places
+
+    cdef TGenericPlaceType[int]* intern_int_place(CollapseTable self, TGenericPlaceType[int]* value):
+        """ Stored place equal to C{value}, the reference to C{value} is transferred to it. """
+        return self.int_places.intern(value)
+
+    cdef MultiSet intern_multiset(CollapseTable self, MultiSet value):
+        """ Stored multiset equal to C{value}. """
+        self.multiset_references += 1
+        return self.multisets.setdefault(value, value)
+
+    property references:
+        """ Number of place values interned, including duplicates. """
+        def __get__(CollapseTable self):
+            return self.int_places.references() + self.multiset_references
+
+    def __len__(CollapseTable self):
+        return self.int_places.size() + len(self.multisets)
+
+    def compression_ratio(CollapseTable self):
+        """ Number of stored place values for each distinct value. """
+        cdef size_t values = len(self)
+        return float(self.references) / values if values else 1.0
+
 
 
 ################################################################################
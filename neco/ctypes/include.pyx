@@ -1,3 +1,4 @@
+from math import expm1
 import sys
 from time import time
 
@@ -17,6 +18,66 @@ cpdef dump(object obj):
         return obj.__dump__()
     else:
         return repr(obj)
+
+cdef class MarkingTable(ctypes_ext.StateTable):
+    """ State table of markings.
+
+    Markings are hashed and compared by the generated C functions
+    instead of python C{__hash__} and C{__richcmp__} calls, a marking is
+    looked up and inserted with a single probe sequence.
+    """
+
+    cdef Py_ssize_t find(MarkingTable self, object obj, long h) except -2:
+        cdef size_t mask = self.capacity - 1
+        cdef size_t j = ctypes_ext.state_table_slot(h, self.shift)
+        cdef Py_ssize_t i
+
+        while self.slots[j] != 0:
+            i = self.slots[j] - 1
+            if self.hashes[i] == h and neco_marking_compare(<Marking> self.states[i], <Marking> obj) == 0:
+                return i
+            j = (j + 1) & mask
+        self.empty = j
+        return -1
+
+    cpdef Py_ssize_t add(MarkingTable self, object obj) except -1:
+        """ Id of a marking, added with the next id if absent. """
+        return self.insert(obj, <long> neco_marking_hash_value(<Marking> obj))
+
+    cpdef Py_ssize_t lookup(MarkingTable self, object obj) except -2:
+        """ Id of a marking, -1 if absent. """
+        return self.find(obj, <long> neco_marking_hash_value(<Marking> obj))
+
+def configure_allocator(enabled = True, slab_size = 65536):
+    """ Configure the allocator of place objects and token buffers.
+
+    Blocks already allocated are released to the allocator they come
+    from, the allocator can be reconfigured at any time.
+
+    @param enabled: use size class slabs, otherwise C{malloc}.
+    @param slab_size: size in bytes of new slabs.
+    """
+    ctypes_ext.neco_alloc_configure(enabled, slab_size)
+
+def allocator_stats():
+    """ Counters of the place allocator and of the marking free list.
+
+    @return: dictionaries of counters for places (live objects, bytes and
+    reuse rate of place objects and token buffers of this module) and
+    markings.
+    """
+    cdef ctypes_ext.neco_alloc_stats_t places = ctypes_ext.neco_alloc_stats()
+    cdef ctypes_ext.neco_marking_stats_t markings = ctypes_ext.neco_marking_stats
+    return { 'places' : { 'allocations' : places.allocations,
+                          'reuses' : places.reuses,
+                          'reuse_rate' : float(places.reuses) / places.allocations if places.allocations else 0.0,
+                          'live' : places.live,
+                          'live_bytes' : places.live_bytes,
+                          'slab_bytes' : places.slab_bytes },
+             'markings' : { 'allocations' : markings.allocations,
+                            'reuses' : markings.reuses,
+                            'reuse_rate' : float(markings.reuses) / markings.allocations if markings.allocations else 0.0,
+                            'live' : markings.live } }
     
 cdef public api ctypes_ext.neco_list_t* neco_succs(Marking m, NecoCtx ctx):
     cdef ctypes_ext.neco_list_t* l = new ctypes_ext.neco_list_t()
@@ -27,96 +88,359 @@ cdef public api ctypes_ext.neco_list_t* neco_succs(Marking m, NecoCtx ctx):
         l.push_back( <void*>e )
     return l
 
+cpdef state_space_table():
+    """ State space exploration.
+
+    Markings are numbered in discovery order by a state table, the
+    markings to expand are the ones with ids not reached yet.
+
+    @return: table of reachable markings, with ids from 0.
+    """
+    cdef MarkingTable visited = MarkingTable()
+    cdef list states = visited.states
+    cdef Py_ssize_t count = 0
+    cdef NecoCtx ctx = NecoCtx()
+    cdef Marking m
+    cdef Marking s_mrk
+    cdef ctypes_ext.MarkingVector succ = ctypes_ext.MarkingVector()
+    cdef Py_ssize_t i
+    # markings not expanded yet are the last ones of the table
+    ctx.state_space = visited
+    ctx.remaining = set()
+    ctx.pid_free_hash = set()
+
+    start = time()
+    last_time = start
+
+    visited.add(init())
+    while count < len(states):
+        m = states[count]
+        count += 1
+        succ.clear()
+        neco_succs_into(m, succ, ctx)
+        for i in range(succ.count):
+            s_mrk = <Marking> succ.items[i]
+            visited.add(s_mrk)
+        if (count % 250 == 0):
+            new_time = time()
+            elapsed_time = new_time - start
+            sys.stdout.write("\r{}st {:5.3f}s (global {:5.0f}st/s, since last log {:5.0f}st/s)".format(count,
+                                                                                                       elapsed_time,
+                                                                                                       count / elapsed_time,
+                                                                                                       250 / (new_time-last_time)))
+            sys.stdout.flush()
+            last_time = new_time
+    print
+    return visited
+
+cpdef state_space_graph_table():
+    """ Reachability graph exploration.
+
+    @return: successor ids of each marking, indexed by id, and the
+    table of reachable markings, with ids from 0.
+    """
+    cdef MarkingTable visited = MarkingTable()
+    cdef list states = visited.states
+    cdef list graph = []
+    cdef list succ_list
+    cdef Py_ssize_t count = 0
+    cdef Py_ssize_t node_id
+    cdef NecoCtx ctx = NecoCtx()
+    cdef Marking m
+    cdef Marking s_mrk
+    # successor ids seen for the marking being expanded
+    cdef ctypes_ext.IdStamps seen = ctypes_ext.IdStamps()
+    cdef ctypes_ext.MarkingVector succ = ctypes_ext.MarkingVector()
+    cdef Py_ssize_t i
+    # markings not expanded yet are the last ones of the table
+    ctx.state_space = visited
+    ctx.remaining = set()
+    ctx.pid_free_hash = set()
+
+    start = time()
+    last_time = start
+
+    visited.add(init())
+    while count < len(states):
+        m = states[count]
+        count += 1
+        succ_list = []
+        succ.clear()
+        neco_succs_into(m, succ, ctx)
+        for i in range(succ.count):
+            s_mrk = <Marking> succ.items[i]
+            node_id = visited.add(s_mrk)
+            if seen.stamp(node_id, count):
+                succ_list.append(node_id)
+        graph.append(succ_list)
+        if (count % 250 == 0):
+            new_time = time()
+            elapsed_time = new_time - start
+            sys.stdout.write("\r{}st {:5.3f}s (global {:5.0f}st/s, since last log {:5.0f}st/s)".format(count,
+                                                                                                       elapsed_time,
+                                                                                                       count / elapsed_time,
+                                                                                                       250 / (new_time-last_time)))
+            sys.stdout.flush()
+            last_time = new_time
+    print
+    return graph, visited
+
 cpdef state_space():
-    cdef set visited
-    cdef set visit
-    cdef set succ
-    cdef int count
+    """ State space exploration.
+
+    @return: set of reachable markings.
+    """
+    return set(state_space_table())
+
+cpdef state_space_graph():
+    """ Reachability graph exploration.
+
+    Markings are numbered from 1 in discovery order.
+
+    @return: successor ids indexed by marking ids, and marking ids
+    indexed by markings.
+    """
+    cdef list table_graph
+    cdef ctypes_ext.StateTable visited
+    cdef dict graph = {}
+    cdef dict mrk_id_map = {}
+    cdef Py_ssize_t i
+    table_graph, visited = state_space_graph_table()
+    for i in range(len(table_graph)):
+        graph[i + 1] = [ node_id + 1 for node_id in table_graph[i] ]
+        mrk_id_map[visited.states[i]] = i + 1
+    return graph, mrk_id_map
+
+cpdef state_space_collapse():
+    """ State space exploration with collapse compression.
+
+    Place values of new markings are replaced by equal values stored
+    in a collapse table, so that markings share them.
+
+    @return: table of reachable markings and collapse table.
+    """
+    cdef MarkingTable visited = MarkingTable()
+    cdef ctypes_ext.CollapseTable values = ctypes_ext.CollapseTable()
+    cdef list states = visited.states
+    cdef Py_ssize_t count = 0
+    cdef Py_ssize_t size
     cdef NecoCtx ctx = NecoCtx()
-    #cdef int last_count = 0
+    cdef Marking m
+    cdef Marking s_mrk
+    cdef ctypes_ext.MarkingVector succ = ctypes_ext.MarkingVector()
+    cdef Py_ssize_t i
+    # markings not expanded yet are the last ones of the table
+    ctx.state_space = visited
+    ctx.remaining = set()
+    ctx.pid_free_hash = set()
+
+    start = time()
+
+    m = init()
+    m.collapse(values)
+    visited.add(m)
+    while count < len(states):
+        m = states[count]
+        count += 1
+        succ.clear()
+        neco_succs_into(m, succ, ctx)
+        for i in range(succ.count):
+            s_mrk = <Marking> succ.items[i]
+            size = len(states)
+            if visited.add(s_mrk) == size:
+                s_mrk.collapse(values)
+        if (count % 250 == 0):
+            new_time = time()
+            elapsed_time = new_time - start
+            sys.stdout.write("\r{}st {:5.3f}s ({:5.0f}st/s) compression ratio {:.2f}".format(count,
+                                                                                          elapsed_time,
+                                                                                          count / elapsed_time,
+                                                                                          values.compression_ratio()))
+            sys.stdout.flush()
+    print
+    return visited, values
+
+def hash_compaction_omission(states, bits = None):
+    """ Probability that hash compaction omitted at least one state.
+
+    @param states: number of stored fingerprints.
+    @param bits: fingerprint size in bits, by default the number of bits
+                 the place contents of the net keep (see
+                 C{neco_fingerprint_bits}).
+    """
+    if bits is None:
+        bits = neco_fingerprint_bits()
+    return -expm1(- float(states) * (states - 1) / 2.0 ** (bits + 1))
+
+cpdef state_space_hash_compaction():
+    """ State space exploration storing only marking fingerprints.
+
+    Hash compaction is probabilistic, a marking whose fingerprint
+    collides with a visited one is not explored and some states may be
+    missed (see C{hash_compaction_omission}).
+
+    @return: number of visited states.
+    """
+    cdef ctypes_ext.TFingerprintTable* visited = new ctypes_ext.TFingerprintTable()
+    cdef NecoCtx ctx = NecoCtx()
+    cdef list visit
+    cdef Py_ssize_t count = 0
+    cdef Marking m
+    cdef Marking s_mrk
+    cdef ctypes_ext.MarkingVector succ = ctypes_ext.MarkingVector()
+    cdef Py_ssize_t i
     start = time()
     last_time = start
+
     try:
-        visited = set()
-        visit = set([init()])
-        succ = set()
-        count = 0
-        start = time()
-        while True:
+        m = init()
+        visited.insert(m.fingerprint(), 0)
+        visit = [m]
+        while visit:
             count += 1
             m = visit.pop()
-            visited.add(m)
-            succ = succs(m, ctx)
-            visit.update(succ.difference(visited))
+            succ.clear()
+            neco_succs_into(m, succ, ctx)
+            for i in range(succ.count):
+                s_mrk = <Marking> succ.items[i]
+                if visited.insert(s_mrk.fingerprint(), 0) < 0:
+                    visit.append(s_mrk)
             if (count % 250 == 0):
                 new_time = time()
                 elapsed_time = new_time - start
-                sys.stdout.write("\r{}st {:5.3f}s (global {:5.0f}st/s, since last log {:5.0f}st/s)".format(count,
-                                                                                                           elapsed_time,
-                                                                                                           count / elapsed_time,
-                                                                                                           100 / (new_time-last_time)))
+                sys.stdout.write("\r{}st {:5.3f}s (global {:5.0f}st/s, since last log {:5.0f}st/s) omission {:.2e}".format(count,
+                                                                                                                        elapsed_time,
+                                                                                                                        count / elapsed_time,
+                                                                                                                        250 / (new_time-last_time),
+                                                                                                                        hash_compaction_omission(count)))
                 sys.stdout.flush()
                 last_time = new_time
-    except KeyError:
         print
-        return visited
-    return visited
+        return visited.size()
+    finally:
+        del visited
 
-cpdef state_space_graph():
-    """ State space exploration function with on the fly marking dump. """
-    cdef NecoCtx ctx = NecoCtx() 
-    cdef set visit
-    cdef set visited = set()
-    cdef set succ
-    cdef int count = 0
-    cdef int next = 1
+cpdef state_space_graph_hash_compaction(map_file = None):
+    """ Reachability graph exploration storing only marking fingerprints.
+
+    Markings are not kept, if C{map_file} is given each new marking is
+    written to it with its id when discovered. As with
+    C{state_space_hash_compaction} some states may be missed.
+
+    @return: reachability graph and number of visited states.
+    """
+    cdef ctypes_ext.TFingerprintTable* ids = new ctypes_ext.TFingerprintTable()
+    cdef NecoCtx ctx = NecoCtx()
+    cdef list visit
+    cdef list succ_list
     cdef dict graph = {}
-    cdef dict mrk_id_map = {}
-    cdef list succ_list = []
+    cdef Py_ssize_t count = 0
+    cdef Py_ssize_t next = 1
+    cdef Py_ssize_t node_id
+    cdef Py_ssize_t current_node_id
+    cdef Marking m
+    cdef Marking s_mrk
+    # successor ids seen for the marking being expanded
+    cdef ctypes_ext.IdStamps seen = ctypes_ext.IdStamps()
+    cdef ctypes_ext.MarkingVector succ = ctypes_ext.MarkingVector()
+    cdef Py_ssize_t i
     start = time()
     last_time = start
 
-    cdef Marking m = init()
-    cdef Marking s_mrk
-
-    visit = set([m])
-    mrk_id_map[m] = next
-    next += 1
-
     try:
-        while True:
-            count += 1
-            m = visit.pop()
-            visited.add(m)
+        m = init()
+        ids.insert(m.fingerprint(), next)
+        if map_file:
+            map_file.write("{} : {}\n".format(next, m.__dump__()))
+        visit = [(next, m)]
+        next += 1
 
-            # new marking, get the id
-            current_node_id = mrk_id_map[m]
-            succ = succs(m, ctx)
+        while visit:
+            count += 1
+            current_node_id, m = visit.pop()
             succ_list = []
-
-            for s_mrk in succ:
-                if mrk_id_map.has_key(s_mrk):
-                    node_id = mrk_id_map[s_mrk]
-                    succ_list.append(node_id)
-                else:
+            succ.clear()
+            neco_succs_into(m, succ, ctx)
+            for i in range(succ.count):
+                s_mrk = <Marking> succ.items[i]
+                node_id = ids.insert(s_mrk.fingerprint(), next)
+                if node_id < 0:
                     node_id = next
                     next += 1
+                    visit.append((node_id, s_mrk))
+                    if map_file:
+                        map_file.write("{} : {}\n".format(node_id, s_mrk.__dump__()))
+                if seen.stamp(node_id, count):
                     succ_list.append(node_id)
-                    mrk_id_map[s_mrk] = node_id
-
             graph[current_node_id] = succ_list
-
-            visit.update(succ.difference(visited))
             if (count % 250 == 0):
                 new_time = time()
                 elapsed_time = new_time - start
-                sys.stdout.write("\r{}st {:5.3f}s (global {:5.0f}st/s, since last log {:5.0f}st/s)".format(count,
-                                                                                                           elapsed_time,
-                                                                                                           count / elapsed_time,
-                                                                                                           250 / (new_time-last_time)))
+                sys.stdout.write("\r{}st {:5.3f}s (global {:5.0f}st/s, since last log {:5.0f}st/s) omission {:.2e}".format(count,
+                                                                                                                        elapsed_time,
+                                                                                                                        count / elapsed_time,
+                                                                                                                        250 / (new_time-last_time),
+                                                                                                                        hash_compaction_omission(count)))
                 sys.stdout.flush()
                 last_time = new_time
-    except KeyError:
         print
-        return graph, mrk_id_map
-    return graph, mrk_id_map
+        return graph, ids.size()
+    finally:
+        del ids
+
+def bitstate_statistics(states, bits_set, bits, hashes):
+    """ Statistics of a bitstate exploration.
+
+    @return: fill ratio of the bit array, hash factor (bits per state)
+    and probability that a new marking is wrongly seen as visited.
+    """
+    fill = float(bits_set) / bits
+    factor = float(bits) / states if states else float('inf')
+    return fill, factor, fill ** hashes
+
+cpdef state_space_bitstate(size_t size, int hashes = 3):
+    """ Bitstate (supertrace) state space exploration.
+
+    Visited markings are stored as C{hashes} bits in a C{size} bytes bit
+    array, some states may be missed.
+
+    @return: number of visited states, number of set bits and array size in bits.
+    """
+    cdef ctypes_ext.TBitstateTable* visited = new ctypes_ext.TBitstateTable(size, hashes)
+    cdef NecoCtx ctx = NecoCtx()
+    cdef list visit
+    cdef int count = 0
+    cdef Marking m
+    cdef Marking s_mrk
+    cdef ctypes_ext.MarkingVector succ = ctypes_ext.MarkingVector()
+    cdef Py_ssize_t i
+    start = time()
+
+    try:
+        m = init()
+        visited.insert(m.fingerprint())
+        visit = [m]
+        while visit:
+            count += 1
+            m = visit.pop()
+            succ.clear()
+            neco_succs_into(m, succ, ctx)
+            for i in range(succ.count):
+                s_mrk = <Marking> succ.items[i]
+                if visited.insert(s_mrk.fingerprint()):
+                    visit.append(s_mrk)
+            if (count % 250 == 0):
+                new_time = time()
+                elapsed_time = new_time - start
+                fill, factor, collision = bitstate_statistics(count, visited.bits_set(), visited.bits(), hashes)
+                sys.stdout.write("\r{}st {:5.3f}s ({:5.0f}st/s) fill {:7.3%} hash factor {:.1f} collision {:.2e}".format(count,
+                                                                                                                    elapsed_time,
+                                                                                                                    count / elapsed_time,
+                                                                                                                    fill,
+                                                                                                                    factor,
+                                                                                                                    collision))
+                sys.stdout.flush()
+        print
+        return count, visited.bits_set(), visited.bits()
+    finally:
+        del visited
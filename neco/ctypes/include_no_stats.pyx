@@ -1,3 +1,4 @@
+from math import expm1
 import sys
 
 cdef class NecoCtx:
@@ -17,78 +18,346 @@ cpdef dump(object obj):
     else:
         return repr(obj)
 
-cpdef state_space():
-    cdef set visited
-    cdef set visit
-    cdef set succ
+cdef class MarkingTable(ctypes_ext.StateTable):
+    """ State table of markings.
+
+    Markings are hashed and compared by the generated C functions
+    instead of python C{__hash__} and C{__richcmp__} calls, a marking is
+    looked up and inserted with a single probe sequence.
+    """
+
+    cdef Py_ssize_t find(MarkingTable self, object obj, long h) except -2:
+        cdef size_t mask = self.capacity - 1
+        cdef size_t j = ctypes_ext.state_table_slot(h, self.shift)
+        cdef Py_ssize_t i
+
+        while self.slots[j] != 0:
+            i = self.slots[j] - 1
+            if self.hashes[i] == h and neco_marking_compare(<Marking> self.states[i], <Marking> obj) == 0:
+                return i
+            j = (j + 1) & mask
+        self.empty = j
+        return -1
+
+    cpdef Py_ssize_t add(MarkingTable self, object obj) except -1:
+        """ Id of a marking, added with the next id if absent. """
+        return self.insert(obj, <long> neco_marking_hash_value(<Marking> obj))
+
+    cpdef Py_ssize_t lookup(MarkingTable self, object obj) except -2:
+        """ Id of a marking, -1 if absent. """
+        return self.find(obj, <long> neco_marking_hash_value(<Marking> obj))
+
+def configure_allocator(enabled = True, slab_size = 65536):
+    """ Configure the allocator of place objects and token buffers.
+
+    Blocks already allocated are released to the allocator they come
+    from, the allocator can be reconfigured at any time.
+
+    @param enabled: use size class slabs, otherwise C{malloc}.
+    @param slab_size: size in bytes of new slabs.
+    """
+    ctypes_ext.neco_alloc_configure(enabled, slab_size)
+
+def allocator_stats():
+    """ Counters of the place allocator and of the marking free list.
+
+    @return: dictionaries of counters for places (live objects, bytes and
+    reuse rate of place objects and token buffers of this module) and
+    markings.
+    """
+    cdef ctypes_ext.neco_alloc_stats_t places = ctypes_ext.neco_alloc_stats()
+    cdef ctypes_ext.neco_marking_stats_t markings = ctypes_ext.neco_marking_stats
+    return { 'places' : { 'allocations' : places.allocations,
+                          'reuses' : places.reuses,
+                          'reuse_rate' : float(places.reuses) / places.allocations if places.allocations else 0.0,
+                          'live' : places.live,
+                          'live_bytes' : places.live_bytes,
+                          'slab_bytes' : places.slab_bytes },
+             'markings' : { 'allocations' : markings.allocations,
+                            'reuses' : markings.reuses,
+                            'reuse_rate' : float(markings.reuses) / markings.allocations if markings.allocations else 0.0,
+                            'live' : markings.live } }
+
+cpdef state_space_table():
+    """ State space exploration.
+
+    Markings are numbered in discovery order by a state table, the
+    markings to expand are the ones with ids not reached yet.
+
+    @return: table of reachable markings, with ids from 0.
+    """
+    cdef MarkingTable visited = MarkingTable()
+    cdef list states = visited.states
+    cdef Py_ssize_t count = 0
     cdef NecoCtx ctx = NecoCtx()
-    
-    
-    #cdef int last_count = 0
-    try:
-        visited = set()
-        visit = set([init()])
-        succ = set()
-        count = 0
-        
-        ctx.remaining = visit
-        ctx.state_space = visited
-        ctx.pid_free_hash = set()
-
-        while True:
-            m = visit.pop()
-            visited.add(m)
-            succ = succs(m, ctx)
-            visit.update(succ.difference(visited))
-    except KeyError:
-        return visited
+    cdef Marking m
+    cdef Marking s_mrk
+    cdef ctypes_ext.MarkingVector succ = ctypes_ext.MarkingVector()
+    cdef Py_ssize_t i
+
+    # markings not expanded yet are the last ones of the table
+    ctx.state_space = visited
+    ctx.remaining = set()
+    ctx.pid_free_hash = set()
+
+    visited.add(init())
+    while count < len(states):
+        m = states[count]
+        count += 1
+        succ.clear()
+        neco_succs_into(m, succ, ctx)
+        for i in range(succ.count):
+            s_mrk = <Marking> succ.items[i]
+            visited.add(s_mrk)
     return visited
 
+cpdef state_space_graph_table():
+    """ Reachability graph exploration.
+
+    @return: successor ids of each marking, indexed by id, and the
+    table of reachable markings, with ids from 0.
+    """
+    cdef MarkingTable visited = MarkingTable()
+    cdef list states = visited.states
+    cdef list graph = []
+    cdef list succ_list
+    cdef Py_ssize_t count = 0
+    cdef Py_ssize_t node_id
+    cdef NecoCtx ctx = NecoCtx()
+    cdef Marking m
+    cdef Marking s_mrk
+    # successor ids seen for the marking being expanded
+    cdef ctypes_ext.IdStamps seen = ctypes_ext.IdStamps()
+    cdef ctypes_ext.MarkingVector succ = ctypes_ext.MarkingVector()
+    cdef Py_ssize_t i
+
+    # markings not expanded yet are the last ones of the table
+    ctx.state_space = visited
+    ctx.remaining = set()
+    ctx.pid_free_hash = set()
+
+    visited.add(init())
+    while count < len(states):
+        m = states[count]
+        count += 1
+        succ_list = []
+        succ.clear()
+        neco_succs_into(m, succ, ctx)
+        for i in range(succ.count):
+            s_mrk = <Marking> succ.items[i]
+            node_id = visited.add(s_mrk)
+            if seen.stamp(node_id, count):
+                succ_list.append(node_id)
+        graph.append(succ_list)
+    return graph, visited
+
+cpdef state_space():
+    """ State space exploration.
+
+    @return: set of reachable markings.
+    """
+    return set(state_space_table())
+
 cpdef state_space_graph():
-    cdef set visit
-    cdef set visited = set()
-    cdef set succ
-    cdef int next = 1
+    """ Reachability graph exploration.
+
+    Markings are numbered from 1 in discovery order.
+
+    @return: successor ids indexed by marking ids, and marking ids
+    indexed by markings.
+    """
+    cdef list table_graph
+    cdef ctypes_ext.StateTable visited
     cdef dict graph = {}
     cdef dict mrk_id_map = {}
-    cdef list succ_list = []
+    cdef Py_ssize_t i
+    table_graph, visited = state_space_graph_table()
+    for i in range(len(table_graph)):
+        graph[i + 1] = [ node_id + 1 for node_id in table_graph[i] ]
+        mrk_id_map[visited.states[i]] = i + 1
+    return graph, mrk_id_map
+
+cpdef state_space_collapse():
+    """ State space exploration with collapse compression.
+
+    Place values of new markings are replaced by equal values stored
+    in a collapse table, so that markings share them.
 
+    @return: table of reachable markings and collapse table.
+    """
+    cdef MarkingTable visited = MarkingTable()
+    cdef ctypes_ext.CollapseTable values = ctypes_ext.CollapseTable()
+    cdef list states = visited.states
+    cdef Py_ssize_t count = 0
+    cdef Py_ssize_t size
     cdef NecoCtx ctx = NecoCtx()
-    
-    cdef Marking m = init()
+    cdef Marking m
     cdef Marking s_mrk
+    cdef ctypes_ext.MarkingVector succ = ctypes_ext.MarkingVector()
+    cdef Py_ssize_t i
 
-    visit = set([m])
-    mrk_id_map[m] = next
-    next += 1
-
-    ctx.remaining = visit
+    # markings not expanded yet are the last ones of the table
     ctx.state_space = visited
+    ctx.remaining = set()
     ctx.pid_free_hash = set()
-    
+
+    m = init()
+    m.collapse(values)
+    visited.add(m)
+    while count < len(states):
+        m = states[count]
+        count += 1
+        succ.clear()
+        neco_succs_into(m, succ, ctx)
+        for i in range(succ.count):
+            s_mrk = <Marking> succ.items[i]
+            size = len(states)
+            if visited.add(s_mrk) == size:
+                s_mrk.collapse(values)
+    return visited, values
+
+def hash_compaction_omission(states, bits = None):
+    """ Probability that hash compaction omitted at least one state.
+
+    @param states: number of stored fingerprints.
+    @param bits: fingerprint size in bits, by default the number of bits
+                 the place contents of the net keep (see
+                 C{neco_fingerprint_bits}).
+    """
+    if bits is None:
+        bits = neco_fingerprint_bits()
+    return -expm1(- float(states) * (states - 1) / 2.0 ** (bits + 1))
+
+cpdef state_space_hash_compaction():
+    """ State space exploration storing only marking fingerprints.
+
+    Hash compaction is probabilistic, a marking whose fingerprint
+    collides with a visited one is not explored and some states may be
+    missed (see C{hash_compaction_omission}).
+
+    @return: number of visited states.
+    """
+    cdef ctypes_ext.TFingerprintTable* visited = new ctypes_ext.TFingerprintTable()
+    cdef NecoCtx ctx = NecoCtx()
+    cdef list visit
+    cdef Py_ssize_t count = 0
+    cdef Marking m
+    cdef Marking s_mrk
+    cdef ctypes_ext.MarkingVector succ = ctypes_ext.MarkingVector()
+    cdef Py_ssize_t i
+
     try:
-        while True:
+        m = init()
+        visited.insert(m.fingerprint(), 0)
+        visit = [m]
+        while visit:
+            count += 1
             m = visit.pop()
-            visited.add(m)
+            succ.clear()
+            neco_succs_into(m, succ, ctx)
+            for i in range(succ.count):
+                s_mrk = <Marking> succ.items[i]
+                if visited.insert(s_mrk.fingerprint(), 0) < 0:
+                    visit.append(s_mrk)
+        return visited.size()
+    finally:
+        del visited
 
-            # new marking, get the id
-            current_node_id = mrk_id_map[m]
-            succ = succs(m, ctx)
-            succ_list = []
+cpdef state_space_graph_hash_compaction(map_file = None):
+    """ Reachability graph exploration storing only marking fingerprints.
 
-            for s_mrk in succ:
-                if mrk_id_map.has_key(s_mrk):
-                    node_id = mrk_id_map[s_mrk]
-                    succ_list.append(node_id)
-                else:
+    Markings are not kept, if C{map_file} is given each new marking is
+    written to it with its id when discovered. As with
+    C{state_space_hash_compaction} some states may be missed.
+
+    @return: reachability graph and number of visited states.
+    """
+    cdef ctypes_ext.TFingerprintTable* ids = new ctypes_ext.TFingerprintTable()
+    cdef NecoCtx ctx = NecoCtx()
+    cdef list visit
+    cdef list succ_list
+    cdef dict graph = {}
+    cdef Py_ssize_t count = 0
+    cdef Py_ssize_t next = 1
+    cdef Py_ssize_t node_id
+    cdef Py_ssize_t current_node_id
+    cdef Marking m
+    cdef Marking s_mrk
+    # successor ids seen for the marking being expanded
+    cdef ctypes_ext.IdStamps seen = ctypes_ext.IdStamps()
+    cdef ctypes_ext.MarkingVector succ = ctypes_ext.MarkingVector()
+    cdef Py_ssize_t i
+
+    try:
+        m = init()
+        ids.insert(m.fingerprint(), next)
+        if map_file:
+            map_file.write("{} : {}\n".format(next, m.__dump__()))
+        visit = [(next, m)]
+        next += 1
+
+        while visit:
+            count += 1
+            current_node_id, m = visit.pop()
+            succ_list = []
+            succ.clear()
+            neco_succs_into(m, succ, ctx)
+            for i in range(succ.count):
+                s_mrk = <Marking> succ.items[i]
+                node_id = ids.insert(s_mrk.fingerprint(), next)
+                if node_id < 0:
                     node_id = next
                     next += 1
+                    visit.append((node_id, s_mrk))
+                    if map_file:
+                        map_file.write("{} : {}\n".format(node_id, s_mrk.__dump__()))
+                if seen.stamp(node_id, count):
                     succ_list.append(node_id)
-                    mrk_id_map[s_mrk] = node_id
-
             graph[current_node_id] = succ_list
+        return graph, ids.size()
+    finally:
+        del ids
 
-            visit.update(succ.difference(visited))
-    except KeyError:
-        return graph, mrk_id_map
-    return graph, mrk_id_map
+def bitstate_statistics(states, bits_set, bits, hashes):
+    """ Statistics of a bitstate exploration.
+
+    @return: fill ratio of the bit array, hash factor (bits per state)
+    and probability that a new marking is wrongly seen as visited.
+    """
+    fill = float(bits_set) / bits
+    factor = float(bits) / states if states else float('inf')
+    return fill, factor, fill ** hashes
+
+cpdef state_space_bitstate(size_t size, int hashes = 3):
+    """ Bitstate (supertrace) state space exploration.
+
+    Visited markings are stored as C{hashes} bits in a C{size} bytes bit
+    array, some states may be missed.
+
+    @return: number of visited states, number of set bits and array size in bits.
+    """
+    cdef ctypes_ext.TBitstateTable* visited = new ctypes_ext.TBitstateTable(size, hashes)
+    cdef NecoCtx ctx = NecoCtx()
+    cdef list visit
+    cdef int count = 0
+    cdef Marking m
+    cdef Marking s_mrk
+    cdef ctypes_ext.MarkingVector succ = ctypes_ext.MarkingVector()
+    cdef Py_ssize_t i
+
+    try:
+        m = init()
+        visited.insert(m.fingerprint())
+        visit = [m]
+        while visit:
+            count += 1
+            m = visit.pop()
+            succ.clear()
+            neco_succs_into(m, succ, ctx)
+            for i in range(succ.count):
+                s_mrk = <Marking> succ.items[i]
+                if visited.insert(s_mrk.fingerprint()):
+                    visit.append(s_mrk)
+        return count, visited.bits_set(), visited.bits()
+    finally:
+        del visited
@@ -0,0 +1,214 @@
+""" Delta encoded state space exploration.
+
+A successor only differs from its parent in the places modified by the
+fired transition. Visited markings are thus stored as the fields that
+differ from their parent plus the id of the parent, and markings are
+rebuilt by applying differences along the chain of their ancestors.
+Every C{interval} levels a marking is stored in full, which bounds the
+length of the chains.
+
+Markings are seen as tuples of fields, the ones used to pickle them.
+The differences are built by the compiled net: its C{delta_succs}
+function pairs each successor with the fields of the places modified by
+its transition (see C{TransitionInfo.modified_places}), so successors
+are never compared to their parent field by field. Hashes of stored
+markings are kept, markings sharing a hash are rebuilt and compared
+field by field so the exploration is exact.
+"""
+
+from neco.parallel import check_picklable
+from array import array
+
+def marking_fields(net):
+    """ Functions converting markings of a compiled net to and from field tuples.
+
+    @param net: compiled net module.
+    @type net: C{module}
+    @return: functions building the fields of a marking and the marking
+             of fields.
+    @rtype: C{tuple}
+    """
+    cls = net.Marking
+    slots = getattr(cls, '__slots__', None)
+    if slots is None:
+        # cython markings are pickled as a tuple of fields
+        def fields(marking):
+            return marking.__reduce__()[2]
+
+        def build(state):
+            marking = cls()
+            marking.__setstate__(tuple(state))
+            return marking
+    else:
+        slots = tuple(slots)
+
+        def fields(marking):
+            return tuple( getattr(marking, name) for name in slots )
+
+        def build(state):
+            marking = cls.__new__(cls)
+            for name, value in zip(slots, state):
+                setattr(marking, name, value)
+            return marking
+    return fields, build
+
+def patch(state, diff):
+    """ Apply to a list of fields a difference built by the compiled net,
+    a flat tuple of field indices and values.
+
+    >>> state = [1, 'b', (2, 3)]
+    >>> patch(state, (1, 'a'))
+    >>> state
+    [1, 'a', (2, 3)]
+    """
+    for i in xrange(0, len(diff), 2):
+        state[diff[i]] = diff[i + 1]
+
+class DeltaStateTable(object):
+    """ States indexed by dense ids, stored as differences from their parent.
+
+    >>> table = DeltaStateTable(interval = 2)
+    >>> table.add((1, 'a'), hash((1, 'a')))
+    0
+    >>> table.add((1, 'b'), hash((1, 'b')), 0, (1, 'b'))
+    1
+    >>> table.add((2, 'b'), hash((2, 'b')), 1, (0, 2))
+    2
+    >>> table.add((1, 'b'), hash((1, 'b')), 2, (0, 1))
+    1
+    >>> table.state(2), len(table), table.full
+    ([2, 'b'], 3, 2)
+    """
+
+    def __init__(self, interval = 16):
+        """ Initialize the table.
+
+        @param interval: maximal length of a chain of differences.
+        @type interval: C{int}
+        """
+        assert(interval > 0)
+        self.interval = interval
+        self.parents = array('l')
+        self.depths = array('l')
+        self.records = []
+        self.index = {}
+        self.full = 0
+        self.fields = 0
+
+    def __len__(self):
+        return len(self.records)
+
+    def state(self, i):
+        """ Fields of the state of id C{i}.
+
+        @rtype: C{list}
+        """
+        diffs = []
+        parents = self.parents
+        records = self.records
+        while parents[i] >= 0:
+            diffs.append(records[i])
+            i = parents[i]
+        state = list(records[i])
+        for diff in reversed(diffs):
+            patch(state, diff)
+        return state
+
+    def lookup(self, state, h):
+        """ Id of a state, -1 if absent.
+
+        @param state: fields of a state.
+        @param h: hash of the state.
+        """
+        ids = self.index.get(h, ())
+        if isinstance(ids, int):
+            ids = (ids,)
+        if ids:
+            state = list(state)
+        for i in ids:
+            if self.state(i) == state:
+                return i
+        return -1
+
+    def add(self, state, h, parent = -1, record = None):
+        """ Id of a state, added with the next id if absent.
+
+        @param state: fields of the state.
+        @param h: hash of the state.
+        @param parent: id of the parent state, C{-1} to store the state in full.
+        @param record: fields of the state that may differ from the
+                       parent state, see L{patch}.
+        @return: id of the state.
+        @rtype: C{int}
+        """
+        i = self.lookup(state, h)
+        if i >= 0:
+            return i
+
+        i = len(self.records)
+        ids = self.index.get(h)
+        if ids is None:
+            self.index[h] = i
+        elif isinstance(ids, int):
+            self.index[h] = (ids, i)
+        else:
+            self.index[h] = ids + (i,)
+
+        if parent >= 0 and self.depths[parent] + 1 < self.interval:
+            self.parents.append(parent)
+            self.depths.append(self.depths[parent] + 1)
+            self.fields += len(record) // 2
+        else:
+            record = tuple(state)
+            self.parents.append(-1)
+            self.depths.append(0)
+            self.full += 1
+            self.fields += len(record)
+        self.records.append(record)
+        return i
+
+def state_space(net, interval = 16):
+    """ Explore the state space storing markings as differences.
+
+    @param net: compiled net module.
+    @type net: C{module}
+    @param interval: maximal length of a chain of differences.
+    @type interval: C{int}
+    @return: table of reachable states.
+    @rtype: C{DeltaStateTable}
+    """
+    check_picklable(net)
+    if not hasattr(net, 'delta_succs'):
+        raise TypeError("the net module does not record modified fields of successors")
+    fields, build = marking_fields(net)
+    table = DeltaStateTable(interval)
+
+    initial = net.init()
+    table.add(fields(initial), hash(initial))
+    ctx = net.NecoCtx()
+    count = 0
+    while count < len(table):
+        state = table.state(count)
+        for succ, record in net.delta_succs(build(state), ctx):
+            succ_state = list(state)
+            patch(succ_state, record)
+            table.add(succ_state, hash(succ), count, record)
+        count += 1
+    return table
+
+def state_space_size(net, interval = 16):
+    """ Explore the state space storing markings as differences.
+
+    @param net: compiled net module.
+    @type net: C{module}
+    @param interval: maximal length of a chain of differences.
+    @type interval: C{int}
+    @return: number of reachable states, number of states stored in full
+             and ratio of stored fields to the fields of all states.
+    @rtype: C{tuple}
+    """
+    table = state_space(net, interval)
+    width = len(table.state(0))
+    count = len(table)
+    ratio = float(table.fields) / (count * width) if width else 1.0
+    return count, table.full, ratio
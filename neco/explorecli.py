@@ -6,7 +6,8 @@ The loading of the module will raise a runtime error
 if loaded with wrong python version.
 """
 
-from neco import g_logo
+from neco import checkpoint, delta, external, g_logo, parallel
+from neco.graph import stream_state_space_graph, write_binary_state_space_graph
 from neco.utils import fatal_error
 from time import time
 import argparse
@@ -44,6 +45,28 @@ def try_open_file(file_name):
             exit(-1)
     return out_file
 
+def parse_size(string):
+    """ Helper function to read memory sizes with an optional unit (K, M, G).
+
+    >>> parse_size('512')
+    512
+    >>> parse_size('64K')
+    65536
+    >>> parse_size('1g')
+    1073741824
+
+    @raise argparse.ArgumentTypeError: if the size is invalid.
+    """
+    units = { 'K' : 1 << 10, 'M' : 1 << 20, 'G' : 1 << 30 }
+    factor = units.get(string[-1:].upper(), 1)
+    digits = string[:-1] if factor > 1 else string
+    try:
+        size = int(digits) * factor
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid size: {}".format(string))
+    if size <= 0:
+        raise argparse.ArgumentTypeError("size must be positive: {}".format(string))
+    return size
 
 
 class Main(object):
@@ -67,9 +90,64 @@ class Main(object):
                                                                                           'GRAPHFILE'),
                             help='produce reachability graph (supports bz2 and gz compression)')
 
+        parser.add_argument('--stream', '-s', default=False, dest='stream', action='store_true',
+                            help='write the reachability graph while exploring instead of building it in memory')
+
+        parser.add_argument('--binary-graph', '-G', default=None, dest='binary_graph', metavar='FILE', type=str,
+                            help='write the reachability graph to FILE in binary format, see neco.graph')
+
+        parser.add_argument('--no-predecessors', default=False, dest='no_predecessors', action='store_true',
+                            help='do not store predecessors in binary graph files')
+
+        parser.add_argument('--no-markings', default=False, dest='no_markings', action='store_true',
+                            help='do not store markings in binary graph files')
+
         parser.add_argument('--profile', '-p', default=False, dest='profile', action='store_true',
                             help='enable profiling support')
 
+        parser.add_argument('--workers', '-w', default=1, dest='workers', metavar='N', type=int,
+                            help='explore the state space using N processes')
+
+        parser.add_argument('--hash-compaction', '-c', default=False, dest='hash_compaction', action='store_true',
+                            help='store only fingerprints of visited markings, some states may be missed, '
+                            'the omission probability is reported (cython backend)')
+
+        parser.add_argument('--bitstate', '-b', default=None, dest='bitstate', metavar='SIZE', type=parse_size,
+                            help='bitstate exploration using a SIZE bytes bit array, accepts K, M and G units (cython backend)')
+
+        parser.add_argument('--hashes', default=None, dest='hashes', metavar='K', type=int,
+                            help='number of bits per marking in bitstate exploration (default 3)')
+
+        parser.add_argument('--collapse', default=False, dest='collapse', action='store_true',
+                            help='share equal place values between stored markings and report the compression ratio (cython backend)')
+
+        parser.add_argument('--delta', default=False, dest='delta', action='store_true',
+                            help='store visited markings as differences from their parent marking')
+
+        parser.add_argument('--delta-interval', default=16, dest='delta_interval', metavar='N', type=int,
+                            help='store a marking in full every N levels in delta exploration')
+
+        parser.add_argument('--external', '-e', default=None, dest='external', metavar='DIR', type=str,
+                            help='external memory exploration storing BFS layers in DIR')
+
+        parser.add_argument('--memory', '-m', default=256 << 20, dest='memory', metavar='SIZE', type=parse_size,
+                            help='memory used to buffer successors in external memory exploration, accepts K, M and G units')
+
+        parser.add_argument('--checkpoint', default=None, dest='checkpoint', metavar='FILE', type=str,
+                            help='periodically save exploration state to FILE, a checkpoint is also written on SIGUSR1')
+
+        parser.add_argument('--checkpoint-interval', default=600, dest='checkpoint_interval', metavar='SECONDS', type=float,
+                            help='time between two checkpoints')
+
+        parser.add_argument('--resume', default=None, dest='resume', metavar='FILE', type=str,
+                            help='resume exploration from checkpoint FILE')
+
+        parser.add_argument('--allocator-stats', default=False, dest='allocator_stats', action='store_true',
+                            help='print place allocator and marking free list counters after exploration. [cython only]')
+
+        parser.add_argument('--no-slab', default=False, dest='no_slab', action='store_true',
+                            help='allocate places with malloc instead of size class slabs. [cython only]')
+
         parser.add_argument('--print-mcc', default=False, dest='print_mcc', action='store_true',
                             help='prints only states count as output (ignored if any other option is given).')
 
@@ -82,6 +160,23 @@ class Main(object):
         # setup config
         self.print_mcc = args.print_mcc
         self.profile=profile,
+        self.workers = args.workers
+        self.stream = args.stream
+        self.binary_graph = args.binary_graph
+        self.no_predecessors = args.no_predecessors
+        self.no_markings = args.no_markings
+        self.hash_compaction = args.hash_compaction
+        self.bitstate = args.bitstate
+        self.hashes = args.hashes
+        self.collapse = args.collapse
+        self.delta = args.delta
+        self.delta_interval = args.delta_interval
+        self.external = args.external
+        self.memory = args.memory
+        self.resume = args.resume
+        self.checkpoint_file = args.checkpoint or args.resume
+        self.checkpoint_interval = args.checkpoint_interval
+        self.allocator_stats = args.allocator_stats
 
         if not args.print_mcc:
             print "{} uses python {}".format(progname, sys.version)
@@ -99,6 +194,76 @@ class Main(object):
             if graph:
                 fatal_error("dump markings option cannot be used with graph option.")
 
+        if self.stream and not graph:
+            fatal_error("stream option requires graph option.")
+
+        if self.workers < 1:
+            fatal_error("number of workers must be positive.")
+        elif self.workers > 1 and (dump_markings or graph):
+            fatal_error("workers option cannot be used with dump or graph options.")
+
+        if self.hash_compaction:
+            if dump_markings:
+                fatal_error("hash compaction option cannot be used with dump option.")
+            if self.workers > 1:
+                fatal_error("hash compaction option cannot be used with workers option.")
+            if self.stream:
+                fatal_error("hash compaction option cannot be used with stream option.")
+
+        if self.hashes is not None and not self.bitstate:
+            fatal_error("hashes option requires bitstate option.")
+        elif self.hashes is None:
+            self.hashes = 3
+
+        if self.bitstate:
+            if dump_markings or graph:
+                fatal_error("bitstate option cannot be used with dump or graph options.")
+            if self.workers > 1 or self.hash_compaction:
+                fatal_error("bitstate option cannot be used with workers or hash compaction options.")
+            if self.hashes < 1:
+                fatal_error("number of hashes must be positive.")
+
+        if self.collapse:
+            if dump_markings or graph:
+                fatal_error("collapse option cannot be used with dump or graph options.")
+            if self.workers > 1 or self.hash_compaction or self.bitstate:
+                fatal_error("collapse option cannot be used with workers, hash compaction or bitstate options.")
+
+        if self.delta:
+            if dump_markings or graph:
+                fatal_error("delta option cannot be used with dump or graph options.")
+            if self.workers > 1 or self.hash_compaction or self.bitstate or self.collapse:
+                fatal_error("delta option cannot be used with workers, hash compaction, bitstate or collapse options.")
+            if self.delta_interval < 1:
+                fatal_error("delta interval must be positive.")
+
+        if self.external:
+            if dump_markings or graph:
+                fatal_error("external option cannot be used with dump or graph options.")
+            if self.workers > 1 or self.hash_compaction or self.bitstate or self.collapse or self.delta:
+                fatal_error("external option cannot be used with workers, hash compaction, bitstate, collapse "
+                            "or delta options.")
+
+        if self.checkpoint_file:
+            if dump_markings or graph:
+                fatal_error("checkpoint and resume options cannot be used with dump or graph options.")
+            if (self.workers > 1 or self.hash_compaction or self.bitstate or self.external
+                or self.collapse or self.delta):
+                fatal_error("checkpoint and resume options cannot be used with workers, hash compaction, "
+                            "bitstate, external, collapse or delta options.")
+            if self.checkpoint_interval <= 0:
+                fatal_error("checkpoint interval must be positive.")
+            if self.resume and not os.path.isfile(self.resume):
+                fatal_error("no checkpoint file {}".format(self.resume))
+
+        if self.binary_graph:
+            if dump_markings or graph:
+                fatal_error("binary graph option cannot be used with dump or graph options.")
+            if (self.workers > 1 or self.hash_compaction or self.bitstate or self.collapse
+                or self.delta or self.external or self.checkpoint_file):
+                fatal_error("binary graph option cannot be used with workers, hash compaction, bitstate, "
+                            "collapse, delta, external or checkpoint options.")
+
         # load module
         try:
             fp, pathname, description = imp.find_module("net")
@@ -106,6 +271,19 @@ class Main(object):
         except ImportError:
             fatal_error("No net module in PYTHONPATH", -1)
 
+        if self.hash_compaction and not hasattr(self.compiled_net, 'state_space_hash_compaction'):
+            fatal_error("hash compaction is not supported by the net module backend.")
+        if self.bitstate and not hasattr(self.compiled_net, 'state_space_bitstate'):
+            fatal_error("bitstate exploration is not supported by the net module backend.")
+        if self.collapse and not hasattr(self.compiled_net, 'state_space_collapse'):
+            fatal_error("collapse compression is not supported by the net module backend.")
+        if self.delta and not hasattr(self.compiled_net, 'delta_succs'):
+            fatal_error("delta exploration is not supported by the net module, it is compiled with pid normalization.")
+        if (self.allocator_stats or args.no_slab) and not hasattr(self.compiled_net, 'allocator_stats'):
+            fatal_error("allocator options are not supported by the net module backend.")
+        if args.no_slab:
+            self.compiled_net.configure_allocator(enabled=False)
+
         # explore
         if profile:
             # produce exploration trace
@@ -131,18 +309,168 @@ class Main(object):
             elif graph:
                 self.explore_graph()
 
+            if self.allocator_stats:
+                self.print_allocator_stats()
+
+    def print_allocator_stats(self):
+        """ Print allocator counters of the net module. """
+        stats = self.compiled_net.allocator_stats()
+        for kind in ['places', 'markings']:
+            counters = stats[kind]
+            print "{} allocations: {} (reuse rate {:.1%})".format(kind, counters['allocations'], counters['reuse_rate'])
+            print "{} live: {}".format(kind, counters['live'])
+        print "places live bytes: {}".format(stats['places']['live_bytes'])
+        print "places slab bytes: {}".format(stats['places']['slab_bytes'])
+
     def explore(self):
         """ Explore state space. """
 
+        if self.workers > 1:
+            return self.explore_parallel()
+        elif self.hash_compaction:
+            return self.explore_hash_compaction()
+        elif self.bitstate:
+            return self.explore_bitstate()
+        elif self.collapse:
+            return self.explore_collapse()
+        elif self.delta:
+            return self.explore_delta()
+        elif self.external:
+            return self.explore_external()
+        elif self.checkpoint_file:
+            return self.explore_checkpoint()
+        elif self.binary_graph:
+            return self.explore_binary_graph()
+
+        net = self.compiled_net
+        start = time()
+        ss = net.state_space_table()
+        end = time()
+        if self.print_mcc:
+            print len(ss)
+        else:
+            print "exploration time: ", end - start
+            print "len visited = %d" % (len(ss))
+
+    def explore_parallel(self):
+        """ Explore state space using several processes. """
+
+        net = self.compiled_net
+        start = time()
+        try:
+            count, sizes = parallel.state_space_size(net, self.workers)
+        except TypeError as e:
+            fatal_error(str(e))
+        end = time()
+        if self.print_mcc:
+            print count
+        else:
+            print "exploration time: ", end - start
+            print "states per worker: ", sizes
+            print "len visited = %d" % (count)
+
+    def explore_hash_compaction(self):
+        """ Explore state space storing only marking fingerprints. """
+
+        net = self.compiled_net
+        start = time()
+        count = net.state_space_hash_compaction()
+        end = time()
+        if self.print_mcc:
+            print count
+        else:
+            print "exploration time: ", end - start
+            print "len visited = %d" % (count)
+            print "omission probability: %g (%d bits fingerprints)" % (net.hash_compaction_omission(count),
+                                                                       net.neco_fingerprint_bits())
+
+    def explore_bitstate(self):
+        """ Explore state space using bitstate hashing. """
+
+        net = self.compiled_net
+        start = time()
+        count, bits_set, bits = net.state_space_bitstate(self.bitstate, self.hashes)
+        end = time()
+        if self.print_mcc:
+            print count
+        else:
+            fill, factor, collision = net.bitstate_statistics(count, bits_set, bits, self.hashes)
+            print "exploration time: ", end - start
+            print "len visited = %d" % (count)
+            print "fill ratio: {:.3%}, hash factor: {:.1f}, collision probability: {:.2e}".format(fill,
+                                                                                                   factor,
+                                                                                                   collision)
+
+    def explore_collapse(self):
+        """ Explore state space sharing place values between markings. """
+
         net = self.compiled_net
         start = time()
-        ss = net.state_space()
+        ss, values = net.state_space_collapse()
         end = time()
         if self.print_mcc:
             print len(ss)
         else:
             print "exploration time: ", end - start
             print "len visited = %d" % (len(ss))
+            print "place values: {}, distinct: {}, compression ratio: {:.2f}".format(values.references,
+                                                                                     len(values),
+                                                                                     values.compression_ratio())
+
+    def explore_delta(self):
+        """ Explore state space storing markings as differences. """
+
+        net = self.compiled_net
+        start = time()
+        try:
+            count, full, ratio = delta.state_space_size(net, self.delta_interval)
+        except TypeError as e:
+            fatal_error(str(e))
+        end = time()
+        if self.print_mcc:
+            print count
+        else:
+            print "exploration time: ", end - start
+            print "len visited = %d" % (count)
+            print "markings stored in full: {}, stored fields: {:.1%}".format(full, ratio)
+
+    def explore_external(self):
+        """ Explore state space using external memory. """
+
+        net = self.compiled_net
+        start = time()
+        try:
+            count, layers = external.state_space_size(net, self.external, self.memory)
+        except TypeError as e:
+            fatal_error(str(e))
+        end = time()
+        if self.print_mcc:
+            print count
+        else:
+            print "exploration time: ", end - start
+            print "BFS layers: %d" % (layers)
+            print "len visited = %d" % (count)
+
+    def explore_checkpoint(self):
+        """ Explore state space with periodic checkpoints. """
+
+        net = self.compiled_net
+        start = time()
+        try:
+            count, counters = checkpoint.state_space_size(net,
+                                                          self.checkpoint_file,
+                                                          self.checkpoint_interval,
+                                                          self.resume)
+        except (TypeError, ValueError) as e:
+            fatal_error(str(e))
+        end = time()
+        if self.print_mcc:
+            print count
+        else:
+            print "exploration time: ", end - start
+            print "total exploration time: ", counters['elapsed']
+            print "checkpoints: %d" % (counters['checkpoints'])
+            print "len visited = %d" % (count)
 
     def explore_dump(self):
         """ Explore state space. """
@@ -151,7 +479,7 @@ class Main(object):
 
         net = self.compiled_net
         start = time()
-        ss = net.state_space()
+        ss = net.state_space_table()
         end = time()
         print "exploration time: ", end - start
         print "len visited = %d" % (len(ss))
@@ -171,21 +499,77 @@ class Main(object):
 
         net = self.compiled_net
 
+        if self.hash_compaction:
+            return self.explore_graph_hash_compaction(map_file, graph_file)
+        elif self.stream:
+            return self.explore_graph_stream(map_file, graph_file)
+
         start = time()
-        graph, map = net.state_space_graph()
+        graph, states = net.state_space_graph_table()
         end = time()
         print "exploration time: ", end - start
-        print "len visited = %d" % (len(map.keys()))
+        print "len visited = %d" % (len(states))
+
+        # table ids start from 0, graph files number markings from 1
+        for node_id, marking in enumerate(states):
+            map_file.write("{} : {}\n".format(node_id + 1, marking.__dump__()))
+
+        for node_id, succ_list in enumerate(graph):
+            graph_file.write("{} : {}\n".format(node_id + 1, repr([ succ_id + 1 for succ_id in succ_list ])))
+
+        return (end - start, range(1, len(graph) + 1))
 
-        #map_file.write('{\n')
-        for key, value in map.iteritems():
-            map_file.write("{} : {}\n".format(repr(value), key.__dump__()))
-        #map_file.write('}\n')
+    def explore_graph_stream(self, map_file, graph_file):
+        """ Build reachability graph writing it while exploring. """
+
+        net = self.compiled_net
+
+        start = time()
+        count = stream_state_space_graph(net, map_file, graph_file)
+        end = time()
+        print "exploration time: ", end - start
+        print "len visited = %d" % (count)
+
+        for out_file in (map_file, graph_file):
+            if out_file not in (sys.stdout, sys.stderr):
+                out_file.close()
+
+        return (end - start, count)
+
+    def explore_binary_graph(self):
+        """ Build reachability graph writing it in binary format. """
+
+        net = self.compiled_net
+
+        start = time()
+        count = write_binary_state_space_graph(net,
+                                               self.binary_graph,
+                                               predecessors = not self.no_predecessors,
+                                               markings = not self.no_markings)
+        end = time()
+        if self.print_mcc:
+            print count
+        else:
+            print "exploration time: ", end - start
+            print "len visited = %d" % (count)
+
+        return (end - start, count)
+
+    def explore_graph_hash_compaction(self, map_file, graph_file):
+        """ Build reachability graph storing only marking fingerprints. """
+
+        net = self.compiled_net
+
+        start = time()
+        graph, count = net.state_space_graph_hash_compaction(map_file)
+        end = time()
+        print "exploration time: ", end - start
+        print "len visited = %d" % (count)
+        print "omission probability: %g (%d bits fingerprints)" % (net.hash_compaction_omission(count),
+                                                                   net.neco_fingerprint_bits())
 
-        #graph_file.write('{\n')
         for key, value in graph.iteritems():
             graph_file.write("{} : {}\n".format(repr(key), repr(value)))
-        #graph_file.write('}\n')
 
         return (end - start, graph.keys())
 
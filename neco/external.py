@@ -0,0 +1,217 @@
+""" External memory state space exploration.
+
+Breadth first exploration with delayed duplicate detection: BFS layers
+are stored on disk as runs of serialized markings sorted by hash.
+
+The successors of a layer are buffered in memory up to a given size,
+then sorted and written as candidate runs. Once a layer is expanded,
+candidate runs are merged and the markings already stored in visited
+runs are removed by a merge against them. What remains is the next
+layer, which becomes a visited run.
+
+Markings are compared by hash first, markings sharing a hash are
+decoded and compared for equality so hash collisions are harmless.
+"""
+
+from neco.parallel import check_picklable
+import cPickle
+import heapq
+import os
+import struct
+
+_RECORD = struct.Struct('<qI')
+
+def encode(marking):
+    """ Serialize a marking. """
+    return cPickle.dumps(marking, cPickle.HIGHEST_PROTOCOL)
+
+def decode(payload):
+    """ Rebuild a marking serialized with L{encode}. """
+    return cPickle.loads(payload)
+
+def write_run(path, records):
+    """ Write records to a run file.
+
+    @param path: run file path.
+    @type path: C{str}
+    @param records: iterable of C{(hash, payload)} pairs.
+    @return: number of written records.
+    @rtype: C{int}
+    """
+    count = 0
+    with open(path, 'wb', 1 << 16) as run:
+        for h, payload in records:
+            run.write(_RECORD.pack(h, len(payload)))
+            run.write(payload)
+            count += 1
+    return count
+
+def read_run(path):
+    """ Iterate over the C{(hash, payload)} records of a run file. """
+    with open(path, 'rb', 1 << 16) as run:
+        while True:
+            header = run.read(_RECORD.size)
+            if not header:
+                break
+            h, size = _RECORD.unpack(header)
+            yield h, run.read(size)
+
+def unique(records):
+    """ Remove duplicates from hash sorted records.
+
+    >>> records = [ (1, encode('a')), (1, encode('a')), (1, encode('b')), (2, encode('a')) ]
+    >>> [ (h, decode(p)) for h, p in unique(records) ]
+    [(1, 'a'), (1, 'b'), (2, 'a')]
+    """
+    current = None
+    payloads, markings = set(), []
+    for h, payload in records:
+        if h != current:
+            current = h
+            payloads, markings = set(), []
+        if payload in payloads:
+            continue
+        marking = decode(payload)
+        if marking in markings:
+            continue
+        payloads.add(payload)
+        markings.append(marking)
+        yield h, payload
+
+def subtract(records, visited):
+    """ Remove from hash sorted records the ones present in hash sorted visited.
+
+    >>> records = [ (1, encode('a')), (1, encode('b')), (3, encode('c')) ]
+    >>> visited = [ (1, encode('b')), (2, encode('c')) ]
+    >>> [ (h, decode(p)) for h, p in subtract(records, visited) ]
+    [(1, 'a'), (3, 'c')]
+    """
+    # visited records come first within a hash group
+    stream = heapq.merge(( (h, 0, payload) for h, payload in visited ),
+                         ( (h, 1, payload) for h, payload in records ))
+    current = None
+    payloads, markings = set(), []
+    for h, tag, payload in stream:
+        if h != current:
+            current = h
+            payloads, markings = set(), []
+        if tag == 0:
+            payloads.add(payload)
+            markings.append(decode(payload))
+        elif payload not in payloads and decode(payload) not in markings:
+            yield h, payload
+
+class ExternalExplorer(object):
+    """ External memory BFS engine. """
+
+    def __init__(self, net, directory, memory = 256 << 20, max_visited_runs = 16):
+        """ Initialize the explorer.
+
+        @param net: compiled net module.
+        @type net: C{module}
+        @param directory: directory used to store runs.
+        @type directory: C{str}
+        @param memory: size in bytes of the in memory successor buffer.
+        @type memory: C{int}
+        @param max_visited_runs: visited runs are merged beyond this count.
+        @type max_visited_runs: C{int}
+        """
+        check_picklable(net)
+        self.net = net
+        self.directory = directory
+        self.memory = memory
+        self.max_visited_runs = max_visited_runs
+        self._files = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def new_path(self, kind):
+        self._files += 1
+        return os.path.join(self.directory, '{}-{}.run'.format(kind, self._files))
+
+    def sorted_run(self, buffer):
+        """ Write buffered successors as a sorted candidate run. """
+        buffer.sort()
+        path = self.new_path('candidates')
+        write_run(path, unique(buffer))
+        return path
+
+    def expand(self, layer):
+        """ Compute the successors of a layer as candidate runs. """
+        net = self.net
+        ctx = net.NecoCtx()
+        runs = []
+        buffer = []
+        size = 0
+        for _, payload in read_run(layer):
+            for succ in net.succs(decode(payload), ctx):
+                data = encode(succ)
+                buffer.append((hash(succ), data))
+                size += len(data) + _RECORD.size
+                if size >= self.memory:
+                    runs.append(self.sorted_run(buffer))
+                    buffer = []
+                    size = 0
+        if buffer:
+            runs.append(self.sorted_run(buffer))
+        return runs
+
+    def merge_visited(self, runs):
+        """ Merge visited runs into a single one, runs are disjoint. """
+        path = self.new_path('visited')
+        write_run(path, heapq.merge(*[ read_run(run) for run in runs ]))
+        for run in runs:
+            os.remove(run)
+        return [ path ]
+
+    def explore(self):
+        """ Explore the state space.
+
+        @return: number of states and number of BFS layers.
+        @rtype: C{tuple}
+        """
+        initial = self.net.init()
+        layer = self.new_path('layer')
+        write_run(layer, [ (hash(initial), encode(initial)) ])
+
+        visited_runs = []
+        count, layers, size = 1, 0, 1
+        try:
+            while size > 0:
+                layers += 1
+                candidates = self.expand(layer)
+                visited_runs.append(layer)
+
+                layer = self.new_path('layer')
+                merged = unique(heapq.merge(*[ read_run(run) for run in candidates ]))
+                visited = heapq.merge(*[ read_run(run) for run in visited_runs ])
+                size = write_run(layer, subtract(merged, visited))
+                count += size
+
+                for run in candidates:
+                    os.remove(run)
+                if len(visited_runs) > self.max_visited_runs:
+                    visited_runs = self.merge_visited(visited_runs)
+        finally:
+            for run in visited_runs + [ layer ]:
+                if os.path.exists(run):
+                    os.remove(run)
+        return count, layers
+
+def state_space_size(net, directory, memory = 256 << 20):
+    """ Explore the state space using external memory.
+
+    @param net: compiled net module.
+    @type net: C{module}
+    @param directory: directory used to store temporary files.
+    @type directory: C{str}
+    @param memory: size in bytes of the in memory successor buffer.
+    @type memory: C{int}
+    @return: number of reachable states and number of BFS layers.
+    @rtype: C{tuple}
+    """
+    return ExternalExplorer(net, directory, memory).explore()
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,509 @@
+""" Reachability graph output and loading.
+
+Reachability graphs are streamed to their output files as states are
+expanded: each new marking is written to the map file with its id when
+discovered, and the successor ids of a marking are written to the graph
+file once it is expanded. Only markings and their ids are kept in
+memory.
+
+Writes go through a L{BackgroundWriter} so that formatting is the only
+output cost left on the exploration thread, compression and system calls
+are done by a writer thread.
+
+Graphs can also be written in a binary compressed sparse row format,
+little endian, made of:
+
+  - a header (L{HEADER}) holding counts and section positions,
+  - the successor ids (C{uint32}) of all states, state after state,
+  - the offsets (C{uint64}) of the successors of each state, plus the
+    total number of edges,
+  - optionally the predecessors stored the same way (offsets, ids),
+  - optionally the marking dumps, offsets (C{uint64}) then text.
+
+States are numbered from 0, the initial marking, in discovery order.
+Such files are read without parsing through L{Graph}, which maps them in
+memory.
+"""
+
+from Queue import Queue
+from array import array
+from collections import deque
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import threading
+
+class BackgroundWriter(object):
+    """ Write to a file from a background thread.
+
+    Data is accumulated in batches which are handed to the writer thread
+    through a bounded queue, so exploration blocks only if the writer
+    falls C{max_batches} batches behind.
+
+    >>> from StringIO import StringIO
+    >>> out = StringIO()
+    >>> writer = BackgroundWriter(out, batch_size = 2)
+    >>> for i in range(5):
+    ...     writer.write(str(i))
+    >>> writer.close()
+    >>> out.getvalue()
+    '01234'
+    """
+
+    def __init__(self, out_file, batch_size = 4096, max_batches = 64):
+        """ Initialize the writer and start its thread.
+
+        @param out_file: file like object to write to.
+        @param batch_size: number of writes grouped in a batch.
+        @type batch_size: C{int}
+        @param max_batches: number of batches waiting to be written.
+        @type max_batches: C{int}
+        """
+        self.out_file = out_file
+        self.batch_size = batch_size
+        self._batch = []
+        self._queue = Queue(max_batches)
+        self._error = None
+        self._thread = threading.Thread(target = self._run, name = 'neco-writer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                break
+            if self._error is None:
+                try:
+                    self.out_file.write(''.join(batch))
+                except Exception as e:
+                    # keep consuming batches so that producers never block
+                    self._error = e
+
+    def write(self, data):
+        """ Queue data to be written. """
+        batch = self._batch
+        batch.append(data)
+        if len(batch) >= self.batch_size:
+            self._queue.put(batch)
+            self._batch = []
+
+    def close(self):
+        """ Write pending data and stop the writer thread.
+
+        The underlying file is left open.
+
+        @raise IOError: if a write failed in the writer thread.
+        """
+        if self._batch:
+            self._queue.put(self._batch)
+            self._batch = []
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+def stream_state_space_graph(net, map_file, graph_file):
+    """ Build a reachability graph writing it while exploring.
+
+    Lines have the same format as the ones written from
+    C{state_space_graph} results, C{id : dump} in the map file and
+    C{id : [succ_ids]} in the graph file. Markings are numbered and
+    expanded in discovery order, breadth first.
+
+    @param net: compiled net module.
+    @type net: C{module}
+    @param map_file: file receiving the markings.
+    @param graph_file: file receiving the successor lists.
+    @return: number of reachable states.
+    @rtype: C{int}
+    """
+    map_writer = BackgroundWriter(map_file)
+    graph_writer = BackgroundWriter(graph_file)
+
+    ctx = net.NecoCtx()
+    m = net.init()
+    # markings in discovery order, the ones from count on are not
+    # expanded yet, ids start from 1
+    markings = [ m ]
+    mrk_id_map = { m : 1 }
+    count = 0
+    map_writer.write("1 : {}\n".format(m.__dump__()))
+
+    # pid normalization of the python backend looks successors up in
+    # the context, every marking of the map is expanded or pending
+    ctx.state_space = mrk_id_map
+    ctx.remaining = set()
+    ctx.pid_free_hash = set()
+
+    try:
+        while count < len(markings):
+            m = markings[count]
+            succ_list = []
+            for s_mrk in net.succs(m, ctx):
+                node_id = mrk_id_map.get(s_mrk)
+                if node_id is None:
+                    markings.append(s_mrk)
+                    node_id = len(markings)
+                    mrk_id_map[s_mrk] = node_id
+                    map_writer.write("{} : {}\n".format(node_id, s_mrk.__dump__()))
+                succ_list.append(node_id)
+
+            count += 1
+            graph_writer.write("{} : {}\n".format(count, repr(succ_list)))
+    finally:
+        map_writer.close()
+        graph_writer.close()
+
+    return len(markings)
+
+MAGIC = 'NECOGRPH'
+VERSION = 1
+
+#: magic, version, flags, states, edges, then positions of successor
+#: ids, successor offsets, predecessor ids, predecessor offsets, marking
+#: offsets and marking dumps (0 if absent).
+HEADER = struct.Struct('<8sIIQQQQQQQQ')
+
+FLAG_PREDECESSORS = 1
+FLAG_MARKINGS = 2
+
+_ID = struct.Struct('<I')
+_OFFSET = struct.Struct('<Q')
+
+def _counters(size):
+    """ Array of C{size} unsigned 64 bits counters. """
+    if array('L').itemsize >= 8:
+        return array('L', [0]) * size
+    # C long is 32 bits wide on this platform
+    return [0] * size
+
+def _align(out_file):
+    out_file.write('\0' * (-out_file.tell() % 8))
+    return out_file.tell()
+
+def _write_offsets(out_file, counts):
+    """ Write the offsets of consecutive blocks of given sizes. """
+    chunk = [0]
+    total = 0
+    for count in counts:
+        total += count
+        chunk.append(total)
+        if len(chunk) == 4096:
+            out_file.write(struct.pack('<{}Q'.format(len(chunk)), *chunk))
+            chunk = []
+    out_file.write(struct.pack('<{}Q'.format(len(chunk)), *chunk))
+
+class BinaryGraphWriter(object):
+    """ Write a reachability graph in binary format.
+
+    States must be added in id order, successors can refer to states
+    which are not added yet. Offsets and dumps are kept in temporary
+    files until the graph is complete.
+
+    >>> import tempfile, os
+    >>> path = tempfile.mktemp()
+    >>> writer = BinaryGraphWriter(path)
+    >>> writer.add_state([1, 2], 'a')
+    >>> writer.add_state([2], 'b')
+    >>> writer.add_state([0, 2], 'c')
+    >>> writer.close()
+    3
+    >>> graph = Graph(path)
+    >>> len(graph), graph.edges
+    (3, 5)
+    >>> graph.successors(0), graph.predecessors(2), graph.degree(1), graph.in_degree(0)
+    ([1, 2], [0, 1, 2], 1, 1)
+    >>> graph.state(2)
+    'c'
+    >>> list(graph.deadlocks())
+    []
+    >>> graph.close()
+    >>> os.remove(path)
+    """
+
+    def __init__(self, path, predecessors = True, markings = True):
+        """ Open the output file.
+
+        @param path: output file path.
+        @type path: C{str}
+        @param predecessors: store predecessor lists.
+        @type predecessors: C{bool}
+        @param markings: store marking dumps.
+        @type markings: C{bool}
+        """
+        self.path = path
+        self.predecessors = predecessors
+        self.markings = markings
+        self._directory = os.path.dirname(os.path.abspath(path))
+
+        self._file = open(path, 'w+b')
+        self._file.write('\0' * HEADER.size)
+        self._targets = BackgroundWriter(self._file)
+        self._offsets_file = tempfile.TemporaryFile(dir = self._directory)
+        self._offsets = BackgroundWriter(self._offsets_file)
+        self._offsets.write(_OFFSET.pack(0))
+        self._in_degrees = array('I')
+        self._states = 0
+        self._edges = 0
+        self._max_id = -1
+
+        if markings:
+            self._dumps_file = tempfile.TemporaryFile(dir = self._directory)
+            self._dumps = BackgroundWriter(self._dumps_file)
+            self._dump_offsets_file = tempfile.TemporaryFile(dir = self._directory)
+            self._dump_offsets = BackgroundWriter(self._dump_offsets_file)
+            self._dump_offsets.write(_OFFSET.pack(0))
+            self._dumps_size = 0
+
+    def add_state(self, successors, dump = None):
+        """ Add the next state.
+
+        @param successors: successor ids.
+        @type successors: C{list}
+        @param dump: marking dump, required if markings are stored.
+        @type dump: C{str}
+        """
+        count = len(successors)
+        if count:
+            self._targets.write(struct.pack('<{}I'.format(count), *successors))
+            self._edges += count
+            in_degrees = self._in_degrees
+            top = max(successors)
+            if top >= len(in_degrees):
+                in_degrees.extend([0] * (top + 1 - len(in_degrees)))
+                self._max_id = top
+            for target in successors:
+                in_degrees[target] += 1
+        self._offsets.write(_OFFSET.pack(self._edges))
+        self._states += 1
+
+        if self.markings:
+            self._dumps.write(dump)
+            self._dumps_size += len(dump)
+            self._dump_offsets.write(_OFFSET.pack(self._dumps_size))
+
+    def _append(self, writer, temporary):
+        """ Copy a temporary file at the end of the output file. """
+        writer.close()
+        temporary.seek(0)
+        shutil.copyfileobj(temporary, self._file)
+        temporary.close()
+
+    def _write_predecessors(self, targets_pos, offsets_pos, preds_pos):
+        """ Fill predecessor ids by a counting sort over successor ids. """
+        cursor = _counters(self._states)
+        total = 0
+        for state, degree in enumerate(self._in_degrees):
+            cursor[state] = total
+            total += degree
+
+        self._file.flush()
+        data = mmap.mmap(self._file.fileno(), 0)
+        try:
+            for source in xrange(self._states):
+                first, last = struct.unpack_from('<QQ', data, offsets_pos + 8 * source)
+                for target in struct.unpack_from('<{}I'.format(last - first), data, targets_pos + 4 * first):
+                    _ID.pack_into(data, preds_pos + 4 * cursor[target], source)
+                    cursor[target] += 1
+            data.flush()
+        finally:
+            data.close()
+
+    def close(self):
+        """ Complete the file.
+
+        @return: number of states.
+        @rtype: C{int}
+        @raise ValueError: if a successor is not a state of the graph.
+        """
+        out = self._file
+        states = self._states
+        self._targets.close()
+        if self._max_id >= states:
+            out.close()
+            raise ValueError("state {} has no successor list".format(self._max_id))
+
+        flags = 0
+        targets_pos = HEADER.size
+        offsets_pos = _align(out)
+        self._append(self._offsets, self._offsets_file)
+
+        preds_pos = preds_offsets_pos = 0
+        if self.predecessors:
+            flags |= FLAG_PREDECESSORS
+            self._in_degrees.extend([0] * (states - len(self._in_degrees)))
+            preds_offsets_pos = out.tell()
+            _write_offsets(out, self._in_degrees)
+            preds_pos = out.tell()
+            out.truncate(preds_pos + 4 * self._edges)
+            out.seek(0, os.SEEK_END)
+            if self._edges:
+                self._write_predecessors(targets_pos, offsets_pos, preds_pos)
+
+        dumps_offsets_pos = dumps_pos = 0
+        if self.markings:
+            flags |= FLAG_MARKINGS
+            dumps_offsets_pos = _align(out)
+            self._append(self._dump_offsets, self._dump_offsets_file)
+            dumps_pos = out.tell()
+            self._append(self._dumps, self._dumps_file)
+
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, VERSION, flags, states, self._edges,
+                              targets_pos, offsets_pos, preds_pos, preds_offsets_pos,
+                              dumps_offsets_pos, dumps_pos))
+        out.close()
+        return states
+
+def write_binary_state_space_graph(net, path, predecessors = True, markings = True):
+    """ Build a reachability graph writing it in binary format.
+
+    Markings are expanded in discovery order so that successor lists
+    are produced in id order.
+
+    @param net: compiled net module.
+    @type net: C{module}
+    @param path: output file path.
+    @type path: C{str}
+    @param predecessors: store predecessor lists.
+    @type predecessors: C{bool}
+    @param markings: store marking dumps.
+    @type markings: C{bool}
+    @return: number of reachable states.
+    @rtype: C{int}
+    """
+    writer = BinaryGraphWriter(path, predecessors, markings)
+
+    ctx = net.NecoCtx()
+    m = net.init()
+    todo = deque([m])
+    mrk_id_map = { m : 0 }
+    next = 1
+
+    # every marking of the map is expanded or pending
+    ctx.state_space = mrk_id_map
+    ctx.remaining = set()
+    ctx.pid_free_hash = set()
+
+    while todo:
+        m = todo.popleft()
+        succ_list = []
+        for s_mrk in net.succs(m, ctx):
+            node_id = mrk_id_map.get(s_mrk)
+            if node_id is None:
+                node_id = next
+                next += 1
+                mrk_id_map[s_mrk] = node_id
+                todo.append(s_mrk)
+            succ_list.append(node_id)
+
+        writer.add_state(succ_list, m.__dump__() if markings else None)
+
+    return writer.close()
+
+class Graph(object):
+    """ Reachability graph stored in binary format, mapped in memory. """
+
+    def __init__(self, path):
+        """ Map a graph file.
+
+        @param path: graph file path.
+        @type path: C{str}
+        @raise ValueError: if the file is not a graph file.
+        """
+        self._file = open(path, 'rb')
+        try:
+            self._data = mmap.mmap(self._file.fileno(), 0, access = mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError("{} is not a graph file".format(path))
+        if len(self._data) < HEADER.size:
+            self.close()
+            raise ValueError("{} is not a graph file".format(path))
+
+        (magic, version, self.flags, self.states, self.edges,
+         self._targets, self._offsets, self._preds, self._preds_offsets,
+         self._dumps_offsets, self._dumps) = HEADER.unpack_from(self._data, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("{} is not a graph file".format(path))
+
+    def __len__(self):
+        return self.states
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """ Unmap the graph file. """
+        if hasattr(self, '_data'):
+            self._data.close()
+        self._file.close()
+
+    def _range(self, offsets, state):
+        if not 0 <= state < self.states:
+            raise IndexError("no state {}".format(state))
+        return struct.unpack_from('<QQ', self._data, offsets + 8 * state)
+
+    def _ids(self, ids, offsets, state):
+        first, last = self._range(offsets, state)
+        return list(struct.unpack_from('<{}I'.format(last - first), self._data, ids + 4 * first))
+
+    def _require(self, flag, what):
+        if not self.flags & flag:
+            raise ValueError("graph file has no {}".format(what))
+
+    def successors(self, state):
+        """ Successor ids of a state. """
+        return self._ids(self._targets, self._offsets, state)
+
+    def predecessors(self, state):
+        """ Predecessor ids of a state.
+
+        @raise ValueError: if predecessors are not stored.
+        """
+        self._require(FLAG_PREDECESSORS, 'predecessors')
+        return self._ids(self._preds, self._preds_offsets, state)
+
+    def degree(self, state):
+        """ Number of successors of a state. """
+        first, last = self._range(self._offsets, state)
+        return last - first
+
+    def in_degree(self, state):
+        """ Number of predecessors of a state.
+
+        @raise ValueError: if predecessors are not stored.
+        """
+        self._require(FLAG_PREDECESSORS, 'predecessors')
+        first, last = self._range(self._preds_offsets, state)
+        return last - first
+
+    def state(self, state):
+        """ Dump of the marking of a state.
+
+        @raise ValueError: if markings are not stored.
+        """
+        self._require(FLAG_MARKINGS, 'markings')
+        first, last = self._range(self._dumps_offsets, state)
+        return self._data[self._dumps + first:self._dumps + last]
+
+    def deadlocks(self):
+        """ Iterate over the ids of states without successors. """
+        data, offsets = self._data, self._offsets
+        first = 0
+        for state in xrange(self.states):
+            last = _OFFSET.unpack_from(data, offsets + 8 * (state + 1))[0]
+            if first == last:
+                yield state
+            first = last
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,184 @@
+""" Multi-process state space exploration.
+
+Markings are partitioned among worker processes according to their
+hash: each worker owns a shard of the visited set and forwards the
+successors it does not own to their owner. Workers are forked after the
+compiled net module is loaded so they all share the same C{net} code.
+
+A shared counter holds the number of markings that are either waiting
+in a todo list, buffered for sending or in flight between workers. It is
+increased before markings are forwarded and decreased once they have
+been processed, so it can only reach zero when exploration is over.
+"""
+
+from Queue import Empty
+import cPickle
+import multiprocessing
+
+_GOLDEN = 0x9E3779B1
+_MASK32 = 0xFFFFFFFF
+
+def owner(marking, workers):
+    """ Compute the worker owning a marking.
+
+    Hashes are mixed (Fibonacci hashing) and the high bits are used
+    so that shards do not share low hash bits, which would cluster
+    markings in the same slots of per worker sets.
+
+    >>> [ owner(h, 4) for h in range(8) ]
+    [0, 2, 0, 3, 1, 0, 2, 1]
+    >>> owner(42, 1)
+    0
+
+    @param marking: marking to place.
+    @type marking: C{Marking}
+    @param workers: number of workers.
+    @type workers: C{int}
+    @return: owner index in C{[0, workers)}.
+    @rtype: C{int}
+    """
+    h = (hash(marking) * _GOLDEN) & _MASK32
+    return (h * workers) >> 32
+
+class _Worker(object):
+    """ Exploration worker, owns the markings M such that owner(M) == index. """
+
+    def __init__(self, net, index, inboxes, pending, results, batch_size):
+        self.net = net
+        self.index = index
+        self.inboxes = inboxes
+        self.pending = pending
+        self.results = results
+        self.batch_size = batch_size
+        self.workers = len(inboxes)
+
+        self.visited = set()
+        self.todo = []
+        self.outgoing = [ [] for _ in range(self.workers) ]
+
+    def receive(self, batch):
+        """ Keep new markings from a batch and forget duplicates. """
+        visited = self.visited
+        duplicates = 0
+        for marking in batch:
+            if marking in visited:
+                duplicates += 1
+            else:
+                visited.add(marking)
+                self.todo.append(marking)
+        if duplicates:
+            with self.pending.get_lock():
+                self.pending.value -= duplicates
+
+    def flush(self, force = False):
+        """ Send buffered markings to their owners. """
+        for index, batch in enumerate(self.outgoing):
+            if batch and (force or len(batch) >= self.batch_size):
+                self.inboxes[index].put(batch)
+                self.outgoing[index] = []
+
+    def expand(self, marking, ctx):
+        """ Compute successors and dispatch them. """
+        index = self.index
+        workers = self.workers
+        visited = self.visited
+        outgoing = self.outgoing
+        todo = self.todo
+
+        count = 0
+        for succ in self.net.succs(marking, ctx):
+            target = owner(succ, workers)
+            if target == index:
+                if succ not in visited:
+                    visited.add(succ)
+                    todo.append(succ)
+                    count += 1
+            else:
+                outgoing[target].append(succ)
+                count += 1
+
+        # account for new work before it becomes visible to other workers
+        with self.pending.get_lock():
+            self.pending.value += count - 1
+        self.flush()
+
+    def run(self):
+        ctx = self.net.NecoCtx()
+        ctx.state_space = self.visited
+        inbox = self.inboxes[self.index]
+        todo = self.todo
+
+        while True:
+            while todo:
+                self.expand(todo.pop(), ctx)
+                try:
+                    while True:
+                        self.receive(inbox.get_nowait())
+                except Empty:
+                    pass
+
+            self.flush(force = True)
+            try:
+                self.receive(inbox.get(timeout = 0.01))
+            except Empty:
+                if self.pending.value == 0:
+                    break
+
+        self.results.put((self.index, len(self.visited)))
+
+def _run_worker(*args):
+    _Worker(*args).run()
+
+def check_picklable(net):
+    """ Check that markings of a compiled net can be sent between processes.
+
+    @param net: compiled net module.
+    @raise TypeError: if markings cannot be pickled.
+    """
+    marking = net.init()
+    try:
+        cPickle.loads(cPickle.dumps(marking, cPickle.HIGHEST_PROTOCOL))
+    except (TypeError, cPickle.PicklingError) as e:
+        raise TypeError("markings cannot be sent between processes ({})".format(e))
+
+def state_space_size(net, workers, batch_size = 64):
+    """ Explore the state space using several processes.
+
+    @param net: compiled net module.
+    @type net: C{module}
+    @param workers: number of worker processes.
+    @type workers: C{int}
+    @param batch_size: number of markings sent at once to a worker.
+    @type batch_size: C{int}
+    @return: number of reachable states and number of states per worker.
+    @rtype: C{tuple}
+    """
+    assert(workers > 0)
+    check_picklable(net)
+
+    inboxes = [ multiprocessing.Queue() for _ in range(workers) ]
+    results = multiprocessing.Queue()
+    pending = multiprocessing.Value('l', 1)
+
+    initial = net.init()
+    inboxes[owner(initial, workers)].put([initial])
+
+    processes = [ multiprocessing.Process(target = _run_worker,
+                                          args = (net, index, inboxes, pending, results, batch_size))
+                  for index in range(workers) ]
+    for process in processes:
+        process.start()
+
+    sizes = [0] * workers
+    for _ in range(workers):
+        index, size = results.get()
+        sizes[index] = size
+
+    for process in processes:
+        process.join()
+
+    return sum(sizes), sizes
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
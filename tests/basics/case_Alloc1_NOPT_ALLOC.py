@@ -0,0 +1,13 @@
+from snakes.nets import *
+
+net = PetriNet('Net')
+
+# six tokens cycling through four values, every successor copies a place
+# too large to be stored inline
+bag = Place('bag', [0, 0, 0, 0, 0, 0], tInteger)
+net.add_place(bag)
+
+step = Transition('step', Expression('True'))
+net.add_transition(step)
+net.add_input('bag', 'step', Variable('x'))
+net.add_output('bag', 'step', Expression('(x + 1) % 4'))
@@ -0,0 +1,27 @@
+from snakes.nets import *
+
+net = PetriNet('Net')
+
+# two bounded counters whose values may be swapped, (2, 2) is a deadlock
+x = Place('x', [0], tInteger)
+y = Place('y', [0], tInteger)
+
+net.add_place(x)
+net.add_place(y)
+
+inc_x = Transition('inc_x', Expression('a < 2'))
+net.add_transition(inc_x)
+net.add_input('x', 'inc_x', Variable('a'))
+net.add_output('x', 'inc_x', Expression('a + 1'))
+
+inc_y = Transition('inc_y', Expression('b < 2'))
+net.add_transition(inc_y)
+net.add_input('y', 'inc_y', Variable('b'))
+net.add_output('y', 'inc_y', Expression('b + 1'))
+
+swap = Transition('swap', Expression('a != b'))
+net.add_transition(swap)
+net.add_input('x', 'swap', Variable('a'))
+net.add_input('y', 'swap', Variable('b'))
+net.add_output('x', 'swap', Variable('b'))
+net.add_output('y', 'swap', Variable('a'))
@@ -0,0 +1,27 @@
+from snakes.nets import *
+
+net = PetriNet('Net')
+
+# two bounded counters, reset together when they are equal
+a = Place('a', [0], tInteger)
+b = Place('b', [0], tInteger)
+
+net.add_place(a)
+net.add_place(b)
+
+inc_a = Transition('inc_a', Expression('x < 5'))
+net.add_transition(inc_a)
+net.add_input('a', 'inc_a', Variable('x'))
+net.add_output('a', 'inc_a', Expression('x + 1'))
+
+inc_b = Transition('inc_b', Expression('y < 4'))
+net.add_transition(inc_b)
+net.add_input('b', 'inc_b', Variable('y'))
+net.add_output('b', 'inc_b', Expression('y + 1'))
+
+reset = Transition('reset', Expression('x == y'))
+net.add_transition(reset)
+net.add_input('a', 'reset', Variable('x'))
+net.add_input('b', 'reset', Variable('y'))
+net.add_output('a', 'reset', Value(0))
+net.add_output('b', 'reset', Value(0))
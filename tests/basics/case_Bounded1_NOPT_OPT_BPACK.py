@@ -0,0 +1,26 @@
+from snakes.nets import *
+
+net = PetriNet('Net')
+
+# two buffers, the bound of their free slots is annotated
+for name, size in [ ('a', 3), ('b', 2) ]:
+    free = Place('free_' + name, [dot] * size, tBlackToken)
+    free.bound = size
+    full = Place('full_' + name, [], tBlackToken)
+    net.add_place(free)
+    net.add_place(full)
+
+    produce = Transition('produce_' + name, Expression('True'))
+    net.add_transition(produce)
+    net.add_input(free.name, produce.name, Value(dot))
+    net.add_output(full.name, produce.name, Value(dot))
+
+    consume = Transition('consume_' + name, Expression('True'))
+    net.add_transition(consume)
+    net.add_input(full.name, consume.name, Value(dot))
+    net.add_output(free.name, consume.name, Value(dot))
+
+    flush = Transition('flush_' + name, Expression('True'))
+    net.add_transition(flush)
+    net.add_input(full.name, flush.name, MultiArc([Value(dot), Value(dot)]))
+    net.add_output(free.name, flush.name, MultiArc([Value(dot), Value(dot)]))
@@ -0,0 +1,20 @@
+from snakes.nets import *
+
+net = PetriNet('Net')
+
+# numbered items are produced once each and consumed in any order
+made = Place('made', [0], tInteger)
+stock = Place('stock', [], tInteger)
+
+net.add_place(made)
+net.add_place(stock)
+
+produce = Transition('produce', Expression('k < 4'))
+net.add_transition(produce)
+net.add_input('made', 'produce', Variable('k'))
+net.add_output('made', 'produce', Expression('k + 1'))
+net.add_output('stock', 'produce', Variable('k'))
+
+consume = Transition('consume', Expression('True'))
+net.add_transition(consume)
+net.add_input('stock', 'consume', Variable('v'))
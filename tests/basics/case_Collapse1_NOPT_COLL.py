@@ -0,0 +1,24 @@
+from snakes.nets import *
+
+net = PetriNet('Net')
+
+# two holders taking tokens from a shared pool, many markings hold equal
+# place contents
+pool = Place('pool', ['a', 'a', 'b'], tString)
+held_1 = Place('held_1', [], tString)
+held_2 = Place('held_2', [], tString)
+
+net.add_place(pool)
+net.add_place(held_1)
+net.add_place(held_2)
+
+for holder in ['held_1', 'held_2']:
+    take = Transition('take_' + holder, Expression('True'))
+    net.add_transition(take)
+    net.add_input('pool', 'take_' + holder, Variable('s'))
+    net.add_output(holder, 'take_' + holder, Variable('s'))
+
+    drop = Transition('drop_' + holder, Expression('True'))
+    net.add_transition(drop)
+    net.add_input(holder, 'drop_' + holder, Variable('s'))
+    net.add_output('pool', 'drop_' + holder, Variable('s'))
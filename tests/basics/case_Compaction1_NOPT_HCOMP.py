@@ -0,0 +1,24 @@
+from snakes.nets import *
+
+net = PetriNet('Net')
+
+# jobs moved to done while a counter cycles, then put back
+queue = Place('queue', ['x', 'y', 'z'], tString)
+done = Place('done', [], tString)
+n = Place('n', [0], tInteger)
+
+net.add_place(queue)
+net.add_place(done)
+net.add_place(n)
+
+step = Transition('step', Expression('True'))
+net.add_transition(step)
+net.add_input('queue', 'step', Variable('s'))
+net.add_input('n', 'step', Variable('k'))
+net.add_output('done', 'step', Variable('s'))
+net.add_output('n', 'step', Expression('(k + 1) % 4'))
+
+back = Transition('back', Expression('True'))
+net.add_transition(back)
+net.add_input('done', 'back', Variable('s'))
+net.add_output('queue', 'back', Variable('s'))
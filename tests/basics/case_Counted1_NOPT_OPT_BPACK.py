@@ -0,0 +1,29 @@
+from snakes.nets import *
+
+net = PetriNet('Net')
+
+# pools of resources of two kinds, stored as (value, count) pairs
+pool = Place('pool', [1, 1, 1, 2, 2], tInteger)
+pool.counted = True
+
+used = Place('used', [], tInteger)
+used.counted = True
+
+net.add_place(pool)
+net.add_place(used)
+
+take = Transition('take', Expression('True'))
+net.add_transition(take)
+net.add_input('pool', 'take', Variable('x'))
+net.add_output('used', 'take', Variable('x'))
+
+# resources change kind when they are given back
+give = Transition('give', Expression('True'))
+net.add_transition(give)
+net.add_input('used', 'give', Variable('x'))
+net.add_output('pool', 'give', Expression('3 - x'))
+
+pair = Transition('pair', Expression('True'))
+net.add_transition(pair)
+net.add_input('pool', 'pair', MultiArc([Value(1), Value(2)]))
+net.add_output('used', 'pair', MultiArc([Value(1), Value(2)]))
@@ -0,0 +1,10 @@
+from snakes.nets import *
+
+net = PetriNet('Net')
+
+# three independent cyclic counters, each firing modifies a single place
+for name in ['a', 'b', 'c']:
+    net.add_place(Place(name, [0], tInteger))
+    net.add_transition(Transition('inc_' + name, Expression('True')))
+    net.add_input(name, 'inc_' + name, Variable('x'))
+    net.add_output(name, 'inc_' + name, Expression('(x + 1) % 3'))
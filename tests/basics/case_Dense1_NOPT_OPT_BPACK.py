@@ -0,0 +1,34 @@
+from snakes.nets import *
+
+net = PetriNet('Net')
+
+# a die, its values are annotated
+die = Place('die', [1], tInteger)
+die.domain = range(1, 4)
+
+# values shown by the die, the domain is inferred from arcs
+shown = Place('shown', [], tInteger)
+
+tickets = Place('tickets', [dot, dot], tBlackToken)
+
+net.add_place(die)
+net.add_place(shown)
+net.add_place(tickets)
+
+roll = Transition('roll', Expression('True'))
+net.add_transition(roll)
+net.add_input('die', 'roll', Variable('x'))
+net.add_output('die', 'roll', Expression('x % 3 + 1'))
+
+show = Transition('show', Expression('True'))
+net.add_transition(show)
+net.add_input('die', 'show', Variable('x'))
+net.add_input('tickets', 'show', Value(dot))
+net.add_output('die', 'show', Variable('x'))
+net.add_output('shown', 'show', Variable('x'))
+
+# shown 2s are never hidden
+hide = Transition('hide', Expression('y != 2'))
+net.add_transition(hide)
+net.add_input('shown', 'hide', Variable('y'))
+net.add_output('tickets', 'hide', Value(dot))
@@ -0,0 +1,35 @@
+from snakes.nets import *
+
+net = PetriNet('Net')
+
+# jobs going through two stages, a level raised independently and a
+# transition disabled by its guard until the level is high enough
+stage1 = Place('stage1', [dot, dot], tBlackToken)
+stage2 = Place('stage2', [], tBlackToken)
+stage3 = Place('stage3', [], tBlackToken)
+level = Place('level', [0], tInteger)
+
+for place in [stage1, stage2, stage3, level]:
+    net.add_place(place)
+
+move1 = Transition('move1', Expression('True'))
+net.add_transition(move1)
+net.add_input('stage1', 'move1', Value(dot))
+net.add_output('stage2', 'move1', Value(dot))
+
+move2 = Transition('move2', Expression('True'))
+net.add_transition(move2)
+net.add_input('stage2', 'move2', Value(dot))
+net.add_output('stage3', 'move2', Value(dot))
+
+rise = Transition('rise', Expression('k < 3'))
+net.add_transition(rise)
+net.add_input('level', 'rise', Variable('k'))
+net.add_output('level', 'rise', Expression('k + 1'))
+
+restart = Transition('restart', Expression('k >= 2'))
+net.add_transition(restart)
+net.add_input('stage3', 'restart', Value(dot))
+net.add_input('level', 'restart', Variable('k'))
+net.add_output('stage1', 'restart', Value(dot))
+net.add_output('level', 'restart', Value(0))
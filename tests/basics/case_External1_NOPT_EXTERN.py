@@ -0,0 +1,31 @@
+from snakes.nets import *
+
+net = PetriNet('Net')
+
+# two tokens going round three places, laps are counted modulo 5
+a = Place('a', ['x', 'y'], tString)
+b = Place('b', [], tString)
+c = Place('c', [], tString)
+laps = Place('laps', [0], tInteger)
+
+net.add_place(a)
+net.add_place(b)
+net.add_place(c)
+net.add_place(laps)
+
+ab = Transition('ab', Expression('True'))
+net.add_transition(ab)
+net.add_input('a', 'ab', Variable('s'))
+net.add_output('b', 'ab', Variable('s'))
+
+bc = Transition('bc', Expression('True'))
+net.add_transition(bc)
+net.add_input('b', 'bc', Variable('s'))
+net.add_output('c', 'bc', Variable('s'))
+
+ca = Transition('ca', Expression('True'))
+net.add_transition(ca)
+net.add_input('c', 'ca', Variable('s'))
+net.add_input('laps', 'ca', Variable('n'))
+net.add_output('a', 'ca', Variable('s'))
+net.add_output('laps', 'ca', Expression('(n + 1) % 5'))
@@ -0,0 +1,26 @@
+from snakes.nets import *
+
+net = PetriNet('Net')
+
+# each binding of touch leads back to the same marking, moves from
+# either token to the same successor when both tokens are equal
+p = Place('p', [0, 0, 1], tInteger)
+q = Place('q', [], tInteger)
+
+net.add_place(p)
+net.add_place(q)
+
+touch = Transition('touch', Expression('True'))
+net.add_transition(touch)
+net.add_input('p', 'touch', Variable('x'))
+net.add_output('p', 'touch', Variable('x'))
+
+move = Transition('move', Expression('x < 2'))
+net.add_transition(move)
+net.add_input('p', 'move', Variable('x'))
+net.add_output('q', 'move', Expression('x + 1'))
+
+back = Transition('back', Expression('True'))
+net.add_transition(back)
+net.add_input('q', 'back', Variable('y'))
+net.add_output('p', 'back', Variable('y'))
@@ -0,0 +1,24 @@
+from snakes.nets import *
+
+net = PetriNet('Net')
+net.globals['limit'] = 3
+
+# guards with a conjunct reading only globals, checked before enumerating
+# tokens, and a call protected by a previous conjunct
+a = Place('a', [0, 1, 4], tInteger)
+b = Place('b', [0, 2], tInteger)
+
+net.add_place(a)
+net.add_place(b)
+
+pick = Transition('pick', Expression('limit > 1 and x != 0 and divmod(12, x)[1] == 0 and y < limit'))
+net.add_transition(pick)
+net.add_input('a', 'pick', Variable('x'))
+net.add_input('b', 'pick', Variable('y'))
+net.add_output('a', 'pick', Expression('(x + 1) % 6'))
+net.add_output('b', 'pick', Expression('(y + 1) % 4'))
+
+never = Transition('never', Expression('limit > 5 and x > 0'))
+net.add_transition(never)
+net.add_input('a', 'never', Variable('x'))
+net.add_output('a', 'never', Value(0))
@@ -0,0 +1,35 @@
+from snakes.nets import *
+
+net = PetriNet('Net')
+
+# transitions modifying different subsets of places
+names = Place('names', ['a', 'b'], tString)
+out = Place('out', [], tString)
+count = Place('count', [0], tInteger)
+on = Place('on', [dot], tBlackToken)
+off = Place('off', [], tBlackToken)
+
+for place in [names, out, count, on, off]:
+    net.add_place(place)
+
+move = Transition('move', Expression('True'))
+net.add_transition(move)
+net.add_input('names', 'move', Variable('s'))
+net.add_output('out', 'move', Variable('s'))
+
+back = Transition('back', Expression('True'))
+net.add_transition(back)
+net.add_input('out', 'back', Variable('s'))
+net.add_input('count', 'back', Variable('k'))
+net.add_output('names', 'back', Variable('s'))
+net.add_output('count', 'back', Expression('(k + 1) % 3'))
+
+switch_off = Transition('switch_off', Expression('True'))
+net.add_transition(switch_off)
+net.add_input('on', 'switch_off', Value(dot))
+net.add_output('off', 'switch_off', Value(dot))
+
+switch_on = Transition('switch_on', Expression('True'))
+net.add_transition(switch_on)
+net.add_input('off', 'switch_on', Value(dot))
+net.add_output('on', 'switch_on', Value(dot))
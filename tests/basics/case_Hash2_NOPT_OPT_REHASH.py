@@ -0,0 +1,13 @@
+from snakes.nets import *
+
+net = PetriNet('Net')
+
+# two tokens walking through negative and positive values, markings only
+# differ by small int multisets whose hashes are ordered before places
+bag = Place('bag', [0, 0], tInteger)
+net.add_place(bag)
+
+step = Transition('step', Expression('True'))
+net.add_transition(step)
+net.add_input('bag', 'step', Variable('x'))
+net.add_output('bag', 'step', Expression('((x + 11) * 5 + 3) % 23 - 11'))
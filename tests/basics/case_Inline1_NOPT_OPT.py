@@ -0,0 +1,21 @@
+from snakes.nets import *
+
+net = PetriNet('Net')
+
+# an int place growing past the tokens stored inline, tokens are added
+# and removed at both ends and in the middle
+bag = Place('bag', [5, 1, 3], tInteger)
+next = Place('next', [0], tInteger)
+
+net.add_place(bag)
+net.add_place(next)
+
+add = Transition('add', Expression('k < 5'))
+net.add_transition(add)
+net.add_input('next', 'add', Variable('k'))
+net.add_output('next', 'add', Expression('k + 1'))
+net.add_output('bag', 'add', Expression('k * 2'))
+
+take = Transition('take', Expression('x % 3 == 0'))
+net.add_transition(take)
+net.add_input('bag', 'take', Variable('x'))
@@ -0,0 +1,36 @@
+from snakes.nets import *
+
+net = PetriNet('Net')
+
+# three processes sharing a lock, and two slots used independently, the
+# places of each semiflow hold a constant number of black tokens
+net.add_place(Place('lock', [dot], tBlackToken))
+for i in range(1, 4):
+    idle, busy = 'idle_{}'.format(i), 'busy_{}'.format(i)
+    net.add_place(Place(idle, [dot], tBlackToken))
+    net.add_place(Place(busy, [], tBlackToken))
+
+    enter = Transition('enter_{}'.format(i), Expression('True'))
+    net.add_transition(enter)
+    net.add_input(idle, enter.name, Value(dot))
+    net.add_input('lock', enter.name, Value(dot))
+    net.add_output(busy, enter.name, Value(dot))
+
+    leave = Transition('leave_{}'.format(i), Expression('True'))
+    net.add_transition(leave)
+    net.add_input(busy, leave.name, Value(dot))
+    net.add_output(idle, leave.name, Value(dot))
+    net.add_output('lock', leave.name, Value(dot))
+
+net.add_place(Place('slots', [dot, dot], tBlackToken))
+net.add_place(Place('used', [], tBlackToken))
+
+use = Transition('use', Expression('True'))
+net.add_transition(use)
+net.add_input('slots', 'use', Value(dot))
+net.add_output('used', 'use', Value(dot))
+
+release = Transition('release', Expression('True'))
+net.add_transition(release)
+net.add_input('used', 'release', Value(dot))
+net.add_output('slots', 'release', Value(dot))
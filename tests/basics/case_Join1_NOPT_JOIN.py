@@ -0,0 +1,32 @@
+from snakes.nets import *
+
+net = PetriNet('Net')
+
+# a join of three places of different sizes on equal values, the tokens
+# of the smallest one are rotated
+left = Place('left', [1, 2, 3, 4, 5, 6], tInteger)
+right = Place('right', [2, 5], tInteger)
+keys = Place('keys', [1, 2, 3, 4, 5], tInteger)
+matched = Place('matched', [], tInteger)
+
+for place in [left, right, keys, matched]:
+    net.add_place(place)
+
+join = Transition('join', Expression('x == y and y == k'))
+net.add_transition(join)
+net.add_input('left', 'join', Variable('x'))
+net.add_input('right', 'join', Variable('y'))
+net.add_input('keys', 'join', Variable('k'))
+net.add_output('matched', 'join', Variable('x'))
+
+split = Transition('split', Expression('True'))
+net.add_transition(split)
+net.add_input('matched', 'split', Variable('z'))
+net.add_output('left', 'split', Variable('z'))
+net.add_output('right', 'split', Variable('z'))
+net.add_output('keys', 'split', Variable('z'))
+
+rotate = Transition('rotate', Expression('True'))
+net.add_transition(rotate)
+net.add_input('right', 'rotate', Variable('y'))
+net.add_output('right', 'rotate', Expression('y % 6 + 1'))
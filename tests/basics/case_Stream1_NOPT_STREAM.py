@@ -0,0 +1,34 @@
+from snakes.nets import *
+
+net = PetriNet('Net')
+
+# two processes sharing a lock, entries are counted modulo 3 and idle
+# processes may poll without changing the marking
+idle = Place('idle', ['p', 'q'], tString)
+busy = Place('busy', [], tString)
+lock = Place('lock', [dot], tBlackToken)
+entries = Place('entries', [0], tInteger)
+
+net.add_place(idle)
+net.add_place(busy)
+net.add_place(lock)
+net.add_place(entries)
+
+enter = Transition('enter', Expression('True'))
+net.add_transition(enter)
+net.add_input('idle', 'enter', Variable('s'))
+net.add_input('lock', 'enter', Value(dot))
+net.add_input('entries', 'enter', Variable('k'))
+net.add_output('busy', 'enter', Variable('s'))
+net.add_output('entries', 'enter', Expression('(k + 1) % 3'))
+
+leave = Transition('leave', Expression('True'))
+net.add_transition(leave)
+net.add_input('busy', 'leave', Variable('s'))
+net.add_output('idle', 'leave', Variable('s'))
+net.add_output('lock', 'leave', Value(dot))
+
+poll = Transition('poll', Expression('True'))
+net.add_transition(poll)
+net.add_input('idle', 'poll', Variable('s'))
+net.add_output('idle', 'poll', Variable('s'))
@@ -0,0 +1,34 @@
+from snakes.nets import *
+
+net = PetriNet('Net')
+
+# bounded counters, and a pool of tokens moved between two places
+c1 = Place('c1', [0], tInteger)
+c2 = Place('c2', [0, 0], tInteger)
+p1 = Place('p1', ['a', 'a', 'b'], tString)
+p2 = Place('p2', [], tString)
+
+net.add_place(c1)
+net.add_place(c2)
+net.add_place(p1)
+net.add_place(p2)
+
+t1 = Transition('t1', Expression('x < 3'))
+net.add_transition(t1)
+net.add_input('c1', 't1', Variable('x'))
+net.add_output('c1', 't1', Expression('x + 1'))
+
+t2 = Transition('t2', Expression('y < 2'))
+net.add_transition(t2)
+net.add_input('c2', 't2', Variable('y'))
+net.add_output('c2', 't2', Expression('y + 1'))
+
+t3 = Transition('t3', Expression('True'))
+net.add_transition(t3)
+net.add_input('p1', 't3', Variable('z'))
+net.add_output('p2', 't3', Variable('z'))
+
+t4 = Transition('t4', Expression('True'))
+net.add_transition(t4)
+net.add_input('p2', 't4', Variable('z'))
+net.add_output('p1', 't4', Variable('z'))
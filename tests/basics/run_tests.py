@@ -3,9 +3,14 @@
 from StringIO import StringIO
 from glob import glob
 from snakes.nets import dot    # @UnusedImport needed to rebuild markings
+from neco import checkpoint, delta, external, graph, parallel
 import neco
 import os
+import pickle
+import re
+import shutil
 import sys
+import tempfile
 import unittest
 
 # Static config
@@ -46,6 +51,9 @@ class MarkingSet(object):
                 return True
         return False
 
+    def __len__(self):
+        return len(self.data)
+
     def __eq__(self, other):
         if len(self.data) != len(other.data):
             return False
@@ -71,6 +79,26 @@ def read_marking_set(state_space):
     out.write(']')
     return MarkingSet(eval(out.getvalue()))
 
+def read_marking_map(map_file):
+    """ Read markings from a map file of C{id : dump} lines, indexed by ids. """
+
+    fields = re.split(r'^(\d+) : ', map_file.getvalue(), flags = re.M)
+    return dict( (int(i), eval(dump)) for i, dump in zip(fields[1::2], fields[2::2]) )
+
+def marking_key(marking):
+    """ Hashable key of a marking read from a dump. """
+    return repr(sorted(Marking(marking).data.items()))
+
+def successor_edges(net):
+    """ Edges of the reachability graph given by succs(), as pairs of marking keys. """
+
+    ctx = net.NecoCtx()
+    edges = set()
+    for marking in net.state_space():
+        key = marking_key(eval(marking.__dump__()))
+        edges.update( (key, marking_key(eval(succ.__dump__()))) for succ in net.succs(marking, ctx) )
+    return edges
+
 class Entry:
     """ A file used as a test. """
 
@@ -122,10 +150,11 @@ class CythonBackend(TestBackend):
 class NecoTestCase(object):
     # Functor corresponding to a test. Creates a test from an Entry.
 
-    def __init__(self, entry, config, test):
+    def __init__(self, entry, config, test, explore = None):
         self.entry = entry
         self.test = test
         self.config = config
+        self.explore = explore
         if entry.ext == '.py':
             self.load = self.load_net
         else:
@@ -140,6 +169,9 @@ class NecoTestCase(object):
         # state space computation
         markings = read_marking_set(net.state_space())
         self.test.assertEqual(expected, markings, "correct markings")
+        # other exploration modes must find the same states
+        if self.explore:
+            check_exploration(self.test, net, markings, self.explore)
 
     def load_net(self):
         module_file = self.entry.module_name
@@ -192,6 +224,170 @@ def config_FLOW(backend, entry):
                               optimize_flow = True,
                               out_module = backend_prefix[backend] + entry.name + '_FLOW')
 
+def config_INV(backend, entry):
+    return neco.config.Config(backend = backend,
+                              search_paths = env_includes,
+                              optimize = True,
+                              invariants = True,
+                              out_module = backend_prefix[backend] + entry.name + '_INV')
+
+def config_ENAB(backend, entry):
+    return neco.config.Config(backend = backend,
+                              search_paths = env_includes,
+                              optimize = True,
+                              incremental_enabling = True,
+                              out_module = backend_prefix[backend] + entry.name + '_ENAB')
+
+def config_JOIN(backend, entry):
+    return neco.config.Config(backend = backend,
+                              search_paths = env_includes,
+                              optimize = True,
+                              join_profile = 100,
+                              out_module = backend_prefix[backend] + entry.name + '_JOIN')
+
+def config_explore(backend, entry, option):
+    return neco.config.Config(backend = backend,
+                              search_paths = env_includes,
+                              optimize = True,
+                              out_module = backend_prefix[backend] + entry.name + '_' + option)
+
+# Exploration modes return the number of states they found, the set of
+# markings they kept or None, and the list of edges they found, as pairs of
+# marking keys, or None.
+
+def explore_WORK(net):
+    count, _ = parallel.state_space_size(net, 3, batch_size = 4)
+    return count, None, None
+
+def explore_HCOMP(net):
+    count = net.state_space_hash_compaction()
+    map_file = StringIO()
+    net.state_space_graph_hash_compaction(map_file)
+    return count, MarkingSet(read_marking_map(map_file).values()), None
+
+def explore_BITST(net):
+    # large enough for the bit array to keep all states of small nets
+    count, _, _ = net.state_space_bitstate(1 << 16, 3)
+    return count, None, None
+
+def explore_EXTERN(net):
+    directory = tempfile.mkdtemp(prefix = 'neco-test-')
+    try:
+        # small buffers and few visited runs to write and merge several runs
+        explorer = external.ExternalExplorer(net, directory, memory = 256, max_visited_runs = 2)
+        count, _ = explorer.explore()
+        return count, None, None
+    finally:
+        shutil.rmtree(directory)
+
+def explore_CKPT(net):
+    directory = tempfile.mkdtemp(prefix = 'neco-test-')
+    path = os.path.join(directory, 'checkpoint')
+    try:
+        # expand a few markings by hand and save the explorer state
+        explorer = checkpoint.CheckpointExplorer(net, path, interval = None)
+        ctx = net.NecoCtx()
+        expanded = 0
+        while explorer.todo and expanded < 4:
+            for succ in net.succs(explorer.todo.pop(), ctx):
+                if succ not in explorer.visited:
+                    explorer.visited.add(succ)
+                    explorer.todo.append(succ)
+            expanded += 1
+        explorer.counters['expanded'] = expanded
+        checkpoint.write_checkpoint(path, explorer.initial, explorer.counters,
+                                    explorer.visited, explorer.todo)
+
+        resumed = checkpoint.CheckpointExplorer(net, path, interval = None)
+        resumed.resume(path)
+        _, counters = resumed.explore()
+        # each state is expanded once, before or after the checkpoint
+        return counters['expanded'], read_marking_set(resumed.visited), None
+    finally:
+        shutil.rmtree(directory)
+
+def explore_STREAM(net):
+    map_file, graph_file = StringIO(), StringIO()
+    count = graph.stream_state_space_graph(net, map_file, graph_file)
+    states = read_marking_map(map_file)
+    keys = dict( (i, marking_key(marking)) for i, marking in states.iteritems() )
+    edges = []
+    for line in graph_file.getvalue().splitlines():
+        i, succs = line.split(' : ')
+        edges.extend( (keys[int(i)], keys[j]) for j in eval(succs) )
+    return count, MarkingSet(states.values()), edges
+
+def explore_BIN(net):
+    directory = tempfile.mkdtemp(prefix = 'neco-test-')
+    path = os.path.join(directory, 'graph')
+    try:
+        count = graph.write_binary_state_space_graph(net, path)
+        with graph.Graph(path) as binary_graph:
+            states = [ eval(binary_graph.state(i)) for i in range(len(binary_graph)) ]
+            keys = [ marking_key(marking) for marking in states ]
+            edges = [ (keys[i], keys[j]) for i in range(len(binary_graph)) for j in binary_graph.successors(i) ]
+            return count, MarkingSet(states), edges
+    finally:
+        shutil.rmtree(directory)
+
+def explore_GRAPH(net):
+    succs, mrk_id_map = net.state_space_graph()
+    keys = dict( (i, marking_key(eval(marking.__dump__()))) for marking, i in mrk_id_map.iteritems() )
+    edges = [ (keys[i], keys[j]) for i, ids in succs.iteritems() for j in ids ]
+    return len(mrk_id_map), read_marking_set(mrk_id_map), edges
+
+def explore_COLL(net):
+    visited, _ = net.state_space_collapse()
+    return len(visited.states), read_marking_set(visited.states), None
+
+def explore_DELTA(net):
+    _, build = delta.marking_fields(net)
+    # short chains so that states are stored both in full and as differences
+    table = delta.state_space(net, interval = 2)
+    states = [ build(table.state(i)) for i in range(len(table)) ]
+    return len(table), read_marking_set(states), None
+
+def explore_REHASH(net):
+    # markings rebuilt from their pickled state hash all their places,
+    # successors only rehash the places they modify
+    visited = set(net.state_space())
+    rebuilt = set( pickle.loads(pickle.dumps(marking, -1)) for marking in visited )
+    return len(visited | rebuilt), read_marking_set(rebuilt), None
+
+def explore_ALLOC(net):
+    # place objects and token buffers allocated with malloc instead of slabs
+    net.configure_allocator(enabled = False)
+    try:
+        visited = net.state_space()
+        return len(visited), read_marking_set(visited), None
+    finally:
+        net.configure_allocator(enabled = True)
+
+# option : (exploration, backends)
+explorers = { 'WORK' : (explore_WORK, ['python', 'cython']),
+              'HCOMP' : (explore_HCOMP, ['cython']),
+              'BITST' : (explore_BITST, ['cython']),
+              'EXTERN' : (explore_EXTERN, ['python', 'cython']),
+              'CKPT' : (explore_CKPT, ['python', 'cython']),
+              'STREAM' : (explore_STREAM, ['python', 'cython']),
+              'BIN' : (explore_BIN, ['python', 'cython']),
+              'GRAPH' : (explore_GRAPH, ['python', 'cython']),
+              'COLL' : (explore_COLL, ['cython']),
+              'DELTA' : (explore_DELTA, ['python', 'cython']),
+              'REHASH' : (explore_REHASH, ['cython']),
+              'ALLOC' : (explore_ALLOC, ['cython']) }
+
+def check_exploration(test, net, markings, explore):
+    """ Check an exploration mode against the markings of state_space(). """
+
+    count, states, edges = explore(net)
+    test.assertEqual(len(markings), count, "correct state count")
+    if states is not None:
+        test.assertEqual(markings, states, "correct markings")
+    if edges is not None:
+        # each edge is listed once
+        test.assertEqual(sorted(successor_edges(net)), sorted(edges), "correct edges")
+
 def populateTestCases():
     """ Function that adds tests based on files in current directory.
     
@@ -219,7 +415,7 @@ def populateTestCases():
         # remaining values are available options
         options = []
         for option in decode:
-            if option in ['NOPT', 'OPT', 'FLOW', 'BPACK']:
+            if option in ['NOPT', 'OPT', 'FLOW', 'BPACK', 'INV', 'ENAB', 'JOIN'] or option in explorers:
                 options.append(option)
 
         if options != []:
@@ -229,6 +425,7 @@ def populateTestCases():
     for entry in entries:
         for option in entry.options:
 
+            explore = None
             if option == 'NOPT':
                 config_py = config_NOPT('python', entry)
                 config_cy = config_NOPT('cython', entry)
@@ -241,13 +438,26 @@ def populateTestCases():
             elif option == 'FLOW':
                 config_py = config_FLOW('python', entry)
                 config_cy = config_FLOW('cython', entry)
+            elif option == 'INV':
+                config_py = None
+                config_cy = config_INV('cython', entry)
+            elif option == 'ENAB':
+                config_py = None
+                config_cy = config_ENAB('cython', entry)
+            elif option == 'JOIN':
+                config_py = config_JOIN('python', entry)
+                config_cy = config_JOIN('cython', entry)
+            elif option in explorers:
+                explore, backends = explorers[option]
+                config_py = config_explore('python', entry, option) if 'python' in backends else None
+                config_cy = config_explore('cython', entry, option) if 'cython' in backends else None
 
             test_name = 'test_{case}_{option:_>5}'.format(case = entry.name, option = option)
             if config_py:
-                setattr(PythonBackend, test_name, NecoTestCase(entry, config_py, PythonBackend))
+                setattr(PythonBackend, test_name, NecoTestCase(entry, config_py, PythonBackend, explore))
 
             if config_cy:
-                setattr(CythonBackend, test_name, NecoTestCase(entry, config_cy, CythonBackend))
+                setattr(CythonBackend, test_name, NecoTestCase(entry, config_cy, CythonBackend, explore))
 
 if __name__ == '__main__':
     populateTestCases()